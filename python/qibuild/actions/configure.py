@@ -4,6 +4,9 @@
 
 """Configure a project
 
+cmake is not run again for projects whose configuration is
+already up to date, unless --force is used.
+
 """
 
 from qisys import ui
@@ -24,6 +27,8 @@ def configure_parser(parser):
     group.add_argument("--no-clean-first", dest="clean_first",
         action="store_false",
         help="do not clean CMake cache")
+    group.add_argument("--force", dest="force", action="store_true",
+        help="run cmake even if the configuration is up to date")
     group.add_argument("--debug-trycompile", dest="debug_trycompile",
         action="store_true",
         help="pass --debug-trycompile to CMake call")
@@ -51,7 +56,7 @@ def configure_parser(parser):
     group.add_argument("--without-debug-info", action="store_false", dest="debug_info",
                         help="remove debug information from binaries. Overrides --release")
 
-    parser.set_defaults(clean_first=True, effective_cplusplus=False,
+    parser.set_defaults(clean_first=True, force=False, effective_cplusplus=False,
                         werror=False, profiling=False,
                         trace_cmake=False, debug_info=None)
     if not parser.epilog:
@@ -91,6 +96,7 @@ def do(args):
         ui.info(ui.green, "Tracing CMake execution")
 
     cmake_builder.configure(clean_first=args.clean_first,
+                            force=args.force,
                             debug_trycompile=args.debug_trycompile,
                             trace_cmake=args.trace_cmake,
                             profiling=args.profiling,
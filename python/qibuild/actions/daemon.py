@@ -0,0 +1,42 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Run a daemon keeping the worktree loaded in memory
+
+While it runs, the qibuild, qisrc, qitoolchain ... commands run in
+this worktree are sent to the daemon, and start faster.
+Use --stop to stop it, or set QI_NO_DAEMON=1 in the environment
+to run a command without it.
+"""
+
+import qisys.daemon
+import qisys.parsers
+import qibuild.worktree
+import qisrc.worktree
+
+from qisys import ui
+
+def configure_parser(parser):
+    """Configure parser for this action """
+    qisys.parsers.worktree_parser(parser)
+    parser.add_argument("--stop", action="store_true",
+                        help="Stop the daemon running in this worktree")
+    parser.set_defaults(stop=False)
+
+def do(args):
+    """Main entry point"""
+    worktree = qisys.parsers.get_worktree(args)
+    if args.stop:
+        if qisys.daemon.stop(worktree.root):
+            ui.info(ui.green, "Daemon stopped")
+        else:
+            ui.info("No daemon running in", worktree.root)
+        return
+    daemon = qisys.daemon.Daemon(worktree.root,
+            observers=[qibuild.worktree.BuildWorkTree,
+                       qisrc.worktree.GitWorkTree])
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -18,6 +18,13 @@ Installs everything on the target 'mytarget' in the
 
 Installs everything on the target 'mytarget' in the
 '/tmp/foobar' directory.
+
+Several urls can be given with --url, in which case the files
+are sent to every url at the same time.
+
+Only the files that changed since the last deploy to the same
+url are sent. Use --verify to send everything again, comparing
+checksums with the files on the target.
 """
 
 
@@ -47,6 +54,6 @@ def do(args):
         default_dep_types = ["runtime"]
     cmake_builder = qibuild.parsers.get_cmake_builder(
                                     args, default_dep_types=default_dep_types)
-    for url in urls:
-        cmake_builder.deploy(url, split_debug=args.split_debug,
-                             with_tests=args.with_tests)
+    cmake_builder.deploy(urls, split_debug=args.split_debug,
+                         with_tests=args.with_tests,
+                         verify=args.verify)
@@ -4,6 +4,10 @@
 
 """Build a project
 
+Projects whose sources, configuration and dependencies have not
+changed since their last successful build are skipped, unless
+--force or --rebuild is used.
+
 """
 
 from qisys import ui
@@ -16,6 +20,8 @@ def configure_parser(parser):
     qibuild.parsers.project_parser(parser)
     group = parser.add_argument_group("make options")
     group.add_argument("--rebuild", "-r", action="store_true", default=False)
+    group.add_argument("--force", action="store_true", default=False,
+                       help="Build the projects even if they are up to date")
     group.add_argument("--coverity", action="store_true", default=False,
                        help="Build using cov-build. Ensure you have "
                        "cov-analysis installed on your machine.")
@@ -26,4 +32,4 @@ def do(args):
 
     cmake_builder = qibuild.parsers.get_cmake_builder(args)
     cmake_builder.build(num_jobs=args.num_jobs, rebuild=args.rebuild,
-                        coverity=args.coverity)
+                        coverity=args.coverity, force=args.force)
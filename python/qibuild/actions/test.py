@@ -53,10 +53,14 @@ def do(args):
     projects = deps_solver.get_dep_projects(cmake_builder.projects,
                                            dep_types)
     res = True
+    timings = cmake_builder.timings
     for project in projects:
         if args.build_first:
-            project.build()
-        res = project.run_tests(**vars(args))
+            with timings.record(project.name, "build"):
+                project.build()
+        with timings.record(project.name, "test"):
+            res = project.run_tests(**vars(args))
+    cmake_builder.write_timings_report()
 
     if not res:
         sys.exit(1)
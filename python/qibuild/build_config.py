@@ -1,5 +1,8 @@
+import functools
 import os
+import qisys.envsetter
 import qisys.qixml
+import qisys.sh
 
 
 import qibuild.config
@@ -8,6 +11,35 @@ import qitoolchain
 import platform
 
 
+def get_cached(obj, name, compute):
+    """ Return the value returned by ``compute()`` the last time it was
+    called with the same build settings (see
+    :py:attr:`CMakeBuildConfig.settings_key`).
+    The values are stored in ``obj``
+
+    """
+    key = obj.settings_key
+    cache = obj.__dict__.get("_settings_cache")
+    if cache is None or cache[0] != key:
+        cache = (key, dict())
+        obj._settings_cache = cache
+    values = cache[1]
+    if name not in values:
+        values[name] = compute()
+    return values[name]
+
+def cached_property(func):
+    """ Like ``property``, for values derived from the build settings,
+    (see :py:func:`get_cached`).
+    Only use it for values that are never modified by the callers
+
+    """
+    @functools.wraps(func)
+    def new_func(self):
+        return get_cached(self, func.__name__, lambda: func(self))
+    return property(new_func)
+
+
 class CMakeBuildConfig(object):
     """ Compute a list of CMake flags from all the settings
     that can affect the build  (the toolchain name, the build
@@ -25,9 +57,28 @@ class CMakeBuildConfig(object):
         self._default_config = None
         self.qibuild_cfg = self.read_global_qibuild_settings()
         self._cmake_generator = None
+        self._local_compiler_cache = None
+        self._generation = 0
         self.read_local_settings()
         self.num_jobs = None
 
+    @property
+    def settings_key(self):
+        """ Changes every time a setting used to compute the build
+        directories or the CMake arguments changes
+
+        """
+        return (self.active_config, self.build_type, tuple(self.profiles),
+                tuple(self.user_flags), self._cmake_generator,
+                self._generation)
+
+    def invalidate_cache(self):
+        """ Force the values derived from the build settings to be
+        computed again, for instance after the build profiles have changed
+
+        """
+        self._generation += 1
+
 
     @property
     def local_cmake(self):
@@ -55,6 +106,47 @@ class CMakeBuildConfig(object):
             return qitoolchain.get_toolchain(self.active_config)
         return None
 
+    @property
+    def config_name(self):
+        """ The name of the toolchain, or a name describing the host
+        when not using a toolchain
+
+        """
+        if self.toolchain:
+            return self.toolchain.name
+        return "sys-%s-%s" % (platform.system().lower(),
+                              platform.machine().lower())
+
+    @property
+    def compiler_cache(self):
+        """ The :py:class:`qibuild.config.CompilerCache` to use, read
+        from the worktree settings first, then from the global
+        configuration.
+
+        :returns: None if no compiler cache should be used
+        """
+        res = self._local_compiler_cache
+        if res is None:
+            res = self.qibuild_cfg.build.compiler_cache
+        if res is None or not res.enabled:
+            return None
+        return res
+
+    @property
+    def compiler_cache_dir(self):
+        """ The compiler cache directory, one per config, so that
+        objects built with different compilers are not mixed
+
+        """
+        compiler_cache = self.compiler_cache
+        if not compiler_cache:
+            return None
+        if compiler_cache.dir:
+            root = qisys.sh.to_native_path(compiler_cache.dir)
+        else:
+            root = qisys.sh.get_cache_path("qi", "compiler-cache")
+        return os.path.join(root, self.config_name)
+
     @property
     def cmake_generator(self):
         """ The current CMake generator, either set by the user from the command
@@ -99,22 +191,27 @@ class CMakeBuildConfig(object):
         read from qibuild configuration files.
         ``os.environ`` will remain unchanged
 
+        It is only computed once per config, and cannot be modified:
+        use :py:func:`qisys.envsetter.overlay` to change it
+
         """
+        return get_cached(self, "build_env", self._build_env)
+
+    def _build_env(self):
         envsetter = qisys.envsetter.EnvSetter()
         envsetter.read_config(self.qibuild_cfg)
-        return envsetter.get_build_env()
+        return qisys.envsetter.FrozenEnv(envsetter.get_build_env())
 
     def build_directory(self, prefix="build"):
         """ Return a suitable build directory, depending on the
         build setting of the worktree: the name of the toolchain,
         the build profiles, and the build type (debug/release)
         """
-        parts = [prefix]
-        if self.toolchain:
-            parts.append(self.toolchain.name)
-        else:
-            parts.append("sys-%s-%s" % (platform.system().lower(),
-                                        platform.machine().lower()))
+        return get_cached(self, ("build_directory", prefix),
+                          lambda: self._build_directory(prefix))
+
+    def _build_directory(self, prefix):
+        parts = [prefix, self.config_name]
         for profile in self.profiles:
             parts.append(profile)
 
@@ -133,6 +230,9 @@ class CMakeBuildConfig(object):
         """ The CMake arguments to use
 
         """
+        return list(get_cached(self, "cmake_args", self._cmake_args))
+
+    def _cmake_args(self):
         args = list()
         if self.cmake_generator:
             args.append("-G%s" % self.cmake_generator)
@@ -163,8 +263,10 @@ class CMakeBuildConfig(object):
     def read_local_settings(self):
         """ Read ``<worktree>/.qi/qibuild.xml`` """
         local_settings = qibuild.config.LocalSettings()
-        tree = qisys.qixml.read(self.build_worktree.qibuild_xml)
+        repository = qibuild.config.get_repository()
+        tree = repository.read(self.build_worktree.qibuild_xml)
         local_settings.parse(tree)
+        self._local_compiler_cache = local_settings.build.compiler_cache
         default_config = local_settings.defaults.config
         if not default_config:
             return
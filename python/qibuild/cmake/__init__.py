@@ -6,14 +6,17 @@
 
 """
 
+import hashlib
 import os
 import re
 import subprocess
+import threading
 
 from qisys import ui
 import qisys.command
 import qisys.sh
 import qibuild.cmake.profiling
+import qibuild.fingerprint
 
 def get_known_cmake_generators():
     """ Get the list of known cmake generators.
@@ -76,8 +79,7 @@ def get_cached_var(build_dir, var, default=None):
     if not os.path.exists(cmakecache):
         mess  = "Could not find CMakeCache.txt in %s" % build_dir
         raise Exception(mess)
-    res = read_cmake_cache(cmakecache)
-    return res.get(var, default)
+    return get_cmake_cache(cmakecache).get(var, default)
 
 
 def cmake(source_dir, build_dir, cmake_args, env=None,
@@ -115,6 +117,11 @@ def cmake(source_dir, build_dir, cmake_args, env=None,
         cmake_args.append("--debug-trycompile")
     if profiling or trace_cmake:
         cmake_args.append("--trace")
+    if profiling and not trace_cmake:
+        # The json format contains timestamps
+        cmake_version = qisys.command.get_version("cmake")
+        if cmake_version and cmake_version >= (3, 17):
+            cmake_args.append("--trace-format=json-v1")
 
     # Check that no one has made an in-source build
     in_source_cache = os.path.join(source_dir, "CMakeCache.txt")
@@ -155,10 +162,17 @@ def cmake(source_dir, build_dir, cmake_args, env=None,
         return
     qibuild_dir = get_cmake_qibuild_dir()
     ui.info(ui.green, "Analyzing cmake logs ...")
-    profiling_res = qibuild.cmake.profiling.parse_cmake_log(cmake_log, qibuild_dir)
+    analyzer = qibuild.cmake.profiling.analyze_trace(cmake_log, qibuild_dir)
     outdir = os.path.join(build_dir, "profile")
-    qibuild.cmake.profiling.gen_annotations(profiling_res, outdir, qibuild_dir)
+    qibuild.cmake.profiling.gen_annotations(analyzer.get_qibuild_profile(),
+                                            outdir, qibuild_dir)
     ui.info(ui.green, "Annotations generated in", outdir)
+    report = analyzer.report()
+    report_path = os.path.join(build_dir, "cmake-profile.txt")
+    with open(report_path, "w") as fp:
+        fp.write(report)
+    ui.info(report)
+    ui.info(ui.green, "Report written in", report_path)
 
 
 def display_options(build_dir):
@@ -178,27 +192,166 @@ def display_options(build_dir):
         print "  %s : %s" % (key.ljust(padding), cache[key])
 
 
+# Name of the file, in the build directory, containing the
+# fingerprint of the last successful configuration
+CONFIGURE_FINGERPRINT = "qibuild-configure.sha1"
+
+# Environment variables that may change the result of cmake
+_CONFIGURE_ENV_VARS = ["PATH", "CC", "CXX", "CFLAGS", "CXXFLAGS",
+                       "CPPFLAGS", "LDFLAGS", "PKG_CONFIG_PATH"]
+
+def get_configure_fingerprint(source_dir, build_dir, cmake_args,
+                              env=None, input_files=None,
+                              cmake_dirs=None):
+    """ Compute a fingerprint of everything that can change the
+    result of running cmake:
+
+    * the cmake arguments (including the generator and the
+      toolchain file)
+    * the contents of ``input_files`` (for instance the
+      toolchain file, dependencies.cmake or path.conf)
+    * the relevant environment variables
+    * the location and the timestamp of the cmake executable
+    * the timestamps of the CMakeLists.txt and the .cmake files
+      found in ``source_dir`` and in ``cmake_dirs``
+
+    """
+    if env is None:
+        env = os.environ
+    sha1 = hashlib.sha1()
+    def add(*tokens):
+        for token in tokens:
+            sha1.update(str(token))
+            sha1.update("\0")
+    add("source_dir", source_dir)
+    add("args", *cmake_args)
+    for input_file in (input_files or list()):
+        add("file", input_file)
+        if os.path.exists(input_file):
+            add(qisys.sh.file_digest(input_file))
+    for key in sorted(env):
+        if key in _CONFIGURE_ENV_VARS or key.startswith("CMAKE_"):
+            add("env", key, env[key])
+    cmake_exe = qisys.command.find_program("cmake", env=env)
+    if cmake_exe:
+        add("cmake", cmake_exe, os.path.getmtime(cmake_exe))
+    for directory in [source_dir] + list(cmake_dirs or list()):
+        files_state = qibuild.fingerprint.get_files_state(directory,
+            filter_fun=_is_cmake_file, skip=[build_dir])
+        for (rel_path, mtime, size) in files_state:
+            add("cmake_file", directory, rel_path, mtime, size)
+    return sha1.hexdigest()
+
+def _is_cmake_file(name):
+    return name == "CMakeLists.txt" or name.endswith(".cmake")
+
+def read_configure_fingerprint(build_dir):
+    """ Return the fingerprint of the last successful configuration
+    of the build dir, or None
+
+    """
+    fingerprint_path = os.path.join(build_dir, CONFIGURE_FINGERPRINT)
+    return qibuild.fingerprint.read_stamp(fingerprint_path)
+
+def write_configure_fingerprint(build_dir, fingerprint):
+    """ Store the fingerprint of a successful configuration.
+    Use ``fingerprint=None`` to remove it, so that the next
+    configuration will not be skipped
+
+    """
+    fingerprint_path = os.path.join(build_dir, CONFIGURE_FINGERPRINT)
+    qibuild.fingerprint.write_stamp(fingerprint_path, fingerprint)
+
 def read_cmake_cache(cache_path):
     """ Read a CMakeCache.txt file, returning a dict
     name -> value
 
     """
-    with open(cache_path, "r") as fp:
-        lines = fp.readlines()
-    res = dict()
-    for line in lines:
-        if line.startswith("//"):
-            continue
-        if line.startswith("#"):
-            continue
-        if not line:
-            continue
-        match = re.match(r"([a-zA-Z0-9-_]+):(\w+)=(.*)", line)
-        if not match:
-            continue
-        else:
+    return get_cmake_cache(cache_path).as_dict()
+
+
+_CACHE_ENTRY_RE = re.compile(r"([a-zA-Z0-9-_]+):(\w+)=(.*)")
+
+class CMakeCache(object):
+    """ The parsed contents of a CMakeCache.txt file.
+
+    Lines are only parsed when needed: looking for a variable stops
+    at the line where it is defined.
+
+    The file is read again when it is replaced, or when its mtime
+    or its size change.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._stamp = None
+        self._lines = list()
+        self._pos = 0
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """ Read the file again if it has changed """
+        st = os.stat(self.path)
+        stamp = (st.st_mtime, st.st_size, st.st_ino)
+        if stamp == self._stamp:
+            return
+        with open(self.path, "r") as fp:
+            self._lines = fp.read().splitlines()
+        self._stamp = stamp
+        self._pos = 0
+        self._values = dict()
+
+    def _scan(self, var=None):
+        """ Parse lines until var is found, (or until the end
+        of the file if var is None)
+
+        """
+        lines = self._lines
+        values = self._values
+        while self._pos < len(lines):
+            line = lines[self._pos]
+            self._pos += 1
+            if not line or line.startswith(("//", "#")):
+                continue
+            match = _CACHE_ENTRY_RE.match(line)
+            if not match:
+                continue
             (key, _type, value) = match.groups()
-            res[key] = value
+            values[key] = value
+            if key == var:
+                return
+
+    def get(self, var, default=None):
+        """ Get the value of a variable """
+        with self._lock:
+            self._refresh()
+            if var not in self._values:
+                self._scan(var)
+            return self._values.get(var, default)
+
+    def as_dict(self):
+        """ Return a dict name -> value with all the variables """
+        with self._lock:
+            self._refresh()
+            self._scan()
+            return self._values.copy()
+
+
+_CMAKE_CACHES = dict()
+_CMAKE_CACHES_LOCK = threading.Lock()
+
+def get_cmake_cache(cache_path):
+    """ Get the :py:class:`CMakeCache` object for the given path.
+    The same object is shared by every caller
+
+    """
+    cache_path = os.path.abspath(cache_path)
+    with _CMAKE_CACHES_LOCK:
+        res = _CMAKE_CACHES.get(cache_path)
+        if res is None:
+            res = CMakeCache(cache_path)
+            _CMAKE_CACHES[cache_path] = res
     return res
 
 def get_cmake_qibuild_dir():
@@ -4,47 +4,215 @@
 
 """ Tools to profile cmake execution
 
+The output of ``cmake --trace`` is analyzed one line at a time, so that
+logs of any size can be processed in bounded memory.
+
+Both the plain trace format and the ``--trace-format=json-v1`` format
+(cmake >= 3.17) are supported. With the latter, the time spent in each
+line, and in each function or macro (including the functions it calls)
+is measured. With the former, only hits and calls are counted.
+
 """
 
-import re
+import json
 import os
-import pickle
 
 import qisys.sh
 
-LOG_RE = re.compile("(.*?)\((\d+)\):")
+# Kinds of cmake files
+QIBUILD = "qibuild"
+CMAKE = "cmake"
+PROJECT = "project"
 
 
-def parse_cmake_log(input, qibuild_dir):
-    """ Parse cmake logs
+class TraceAnalyzer(object):
+    """ Aggregate the lines of a cmake trace:
+
+    * ``line_hits`` and ``line_times``: (filename, line_no) -> value
+    * ``calls``: command name -> number of calls
+    * ``inclusive_times``: command name -> time spent in the command and
+      in the commands it calls (json format only)
 
-    Generate annotated source code for each cmake file in qibuild,
     """
-    # cmake log is written like c:/path/to/qibuild/cmake/
-    qibuild_dir = qisys.sh.to_posix_path(qibuild_dir)
-    profile = dict()
-    with open(input, "r") as fp:
-        for line in fp:
-            match = re.match(LOG_RE, line)
-            if not match:
+    def __init__(self, qibuild_dir=None):
+        self.qibuild_dir = None
+        if qibuild_dir:
+            self.qibuild_dir = qisys.sh.to_posix_path(qibuild_dir)
+        self.line_hits = dict()
+        self.line_times = dict()
+        self.calls = dict()
+        self.inclusive_times = dict()
+        self.has_times = False
+        # (command, frame, start time) for each command being run
+        self._stack = list()
+        # (filename, line_no, time) of the previous line
+        self._previous = None
+
+    def feed(self, line):
+        """ Process one line of the trace """
+        if line.startswith("{"):
+            self._feed_json(line)
+        else:
+            self._feed_plain(line)
+
+    def _feed_plain(self, line):
+        # /path/to/file.cmake(42):  command(args )
+        sep = line.find("):  ")
+        if sep == -1:
+            return
+        (filename, _, line_no) = line[:sep].rpartition("(")
+        if not filename or not line_no.isdigit():
+            return
+        command = line[sep + 4:].split("(", 1)[0].strip()
+        self._add_hit(filename, int(line_no), command)
+
+    def _feed_json(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return
+        if "cmd" not in entry:
+            # version header
+            return
+        filename = entry.get("file", "")
+        line_no = entry.get("line", 0)
+        command = entry["cmd"]
+        self._add_hit(filename, line_no, command)
+        now = entry.get("time")
+        # global_frame (cmake >= 3.21) also counts included files
+        frame = entry.get("global_frame", entry.get("frame"))
+        if now is None or frame is None:
+            return
+        self.has_times = True
+        self._pop_frames(frame, now)
+        if self._previous:
+            key = self._previous[:2]
+            self.line_times[key] = self.line_times.get(key, 0) + \
+                                   now - self._previous[2]
+        self._previous = (filename, line_no, now)
+        self._stack.append((command.lower(), frame, now))
+
+    def _pop_frames(self, frame, now):
+        """ Commands started at a depth greater or equal than frame are
+        over
+
+        """
+        stack = self._stack
+        while stack and stack[-1][1] >= frame:
+            (command, _, start) = stack.pop()
+            # Only count the outermost call of recursive commands
+            if any(x[0] == command for x in stack):
                 continue
-            (filename, line_no) = match.groups()
-            if not qibuild_dir in filename:
+            self.inclusive_times[command] = \
+                self.inclusive_times.get(command, 0) + now - start
+
+    def _add_hit(self, filename, line_no, command):
+        filename = filename.replace("\\", "/")
+        key = (filename, line_no)
+        self.line_hits[key] = self.line_hits.get(key, 0) + 1
+        command = command.lower()
+        self.calls[command] = self.calls.get(command, 0) + 1
+
+    def finish(self):
+        """ To be called after the last line """
+        if self._previous:
+            self._pop_frames(0, self._previous[2])
+        self._previous = None
+
+    def get_kind(self, filename):
+        """ Whether the file is a qibuild module, a cmake module
+        or a file from the project
+
+        """
+        if self.qibuild_dir and filename.startswith(self.qibuild_dir + "/"):
+            return QIBUILD
+        if "/Modules/" in filename or filename.endswith("CMakeSystem.cmake"):
+            return CMAKE
+        return PROJECT
+
+    def get_file_stats(self):
+        """ Return a list of (filename, kind, hits, time) """
+        hits = dict()
+        times = dict()
+        for ((filename, _), value) in self.line_hits.iteritems():
+            hits[filename] = hits.get(filename, 0) + value
+        for ((filename, _), value) in self.line_times.iteritems():
+            times[filename] = times.get(filename, 0) + value
+        return [(x, self.get_kind(x), hits[x], times.get(x, 0)) for x in hits]
+
+    def get_qibuild_profile(self):
+        """ Return the line hits for qibuild modules only, as a dict
+        relative filename -> line_no -> hits (see :py:func:`gen_annotations`)
+
+        """
+        profile = dict()
+        if not self.qibuild_dir:
+            return profile
+        # 9 is len("/qibuild/")
+        prefix_len = len(self.qibuild_dir) + 9
+        for ((filename, line_no), hits) in self.line_hits.iteritems():
+            if self.get_kind(filename) != QIBUILD:
                 continue
-            # 9 is len("/qibuild/")
-            filename = filename[len(qibuild_dir) + 9:]
-            filename = filename.replace("\\" , "/" )
-            line_no = int(line_no)
-            if not filename in profile:
-                profile[filename] = dict()
-            if not line_no in profile[filename]:
-                profile[filename][line_no] = 0
-            profile[filename][line_no] += 1
-    dirname = os.path.dirname(input)
-    profile_pickle = os.path.join(dirname, "profile.pickle")
-    with open(profile_pickle, "w") as fp:
-        pickle.dump(profile, fp)
-    return profile
+            rel_path = filename[prefix_len:]
+            profile.setdefault(rel_path, dict())[line_no] = hits
+        return profile
+
+    def report(self, num_entries=20):
+        """ Return a ranked text report """
+        lines = list()
+        if self.has_times:
+            key = lambda x: (self.inclusive_times.get(x, 0), self.calls[x])
+        else:
+            key = lambda x: self.calls[x]
+        commands = sorted(self.calls, key=key, reverse=True)[:num_entries]
+        if not commands:
+            return "No cmake trace found\n"
+        pad = max(len(x) for x in commands) + 2
+        lines.append("Commands:")
+        lines.append("  %s %8s %10s" % ("name".ljust(pad), "calls", "time (s)"))
+        for command in commands:
+            if self.has_times:
+                time = "%10.3f" % self.inclusive_times.get(command, 0)
+            else:
+                time = "%10s" % "-"
+            lines.append("  %s %8i %s" % (command.ljust(pad),
+                                          self.calls[command], time))
+        lines.append("")
+        lines.append("Files:")
+        file_stats = self.get_file_stats()
+        if self.has_times:
+            file_stats.sort(key=lambda x: (x[3], x[2]), reverse=True)
+        else:
+            file_stats.sort(key=lambda x: x[2], reverse=True)
+        for (filename, kind, hits, time) in file_stats[:num_entries]:
+            if self.has_times:
+                lines.append("  %8i %10.3f  %-8s %s" % (hits, time, kind,
+                                                        filename))
+            else:
+                lines.append("  %8i  %-8s %s" % (hits, kind, filename))
+        return "\n".join(lines) + "\n"
+
+
+def analyze_trace(input, qibuild_dir=None):
+    """ Analyze a cmake trace log, returning a
+    :py:class:`TraceAnalyzer`
+
+    """
+    analyzer = TraceAnalyzer(qibuild_dir)
+    with open(input, "r") as fp:
+        for line in fp:
+            analyzer.feed(line)
+    analyzer.finish()
+    return analyzer
+
+
+def parse_cmake_log(input, qibuild_dir):
+    """ Parse cmake logs
+
+    Return the number of hits per line for each cmake file in qibuild,
+    (see :py:func:`gen_annotations`)
+    """
+    return analyze_trace(input, qibuild_dir).get_qibuild_profile()
 
 
 def gen_annotations(profile, out, qibuild_dir):
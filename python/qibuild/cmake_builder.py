@@ -4,7 +4,12 @@ import operator
 
 from qisys import ui
 import qisys.sh
+import qisys.parallel
+import qibuild.compiler_cache
 import qibuild.deps_solver
+import qibuild.gdb
+import qibuild.jobserver
+import qibuild.timings
 from qisys.abstractbuilder import AbstractBuilder
 
 class CMakeBuilder(AbstractBuilder):
@@ -17,6 +22,9 @@ class CMakeBuilder(AbstractBuilder):
         self.projects = projects
         self.deps_solver = qibuild.deps_solver.DepsSolver(build_worktree)
         self.dep_types = ["build", "runtime"]
+        self.timings = qibuild.timings.Timings()
+        # When set, the timings are written there after each step
+        self.timings_output = None
 
     def add_project(self, project):
         """ Add a project to the list of projects """
@@ -71,6 +79,36 @@ class CMakeBuilder(AbstractBuilder):
             return res
         return new_func
 
+    # pylint: disable-msg=E0213
+    def write_timings(func):
+        """ Decorator for every step that records timings, so that
+        the report is written (if asked) even if the step fails
+
+        """
+        @functools.wraps(func)
+        def new_func(self, *args, **kwargs):
+            try:
+                # pylint: disable-msg=E1102
+                return func(self, *args, **kwargs)
+            finally:
+                self.write_timings_report()
+        return new_func
+
+    def write_timings_report(self):
+        """ Write the timings recorded so far to ``timings_output``,
+        (see :py:meth:`qibuild.timings.Timings.write`)
+
+        """
+        if not self.timings_output:
+            return
+        deps = dict()
+        for project in self.build_worktree.build_projects:
+            deps[project.name] = sorted(project.build_depends)
+        summary_path = self.timings.write(self.timings_output, deps=deps)
+        ui.info(ui.green, "Timings written to", ui.reset,
+                ui.bold, self.timings_output, ui.reset,
+                ui.green, "and", ui.reset, ui.bold, summary_path)
+
     def bootstrap_projects(self):
         """ Write the dependencies.cmake and the qi/path.conf files for
         every project
@@ -98,6 +136,7 @@ class CMakeBuilder(AbstractBuilder):
         paths.extend([package.path for package in packages])
         project.fix_shared_libs(paths)
 
+    @write_timings
     def configure(self, *args, **kwargs):
         """ Configure the projects in the correct order """
         self.bootstrap_projects()
@@ -107,20 +146,33 @@ class CMakeBuilder(AbstractBuilder):
             ui.info_count(i, len(projects),
                           ui.green, "Configuring",
                           ui.blue, project.name)
-            project.configure(**kwargs)
+            with self.timings.record(project.name, "configure"):
+                project.configure(**kwargs)
 
     @need_configure
+    @write_timings
     def build(self, *args, **kwargs):
         """ Build the projects in the correct order """
         projects = self.deps_solver.get_dep_projects(self.projects, self.dep_types)
-        for i, project in enumerate(projects):
-            ui.info_count(i, len(projects),
-                          ui.green, "Building",
-                          ui.blue, project.name, update_title=True)
-            self.pre_build(project)
-            project.build(**kwargs)
+        cache_stats = qibuild.compiler_cache.read_stats(self.build_config)
+        # Every build joins the same jobserver, so that -j is a
+        # global limit
+        with qibuild.jobserver.JobServer(self.build_config.num_jobs) as jobserver:
+            for i, project in enumerate(projects):
+                ui.info_count(i, len(projects),
+                              ui.green, "Building",
+                              ui.blue, project.name, update_title=True)
+                with self.timings.record(project.name, "build"):
+                    self.pre_build(project)
+                    project.build(jobserver=jobserver, **kwargs)
+                self.timings.add_ninja_log(project.name,
+                                           project.build_directory)
+            jobserver.report()
+        qibuild.compiler_cache.report_stats(
+            cache_stats, qibuild.compiler_cache.read_stats(self.build_config))
 
     @need_configure
+    @write_timings
     def install(self, dest_dir, *args, **kwargs):
         """ Install the projects and the packages to the dest_dir """
         installed = list()
@@ -145,30 +197,127 @@ class CMakeBuilder(AbstractBuilder):
         if runtime_only:
             ui.info(ui.green, "(runtime components only)")
 
+        # debug symbols are split from the whole dest_dir, so do it
+        # once every project has been installed
+        split_debug = kwargs.pop("split_debug", False)
+        keep_fun = None
+        if split_debug:
+            # do not install again the binaries split last time
+            keep_fun = qibuild.gdb.is_stripped_copy
+
         if packages:
             print
             ui.info(ui.green, ":: ", "Installing packages")
-        for i, package in enumerate(packages):
-            ui.info_count(i, len(packages),
-                          ui.green, "Installing",
-                          ui.blue, package.name)
-            files = package.install(real_dest, runtime=runtime_only)
+            package_jobs = self.get_package_jobs(packages)
+            files = self.install_concurrently(packages,
+                lambda package: package.install(real_dest, runtime=runtime_only,
+                                                num_jobs=package_jobs,
+                                                keep_fun=keep_fun),
+                "Installing",
+                list_files=lambda package: package.get_install_files(
+                    runtime=runtime_only))
             installed.extend(files)
 
         print
         ui.info(ui.green, ":: ", "Installing projects")
-        for i, project in enumerate(projects):
-            ui.info_count(i, len(projects),
-                          ui.green, "Installing",
-                          ui.blue, project.name)
-            files = project.install(dest_dir, **kwargs)
+        components = kwargs.get("components")
+        files = self.install_concurrently(projects,
+            lambda project: project.install_files(dest_dir, **kwargs),
+            "Installing",
+            list_files=lambda project: project.get_last_installed_files(
+                components=components))
+        installed.extend(files)
+        # before post_install() writes the install stamps
+        if split_debug and projects:
+            with self.timings.record("debug symbols", "install"):
+                projects[-1].split_debug(dest_dir)
+        for project in projects:
+            with self.timings.record(project.name, "install"):
+                project.post_install(dest_dir, components=components)
+        return installed
+
+    def get_package_jobs(self, packages):
+        """ Number of threads each package may use to copy its files
+        when installing ``packages`` concurrently, so that the total
+        stays within ``build_config.num_jobs``
+
+        """
+        num_jobs = qisys.parallel.get_num_jobs(self.build_config.num_jobs)
+        return max(1, num_jobs / max(1, len(packages)))
+
+    def install_concurrently(self, to_install, install_func, action,
+                             phase="install", list_files=None):
+        """ Call install_func on every element of to_install (packages or
+        projects), using ``build_config.num_jobs`` threads.
+        The time spent is recorded in the given phase.
+
+        Elements installing the same files are installed one after the
+        other, in the order of to_install, so that the result is the same
+        as when installing everything serially. ``list_files`` should
+        return the files an element is going to install, or None when
+        they are not known yet: conflicts found after the install are
+        fixed by installing the conflicting elements again, serially.
+
+        Return the list of installed files.
+        Warn when the same file is installed by several elements
+
+        """
+        num_jobs = qisys.parallel.get_num_jobs(self.build_config.num_jobs)
+        def install_one(i_and_elem):
+            (i, elem) = i_and_elem
+            ui.info_count(i, len(to_install),
+                          ui.green, action,
+                          ui.blue, elem.name)
+            with self.timings.record(elem.name, phase):
+                return install_func(elem)
+        serial = set()
+        if list_files and num_jobs > 1 and len(to_install) > 1:
+            predicted = [(i, list_files(elem) or list())
+                         for (i, elem) in enumerate(to_install)]
+            for (_, owners) in find_install_conflicts(predicted):
+                serial.update(owners)
+        concurrent = [(i, elem) for (i, elem) in enumerate(to_install)
+                      if i not in serial]
+        results = [None] * len(to_install)
+        concurrent_results = qisys.parallel.parallel_map(install_one,
+                                                         concurrent,
+                                                         num_jobs=num_jobs,
+                                                         chunksize=1)
+        for ((i, _), files) in zip(concurrent, concurrent_results):
+            results[i] = files
+        for i in sorted(serial):
+            results[i] = install_one((i, to_install[i]))
+        to_redo = set()
+        for (_, owners) in find_install_conflicts(enumerate(results)):
+            if not serial.issuperset(owners):
+                to_redo.update(owners)
+        for i in sorted(to_redo):
+            results[i] = install_one((i, to_install[i]))
+        names = [elem.name for elem in to_install]
+        check_install_conflicts(zip(names, results))
+        installed = list()
+        for files in results:
             installed.extend(files)
         return installed
 
 
     @need_configure
-    def deploy(self, url, use_rsync=True, split_debug=False, with_tests=False):
-        """ Deploy the project and the packages it depends to a remote url """
+    @write_timings
+    def deploy(self, urls, use_rsync=True, split_debug=False, with_tests=False,
+               verify=False):
+        """ Deploy the project and the packages it depends to one or
+        several remote urls.
+
+        Everything is installed once in a local deploy dir, which is
+        then sent to every url concurrently, using one ssh connection
+        per host.
+
+        Only the files that changed since the last deploy to the same url
+        are sent, unless ``verify`` is True
+
+        """
+        if isinstance(urls, basestring):
+            urls = [urls]
 
         # Deploy packages: install all of them in the same temp dir, then
         # deploy this temp dir to the target
@@ -192,52 +341,150 @@ class CMakeBuilder(AbstractBuilder):
             ui.info(ui.green, "and the following packages")
             for package in sorted(dep_packages, key=operator.attrgetter("name")):
                 ui.info(" *", ui.blue, package.name)
-        ui.info(ui.green, "will be deployed to", ui.blue, url)
+        ui.info(ui.green, "will be deployed to")
+        for url in urls:
+            ui.info(ui.green, " *", ui.blue, url)
 
         if dep_packages:
             print
             ui.info(ui.green, ":: ", "Deploying packages")
-            for i, package in enumerate(dep_packages):
-                ui.info_count(i, len(dep_packages),
-                    ui.green, "Deploying package", ui.blue, package.name,
-                    ui.green, "to", ui.blue, url)
-                # Install package in local deploy dir
-                files = package.install(deploy_dir, runtime=True)
-                to_deploy.extend(files)
+            # Install packages in local deploy dir
+            package_jobs = self.get_package_jobs(dep_packages)
+            keep_fun = None
+            if split_debug:
+                keep_fun = qibuild.gdb.is_stripped_copy
+            files = self.install_concurrently(dep_packages,
+                lambda package: package.install(deploy_dir, runtime=True,
+                                                num_jobs=package_jobs,
+                                                keep_fun=keep_fun),
+                "Deploying package", phase="deploy",
+                list_files=lambda package: package.get_install_files(
+                    runtime=True))
+            to_deploy.extend(files)
 
         print
         ui.info(ui.green, ":: ", "Deploying projects")
         # Deploy projects: install them inside a 'deploy' dir in the worktree
         # root, then deploy this dir to the target
 
-        for (i, project) in enumerate(dep_projects):
-            ui.info_count(i, len(dep_projects),
-                    ui.green, "Deploying project", ui.blue, project.name,
-                    ui.green, "to", ui.blue, url)
-
-            components = ["runtime"]
-            if with_tests:
-                components.append("test")
-                to_deploy.append("qitest.json")
-            # Install project in local deploy dir
-            installed = project.install(deploy_dir, components=components)
-            to_deploy.extend(installed)
-            if split_debug:
-                project.split_debug(deploy_dir)
-        # Add debugging scripts
-        for project in self.projects:
-            scripts = qibuild.deploy.generate_debug_scripts(self, deploy_dir,
-                                                            project.name, url)
-            to_deploy.extend(scripts)
+        components = ["runtime"]
+        if with_tests:
+            components.append("test")
+            to_deploy.append("qitest.json")
+        # Install projects in local deploy dir
+        installed = self.install_concurrently(dep_projects,
+            lambda project: project.install_files(deploy_dir,
+                                                  components=components),
+            "Deploying project", phase="deploy",
+            list_files=lambda project: project.get_last_installed_files(
+                components=components))
+        to_deploy.extend(installed)
+        # debug symbols are split from the whole deploy_dir, so only
+        # do it once, before post_install() writes the install stamps
+        if split_debug and dep_projects:
+            with self.timings.record("debug symbols", "deploy"):
+                dep_projects[-1].split_debug(deploy_dir)
+        for project in dep_projects:
+            with self.timings.record(project.name, "deploy"):
+                project.post_install(deploy_dir, components=components)
 
         # Write the list of files to be deployed
         with open(deploy_manifest, "a") as f:
             set_to_deploy = set(to_deploy)
-            f.write("\n".join(set_to_deploy))
-        qibuild.deploy.deploy(deploy_dir, url, use_rsync=use_rsync,
-                              filelist=deploy_manifest)
+            f.write("\n".join(sorted(set_to_deploy)))
 
         print
+        ui.info(ui.green, ":: ", "Sending files")
+        with qibuild.deploy.SSHMultiplexer() as ssh:
+            def send(url):
+                with self.timings.record(url, "deploy") as event:
+                    result = self._send_to_url(deploy_dir, deploy_manifest,
+                                               url, ssh=ssh,
+                                               use_rsync=use_rsync,
+                                               verify=verify,
+                                               quiet=len(urls) > 1)
+                    event["bytes"] = result.bytes_sent
+                    if not result.ok:
+                        event["error"] = str(result.error)
+                    return result
+            results = qisys.parallel.parallel_map(send, urls,
+                                                  num_jobs=len(urls),
+                                                  chunksize=1)
+        print
+        qibuild.deploy.print_summary(results)
+        failed = [x.url for x in results if not x.ok]
+        if failed:
+            raise Exception("Deploy failed for: %s" % ", ".join(failed))
+
+    def _send_to_url(self, deploy_dir, deploy_manifest, url, ssh=None,
+                     use_rsync=True, verify=False, quiet=False):
+        """ Helper for deploy(): send the deploy dir, and the debug scripts
+        generated for this url. Returns a :py:class:`.DeployResult`
+
+        """
+        result = qibuild.deploy.DeployResult(url)
+        timer = ui.timer("deploy to %s" % url)
+        timer.start()
+        try:
+            url_dir = qibuild.deploy.get_url_dir(deploy_dir, url)
+            scripts_dir = os.path.join(url_dir, "scripts")
+            qisys.sh.mkdir(scripts_dir, recursive=True)
+            # Add debugging scripts
+            for project in self.projects:
+                qibuild.deploy.generate_debug_scripts(self, scripts_dir,
+                                                      project.name, url)
+            record_path = os.path.join(url_dir, "record.json")
+            record = qibuild.deploy.DeployRecord(record_path)
+            bytes_sent = qibuild.deploy.deploy(deploy_dir, url,
+                                               use_rsync=use_rsync,
+                                               filelist=deploy_manifest,
+                                               record=record, verify=verify,
+                                               ssh=ssh, quiet=quiet)
+            scripts_bytes = qibuild.deploy.deploy(scripts_dir, url,
+                                                  use_rsync=use_rsync,
+                                                  ssh=ssh, quiet=True)
+            if bytes_sent is not None and scripts_bytes is not None:
+                bytes_sent += scripts_bytes
+            result.bytes_sent = bytes_sent
+            result.ok = True
+        except Exception, e:
+            ui.error("Deploy to", url, "failed:\n", e)
+            result.error = e
+        timer.stop()
+        result.elapsed_time = timer.elapsed_time.total_seconds()
+        return result
+
+
+def find_install_conflicts(installed):
+    """ Find the files installed by several packages or projects
+
+    :param installed: a list of (name, installed files) tuples
+    :return: a sorted list of (path, names) tuples
+
+    """
+    owners = dict()
+    for (name, files) in installed:
+        # install manifests may list the same file twice
+        for path in set(files):
+            owners.setdefault(path, list()).append(name)
+    conflicts = [(path, names) for (path, names) in owners.iteritems()
+                 if len(names) > 1]
+    conflicts.sort()
+    return conflicts
+
+
+def check_install_conflicts(installed):
+    """ Warn about files installed by several packages or projects
+
+    :param installed: a list of (name, installed files) tuples
+    :return: a list of (path, names) tuples
+
+    """
+    conflicts = find_install_conflicts(installed)
+    for (path, names) in conflicts:
+        ui.warning(path, "is installed by both", " and ".join(names))
+    return conflicts
+
 
 class NotConfigured(Exception):
     def __init__(self, project):
@@ -0,0 +1,147 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Use a compiler cache such as ccache when building projects
+
+The launcher is set in the generated dependencies.cmake file, using
+the ``CMAKE_<LANG>_COMPILER_LAUNCHER`` variables, along with the
+location and the maximum size of the cache, so that running
+``make`` by hand in a build directory uses the same cache.
+
+"""
+
+import os
+import subprocess
+
+from qisys import ui
+import qisys.command
+import qisys.sh
+
+# program -> (variable for the cache directory, variable for the max size)
+CACHE_ENV_VARS = {
+    "ccache"  : ("CCACHE_DIR", "CCACHE_MAXSIZE"),
+    "sccache" : ("SCCACHE_DIR", "SCCACHE_CACHE_SIZE"),
+}
+
+# Languages using the launcher
+LANGUAGES = ["C", "CXX"]
+
+# Keys of ``ccache --print-stats``
+_HIT_KEYS = ["direct_cache_hit", "preprocessed_cache_hit"]
+_MISS_KEYS = ["cache_miss"]
+
+
+def get_env_vars(build_config):
+    """ Return a list of (name, value) of the environment variables
+    configuring the compiler cache
+
+    """
+    compiler_cache = build_config.compiler_cache
+    program_name = os.path.basename(compiler_cache.program)
+    program_name = os.path.splitext(program_name)[0]
+    if program_name not in CACHE_ENV_VARS:
+        return list()
+    (dir_var, size_var) = CACHE_ENV_VARS[program_name]
+    res = [(dir_var, build_config.compiler_cache_dir)]
+    if compiler_cache.max_size:
+        res.append((size_var, compiler_cache.max_size))
+    return res
+
+def get_launcher(build_config):
+    """ Return the command line to put in front of the
+    compiler, as a list, or None if no compiler cache
+    should be used
+
+    """
+    compiler_cache = build_config.compiler_cache
+    if not compiler_cache:
+        return None
+    program = qisys.command.find_program(compiler_cache.program,
+                                         env=build_config.build_env)
+    if not program:
+        ui.warning("Compiler cache", compiler_cache.program, "not found,",
+                   "building without it")
+        return None
+    env_vars = get_env_vars(build_config)
+    if not env_vars:
+        return [program]
+    if os.name == "posix":
+        res = ["env"]
+    else:
+        res = ["${CMAKE_COMMAND}", "-E", "env"]
+    res.extend("%s=%s" % (name, qisys.sh.to_posix_path(value))
+               for (name, value) in env_vars)
+    res.append(qisys.sh.to_posix_path(program))
+    return res
+
+def get_cmake_code(build_config):
+    """ The CMake code to add to dependencies.cmake """
+    launcher = get_launcher(build_config)
+    if not launcher:
+        # Only remove the launcher if it was set by qibuild
+        return """
+# No compiler cache:
+if(DEFINED QI_COMPILER_LAUNCHER)
+  foreach(_lang {languages})
+    if("${{CMAKE_${{_lang}}_COMPILER_LAUNCHER}}" STREQUAL "${{QI_COMPILER_LAUNCHER}}")
+      unset(CMAKE_${{_lang}}_COMPILER_LAUNCHER CACHE)
+    endif()
+  endforeach()
+  unset(QI_COMPILER_LAUNCHER CACHE)
+endif()
+""".format(languages=" ".join(LANGUAGES))
+    launcher = ";".join(launcher)
+    res = "\n# Compiler cache:\n"
+    res += 'set(QI_COMPILER_LAUNCHER "%s" CACHE INTERNAL "" FORCE)\n' % launcher
+    for lang in LANGUAGES:
+        res += 'set(CMAKE_%s_COMPILER_LAUNCHER "%s" CACHE STRING "" FORCE)\n' % \
+               (lang, launcher)
+    return res
+
+def read_stats(build_config):
+    """ Return the statistics of the compiler cache of the current config,
+    as a dict name -> number, or None if they cannot be read
+
+    Only ccache is supported
+
+    """
+    compiler_cache = build_config.compiler_cache
+    if not compiler_cache:
+        return None
+    program = qisys.command.find_program(compiler_cache.program,
+                                         env=build_config.build_env)
+    if not program or "ccache" != \
+            os.path.splitext(os.path.basename(program))[0]:
+        return None
+    env = build_config.build_env.copy()
+    env.update(get_env_vars(build_config))
+    try:
+        out = qisys.command.check_output([program, "--print-stats"],
+                                         env=env, stderr=subprocess.PIPE)
+    except (OSError, qisys.command.CommandFailedException):
+        return None
+    res = dict()
+    for line in out.splitlines():
+        (key, _, value) = line.partition("\t")
+        if value.strip().isdigit():
+            res[key] = int(value)
+    return res
+
+def report_stats(before, after):
+    """ Display the hit rate of the compiler cache between two
+    calls to :py:func:`read_stats`
+
+    """
+    if before is None or after is None:
+        return
+    def delta(keys):
+        return sum(after.get(x, 0) - before.get(x, 0) for x in keys)
+    hits = delta(_HIT_KEYS)
+    misses = delta(_MISS_KEYS)
+    total = hits + misses
+    if not total:
+        return
+    ui.info(ui.green, "Compiler cache:", ui.reset,
+            "%i hits, %i misses," % (hits, misses),
+            "hit rate: %.1f%%" % (100.0 * hits / total))
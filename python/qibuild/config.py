@@ -7,8 +7,10 @@
 
 """
 
+import copy
 import os
 import operator
+import threading
 
 
 from qisys import ui
@@ -26,6 +28,119 @@ def get_global_cfg_path():
     return qisys.sh.get_config_path("qi", "qibuild.xml")
 
 
+class ConfigRepository(object):
+    """ Parses each configuration file only once per process, and
+    again only when the file changes on disk.
+
+    * :py:meth:`read` returns a tree shared by every reader, which
+      must not be modified
+    * :py:meth:`edit` returns a copy to be modified and given
+      to :py:meth:`write`
+    * :py:meth:`get_view` returns an object built from the file,
+      shared too
+
+    """
+    def __init__(self):
+        # path -> (file state, tree, dict view class -> view)
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_state(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size, st.st_ino)
+
+    def _get_entry(self, path):
+        path = os.path.abspath(path)
+        state = self._get_state(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == state:
+                return entry
+        tree = qisys.qixml.read(path)
+        entry = (state, tree, dict())
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def read(self, path):
+        """ Return the ElementTree of an xml file. Do not modify it """
+        return self._get_entry(path)[1]
+
+    def edit(self, path):
+        """ Return a copy of the ElementTree of an xml file, to be
+        modified and then written with :py:meth:`write`
+
+        """
+        return copy.deepcopy(self.read(path))
+
+    def get_view(self, path, factory):
+        """ Return ``factory(path)``, computed again only when the
+        file changes. The result is shared: do not modify it
+
+        """
+        entry = self._get_entry(path)
+        views = entry[2]
+        with self._lock:
+            if factory in views:
+                return views[factory]
+        view = factory(path)
+        with self._lock:
+            views[factory] = view
+        return view
+
+    def write(self, xml_obj, path):
+        """ Write an Element or an ElementTree to path,
+        (see :py:func:`qisys.qixml.write`)
+
+        """
+        qisys.qixml.write(xml_obj, path)
+        if not isinstance(path, basestring):
+            return
+        if not isinstance(xml_obj, etree.ElementTree):
+            xml_obj = etree.ElementTree(element=xml_obj)
+        path = os.path.abspath(path)
+        with self._lock:
+            self._entries[path] = (self._get_state(path), xml_obj, dict())
+
+    def clear(self):
+        """ Forget every parsed file """
+        with self._lock:
+            self._entries.clear()
+
+
+_REPOSITORY = ConfigRepository()
+
+def get_repository():
+    """ The :py:class:`ConfigRepository` shared by the whole process """
+    return _REPOSITORY
+
+def get_global_config():
+    """ The :py:class:`QiBuildConfig` read from the global config file,
+    shared by every caller: do not modify it
+
+    """
+    cfg_path = get_global_cfg_path()
+    create_global_cfg(cfg_path)
+    return _REPOSITORY.get_view(cfg_path, _read_qibuild_config)
+
+def _read_qibuild_config(cfg_path):
+    qibuild_cfg = QiBuildConfig()
+    qibuild_cfg.read(cfg_path)
+    return qibuild_cfg
+
+def create_global_cfg(cfg_path):
+    """ Create an empty global config file if it does not exist """
+    if not os.path.exists(cfg_path):
+        dirname = os.path.dirname(cfg_path)
+        qisys.sh.mkdir(dirname, recursive=True)
+        with open(cfg_path, "w") as fp:
+            fp.write('<qibuild />\n')
+
+
 class Env:
     def __init__(self):
         self.path = None
@@ -86,23 +201,76 @@ class IDE:
         return res
 
 
+class CompilerCache:
+    """ A compiler launcher such as ccache, used to speed up
+    the compilation of every project
+
+    """
+    def __init__(self):
+        self.enabled = True
+        self.program = "ccache"
+        # Directory containing the caches, one per config.
+        # Defaults to ~/.cache/qi/compiler-cache
+        self.dir = None
+        # Maximum size of each cache, for instance "5G"
+        self.max_size = None
+
+    def parse(self, tree):
+        self.enabled = qisys.qixml.parse_bool_attr(tree, "enabled",
+                                                   default=True)
+        self.program = tree.get("program", "ccache")
+        self.dir = tree.get("dir")
+        self.max_size = tree.get("max_size")
+
+    def tree(self):
+        tree = etree.Element("compiler_cache")
+        if not self.enabled:
+            tree.set("enabled", "false")
+        tree.set("program", self.program)
+        if self.dir:
+            tree.set("dir", self.dir)
+        if self.max_size:
+            tree.set("max_size", self.max_size)
+        return tree
+
+    def __str__(self):
+        res = "compiler cache: %s" % self.program
+        if not self.enabled:
+            res += " (disabled)"
+        res += "\n"
+        if self.dir:
+            res += "compiler cache dir: %s\n" % self.dir
+        if self.max_size:
+            res += "compiler cache max size: %s\n" % self.max_size
+        return res
+
+
 class Build:
     def __init__(self):
         self.incredibuild = False
+        self.compiler_cache = None
 
     def parse(self, tree):
         self.incredibuild = qisys.qixml.parse_bool_attr(tree, "incredibuild")
+        compiler_cache_tree = tree.find("compiler_cache")
+        if compiler_cache_tree is not None:
+            self.compiler_cache = CompilerCache()
+            self.compiler_cache.parse(compiler_cache_tree)
 
     def tree(self):
         tree = etree.Element("build")
         if self.incredibuild:
             tree.set("incredibuild", "true")
+        if self.compiler_cache:
+            tree.append(self.compiler_cache.tree())
         return tree
 
     def __str__(self):
         res = ""
         if self.incredibuild:
             res += "incredibuild: %s\n" % self.incredibuild
+        if self.compiler_cache:
+            res += str(self.compiler_cache)
         return res
 
 
@@ -288,12 +456,18 @@ class LocalBuild:
     def __init__(self):
         self.sdk_dir = None
         self.build_dir = None
+        # Overrides the compiler cache from the global config
+        self.compiler_cache = None
 
     def parse(self, tree):
         # Not calling to_native_path because build_dir and sdk_dir can be
         # relative to the worktree
         self.build_dir = tree.get("build_dir")
         self.sdk_dir = tree.get("sdk_dir")
+        compiler_cache_tree = tree.find("compiler_cache")
+        if compiler_cache_tree is not None:
+            self.compiler_cache = CompilerCache()
+            self.compiler_cache.parse(compiler_cache_tree)
 
     def tree(self):
         tree = etree.Element("build")
@@ -301,6 +475,8 @@ class LocalBuild:
             tree.set("build_dir", self.build_dir)
         if self.sdk_dir:
             tree.set("sdk_dir", self.sdk_dir)
+        if self.compiler_cache:
+            tree.append(self.compiler_cache.tree())
         return tree
 
     def __str__(self):
@@ -309,6 +485,8 @@ class LocalBuild:
             res += "build_dir: %s\n" % self.build_dir
         if self.sdk_dir:
             res += "sdk_dir: %s\n" % self.sdk_dir
+        if self.compiler_cache:
+            res += str(self.compiler_cache)
         return res
 
 
@@ -398,15 +576,14 @@ class QiBuildConfig:
         """
         if not cfg_path:
             cfg_path = get_global_cfg_path()
-            if not os.path.exists(cfg_path):
-                if create_if_missing:
-                    dirname = os.path.dirname(cfg_path)
-                    qisys.sh.mkdir(dirname, recursive=True)
-                    with open(cfg_path, "w") as fp:
-                        fp.write('<qibuild />\n')
+            if create_if_missing:
+                create_global_cfg(cfg_path)
         ui.debug("Reading config from", cfg_path)
         try:
-            self.tree.parse(cfg_path)
+            if isinstance(cfg_path, basestring):
+                self.tree = _REPOSITORY.read(cfg_path)
+            else:
+                self.tree.parse(cfg_path)
         except Exception, e:
             mess  = "Could not parse config from %s\n" % cfg_path
             mess += "Error was: %s" % str(e)
@@ -457,7 +634,10 @@ class QiBuildConfig:
 
     def read_local_config(self, local_xml_path):
         """ Apply a local configuration """
-        local_tree = etree.parse(local_xml_path)
+        if isinstance(local_xml_path, basestring):
+            local_tree = _REPOSITORY.read(local_xml_path)
+        else:
+            local_tree = etree.parse(local_xml_path)
         self.local.parse(local_tree)
         default_config = self.local.defaults.config
         if default_config:
@@ -466,7 +646,7 @@ class QiBuildConfig:
     def write_local_config(self, local_xml_path):
         """ Dump local settings to a xml file """
         local_tree = self.local.tree()
-        qisys.qixml.write(local_tree, local_xml_path)
+        _REPOSITORY.write(local_tree, local_xml_path)
 
     def set_active_config(self, config):
         """ Merge various configs from <defaults> and the
@@ -600,7 +780,7 @@ class QiBuildConfig:
             server_tree = server.tree()
             qibuild_tree.append(server_tree)
 
-        qisys.qixml.write(qibuild_tree, xml_path)
+        _REPOSITORY.write(qibuild_tree, xml_path)
 
     def __str__(self):
         res = ""
@@ -761,8 +941,7 @@ def get_build_env():
     qibuild config file
 
     """
-    qibuild_cfg = QiBuildConfig()
-    qibuild_cfg.read(create_if_missing=True)
+    qibuild_cfg = get_global_config()
     envsetter = qisys.envsetter.EnvSetter()
     envsetter.read_config(qibuild_cfg)
     return envsetter.get_build_env()
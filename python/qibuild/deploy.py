@@ -5,12 +5,21 @@
 """ Tools to deploy files to remote targets"""
 
 import urlparse
+import hashlib
+import json
 import os
+import re
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
 
 from collections import OrderedDict
 
 from qisys import ui
 import qisys.command
+import qisys.sh
 import qibuild.deploy
 
 FILE_SETUP_GDB  = """\
@@ -102,16 +111,192 @@ def parse_url(remote_url):
         ret["port"] = port
     return ret
 
-def deploy(local_directory, remote_url, use_rsync=True, filelist=None):
-    """Deploy a local directory to a remote url."""
+def get_url_dir(deploy_dir, remote_url):
+    """ Directory where to store what is specific to a remote url:
+    the :py:class:`DeployRecord` and the debug scripts
+
+    """
+    url_name = re.sub(r"[^\w.@-]", "_", remote_url)
+    return os.path.join(os.path.dirname(deploy_dir), "deployed",
+                        os.path.basename(deploy_dir), url_name)
+
+
+class SSHMultiplexer(object):
+    """ Share one master ssh connection per host between all the
+    ssh and rsync calls made inside a ``with`` statement::
+
+        with SSHMultiplexer() as ssh:
+            deploy(local_dir, url, ssh=ssh)
+
+    Does nothing on Windows
+
+    """
+    def __init__(self):
+        self.control_dir = None
+        self.hosts = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if os.name != 'nt':
+            # Keep this short: unix socket paths are limited to ~100 chars
+            tmp = "/tmp" if os.path.isdir("/tmp") else None
+            self.control_dir = tempfile.mkdtemp(prefix="qi-ssh-", dir=tmp)
+        return self
+
+    def __exit__(self, *unused):
+        if not self.control_dir:
+            return
+        for host in sorted(self.hosts):
+            cmd = ["ssh"] + self._control_options() + ["-O", "exit", host]
+            # May have already exited, so ignore errors
+            subprocess.call(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT)
+        qisys.sh.rm(self.control_dir)
+
+    def _control_options(self):
+        control_path = os.path.join(self.control_dir, "%r@%h:%p")
+        return ["-o", "ControlPath=%s" % control_path]
+
+    def get_options(self, host):
+        """ ssh options to use when connecting to ``host`` """
+        if not self.control_dir:
+            return list()
+        with self._lock:
+            self.hosts.add(host)
+        return ["-o", "ControlMaster=auto",
+                "-o", "ControlPersist=60"] + self._control_options()
+
+
+class DeployRecord(object):
+    """ What was last deployed to a remote url: for each file
+    (relative to the local deploy directory), its size, its mtime
+    and the sha1 of its contents.
+
+    Stored in a json file, so that the next deploy only needs
+    to send the files that changed
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.files = dict()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as fp:
+                self.files = json.load(fp)
+
+    def save(self):
+        """ Write the record back to disk """
+        qisys.sh.mkdir(os.path.dirname(self.path), recursive=True)
+        with open(self.path, "w") as fp:
+            json.dump(self.files, fp)
+
+    def get_changes(self, local_directory, filenames, verify=False):
+        """ Return a tuple (changed, states): the list of files that
+        changed since the last deploy, and the new states of every file,
+        to be used with :py:meth:`update` once the deploy is done.
+
+        The sha1 is only computed for files whose size or mtime changed,
+        unless ``verify`` is True, in which case every file is considered
+        to have changed
+
+        """
+        changed = list()
+        states = dict()
+        for filename in filenames:
+            key = filename.lstrip("/")
+            full_path = os.path.join(local_directory, key)
+            try:
+                file_stat = os.lstat(full_path)
+            except OSError:
+                # let rsync complain about it
+                changed.append(filename)
+                continue
+            previous = self.files.get(key)
+            if not verify and previous and \
+                    previous["size"] == file_stat.st_size and \
+                    previous["mtime"] == file_stat.st_mtime:
+                states[key] = previous
+                continue
+            if stat.S_ISLNK(file_stat.st_mode):
+                digest = hashlib.sha1(os.readlink(full_path)).hexdigest()
+            elif stat.S_ISDIR(file_stat.st_mode):
+                digest = None
+            else:
+                digest = qisys.sh.file_digest(full_path)
+            states[key] = {"size": file_stat.st_size,
+                           "mtime": file_stat.st_mtime,
+                           "digest": digest}
+            if verify or not previous or previous["digest"] != digest:
+                changed.append(filename)
+        return (changed, states)
+
+    def update(self, states):
+        """ Called when the deploy is done """
+        self.files = states
+        self.save()
+
+
+def deploy(local_directory, remote_url, use_rsync=True, filelist=None,
+           record=None, verify=False, ssh=None, quiet=False):
+    """Deploy a local directory to a remote url.
+
+    :param filelist: path to a file containing the list of files to
+                     deploy, relative to ``local_directory``
+    :param record: a :py:class:`DeployRecord`. If set, only the files
+                   of the filelist that changed since the last deploy
+                   will be sent
+    :param verify: send every file of the filelist, letting rsync compare
+                   their checksums with the remote files
+    :param ssh: a :py:class:`SSHMultiplexer`
+    :param quiet: do not display rsync output
+
+    :return: the number of bytes sent by rsync (None when using scp)
+
+    """
     parts = parse_url(remote_url)
+    changes_list = None
+    states = None
+    if use_rsync and filelist and record is not None:
+        with open(filelist, "r") as fp:
+            filenames = [x for x in fp.read().splitlines() if x]
+        (changed, states) = record.get_changes(local_directory, filenames,
+                                               verify=verify)
+        if not changed:
+            ui.info(ui.green, "Nothing changed since last deploy to",
+                    ui.blue, remote_url)
+            record.update(states)
+            return 0
+        ui.info(ui.green, "Sending", ui.blue, len(changed),
+                ui.green, "/", ui.blue, len(filenames),
+                ui.green, "files to", ui.blue, remote_url)
+        (fd, changes_list) = tempfile.mkstemp(prefix="deploy-", suffix=".txt")
+        with os.fdopen(fd, "w") as fp:
+            fp.write("\n".join(changed))
+        filelist = changes_list
+    try:
+        bytes_sent = _deploy(local_directory, remote_url, parts,
+                             use_rsync=use_rsync, filelist=filelist,
+                             verify=verify, ssh=ssh, quiet=quiet)
+    finally:
+        if changes_list:
+            qisys.sh.rm(changes_list)
+    if states is not None:
+        record.update(states)
+    return bytes_sent
+
+def _deploy(local_directory, remote_url, parts, use_rsync=True,
+            filelist=None, verify=False, ssh=None, quiet=False):
+    """ Helper for deploy() """
+    host = parts["login"] + "@" + parts["url"]
+    ssh_options = list()
+    if ssh:
+        ssh_options = ssh.get_options(host)
     # ensure destination directory exist before deploying data
     if len(remote_url.split(":")) > 1:
         cmd = ["ssh"]
         if parts.has_key("port"):
             cmd.extend(["-p", str(parts["port"])])
-        cmd.extend([parts["login"]+"@"+parts["url"], "mkdir", "-p",
-                parts["dir"]])
+        cmd.extend(ssh_options)
+        cmd.extend([host, "mkdir", "-p", parts["dir"]])
         qisys.command.call(cmd)
     if use_rsync:
         # This is required for rsync to do the right thing,
@@ -124,23 +309,88 @@ def deploy(local_directory, remote_url, use_rsync=True, filelist=None):
             "--perms",
             "--times",
             "--specials",
-            "--progress", # print a progress bar
-            "--checksum", # verify checksum instead of size and date
+            "--stats", # used to get the number of bytes sent
             "--exclude=.debug/"]
+        if not quiet:
+            cmd.append("--progress") # print a progress bar
+        if verify:
+            cmd.append("--checksum") # verify checksum instead of size and date
+        rsh = ["ssh"]
         if parts.has_key("port"):
-            cmd.extend(["-e", "ssh -p %d" % parts["port"]]) # custom ssh port
-        else:
-            cmd.extend(["-e", "ssh"]) # custom ssh port
-        cmd.extend([local_directory, parts["login"]+"@"+parts["url"]+":"+parts["dir"]])
+            rsh.extend(["-p", str(parts["port"])]) # custom ssh port
+        rsh.extend(ssh_options)
+        cmd.extend(["-e", " ".join(rsh)])
+        cmd.extend([local_directory, host + ":" + parts["dir"]])
 
         if filelist:
             cmd.append("--files-from=%s" % filelist)
+        return _call_rsync(cmd, quiet=quiet)
     else:
         # Default to scp
         cmd = ["scp", "-r", local_directory, remote_url]
         if parts.has_key("port"):
             cmd.extend(["-p", str(parts["port"])])
-    qisys.command.call(cmd)
+        qisys.command.call(cmd)
+        return None
+
+def _call_rsync(cmd, quiet=False):
+    """ Run rsync, and return the number of bytes it sent,
+    parsed from the ``--stats`` output
+
+    """
+    rsync = qisys.command.find_program(cmd[0])
+    if not rsync:
+        raise qisys.command.NotInPath(cmd[0])
+    cmd[0] = rsync
+    ui.debug("Calling:", " ".join(cmd))
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT)
+    out = list()
+    bytes_sent = None
+    for line in iter(process.stdout.readline, ""):
+        if quiet:
+            out.append(line)
+        else:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+        match = re.match(r"Total bytes sent: ([\d,.]+)", line)
+        if match:
+            bytes_sent = int(re.sub(r"\D", "", match.group(1)))
+    process.wait()
+    if process.returncode != 0:
+        raise qisys.command.CommandFailedException(cmd, process.returncode,
+                                                   stdout="".join(out))
+    return bytes_sent
+
+class DeployResult(object):
+    """ What happened when deploying to one url """
+    def __init__(self, url):
+        self.url = url
+        self.ok = False
+        self.error = None
+        # None when unknown (for instance when using scp)
+        self.bytes_sent = None
+        # in seconds
+        self.elapsed_time = 0
+
+
+def print_summary(results):
+    """ Display a list of :py:class:`DeployResult` """
+    ui.info(ui.green, ":: ", "Deploy summary")
+    max_len = max(len(x.url) for x in results)
+    for result in results:
+        if result.ok:
+            status = [ui.green, "[OK]    "]
+        else:
+            status = [ui.red, "[FAILED]"]
+        if result.bytes_sent is None:
+            sent = "?"
+        else:
+            sent = ui.format_size(result.bytes_sent)
+        ui.info(ui.blue, result.url.ljust(max_len + 2),
+                *(status + [ui.reset, "sent:", sent.rjust(9),
+                            "in %.1fs" % result.elapsed_time]))
+
 
 def _generate_setup_gdb(dest, sysroot="\"\"", solib_search_path=[], remote_gdb_address=""):
     """ generate a script that connects a local gdb to a gdbserver """
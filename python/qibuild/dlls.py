@@ -8,6 +8,7 @@
 import os
 
 from qisys import ui
+import qisys.scan
 import qisys.sh
 
 def fix_dlls(sdk_dir, env=None, paths=None, mingw=False):
@@ -23,12 +24,8 @@ def fix_dlls(sdk_dir, env=None, paths=None, mingw=False):
     dlls_to_copy = list()
     for path in paths:
         bin_dir = os.path.join(path, "bin")
-        if not os.path.exists(bin_dir):
-            continue
-        dlls = os.listdir(bin_dir)
-        dlls = [x for x in dlls if x.endswith(".dll")]
-        dlls = [os.path.join(bin_dir, x) for x in dlls]
-        dlls_to_copy.extend(dlls)
+        dlls = qisys.scan.list_dir(bin_dir, patterns="*.dll")
+        dlls_to_copy.extend(x.path for x in dlls)
     if mingw:
         # Copy libgcc and mingw dll
         if not env:
@@ -36,14 +33,9 @@ def fix_dlls(sdk_dir, env=None, paths=None, mingw=False):
         env_path = env["PATH"]
         candidates = env_path.split(os.path.pathsep)
         for candidate in candidates:
-            if not os.path.exists(candidate):
-                continue
-            dlls = os.listdir(candidate)
-            dlls = [x for x in dlls if x.endswith(".dll")]
-            dlls_to_copy.extend([os.path.join(candidate, x) for x in dlls
-                if x.startswith("libgcc")])
-            dlls_to_copy.extend([os.path.join(candidate, x) for x in dlls
-                if x.startswith("mingw")])
+            dlls = qisys.scan.list_dir(candidate,
+                                       patterns=["libgcc*.dll", "mingw*.dll"])
+            dlls_to_copy.extend(x.path for x in dlls)
 
     for dll_to_copy in dlls_to_copy:
         try:
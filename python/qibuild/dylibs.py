@@ -7,6 +7,7 @@
 """
 
 import os
+import qisys.scan
 import qisys.sh
 
 def fix_dylibs(sdk_dir, paths=None):
@@ -22,26 +23,18 @@ def fix_dylibs(sdk_dir, paths=None):
     qisys.sh.mkdir(os.path.join(sdk_dir, "lib"), recursive=True)
 
     for path in paths:
-        if not os.path.exists(path):
-            continue
-        frameworks = os.listdir(path)
-        frameworks = [x for x in frameworks if x.endswith(".framework")]
+        frameworks = qisys.scan.list_dir(path, patterns="*.framework")
         for framework in frameworks:
-            src  = os.path.join(path    , framework)
-            dest = os.path.join(sdk_dir, framework)
+            dest = os.path.join(sdk_dir, framework.name)
             qisys.sh.rm(dest)
-            os.symlink(src, dest)
-        lib_dir = os.path.join(path, "lib")
-        if not os.path.exists(lib_dir):
-            continue
-        dylibs = os.listdir(lib_dir)
-        dylibs = [x for x in dylibs if ".dylib" in x]
+            os.symlink(framework.path, dest)
+        dylibs = qisys.scan.list_dir(os.path.join(path, "lib"),
+                                     patterns="*.dylib*")
         for dylib in dylibs:
-            src  = os.path.join(path   , "lib", dylib)
-            dest = os.path.join(sdk_dir, "lib", dylib)
-            if os.path.islink(src):
+            if dylib.is_symlink():
                 # don't create recursive links
                 continue
+            dest = os.path.join(sdk_dir, "lib", dylib.name)
             # just re-create links if they already exist
             qisys.sh.rm(dest)
-            os.symlink(src, dest)
+            os.symlink(dylib.path, dest)
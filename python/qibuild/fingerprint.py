@@ -0,0 +1,125 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Cheap fingerprints of source and build trees, used to skip
+configuring or building projects when nothing has changed
+
+"""
+
+import hashlib
+import os
+import subprocess
+
+import qisys.command
+import qisys.sh
+
+
+def is_build_dir(path):
+    """ Check whether a directory is a CMake build directory """
+    return os.path.exists(os.path.join(path, "CMakeCache.txt"))
+
+def get_files_state(directory, filter_fun=None, skip=None):
+    """ Return a sorted list of (rel_path, mtime, size) for the files
+    in directory.
+
+    .git, build directories and the directories in ``skip``
+    are not visited.
+
+    :param filter_fun: if set, only the files for which
+                       ``filter_fun(name)`` is True are considered
+
+    """
+    skip = [os.path.abspath(x) for x in (skip or list())]
+    res = list()
+    for root, dirs, files in os.walk(directory):
+        for name in dirs[:]:
+            full_path = os.path.join(root, name)
+            if name == ".git" or os.path.abspath(full_path) in skip or \
+                    is_build_dir(full_path):
+                dirs.remove(name)
+        for name in files:
+            if filter_fun and not filter_fun(name):
+                continue
+            full_path = os.path.join(root, name)
+            st = os.lstat(full_path)
+            res.append((os.path.relpath(full_path, directory),
+                        st.st_mtime, st.st_size))
+    res.sort()
+    return res
+
+def get_git_state(directory):
+    """ Describe the state of a directory belonging to a git repository
+    without reading every file: the hash of its tree in HEAD, plus
+    the status, the mtime and the size of the files git reports as
+    modified or untracked. Build directories are ignored.
+
+    Return None if this cannot be done (for instance because the
+    directory is not in a git repository), so that the caller can fall
+    back to :py:func:`get_files_state`
+
+    """
+    excludes = list()
+    for name in sorted(os.listdir(directory)):
+        if is_build_dir(os.path.join(directory, name)):
+            excludes.append(":!%s" % name)
+    try:
+        out = qisys.command.check_output(
+            ["git", "rev-parse", "--show-toplevel", "HEAD:./"],
+            cwd=directory, stderr=subprocess.PIPE)
+        (top_dir, tree) = out.splitlines()
+        status = qisys.command.check_output(
+            ["git", "status", "--porcelain", "-z", "--untracked-files=all",
+             "--", "."] + excludes,
+            cwd=directory, stderr=subprocess.PIPE)
+    except (OSError, ValueError, qisys.command.CommandFailedException):
+        return None
+    res = [tree]
+    entries = iter(status.split("\0"))
+    for entry in entries:
+        if not entry:
+            continue
+        res.append(entry)
+        if entry[0] in "RC":
+            # followed by the path of the source of the rename or copy
+            res.append(next(entries, ""))
+        path = os.path.join(top_dir, entry[3:])
+        if os.path.lexists(path):
+            st = os.lstat(path)
+            res.append((st.st_mtime, st.st_size))
+    return res
+
+def get_sources_state(directory, skip=None):
+    """ Describe the state of a source tree: use git when possible,
+    else the mtimes of every file
+
+    """
+    res = get_git_state(directory)
+    if res is None:
+        res = get_files_state(directory, skip=skip)
+    return res
+
+def compute(*parts):
+    """ Compute a fingerprint from a list of parts (strings, numbers,
+    or lists and tuples of those)
+
+    """
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+def read_stamp(path):
+    """ Return the fingerprint stored in path, or None """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as fp:
+        return fp.read().strip()
+
+def write_stamp(path, fingerprint):
+    """ Store a fingerprint in path.
+    Use ``fingerprint=None`` to remove the file
+
+    """
+    if fingerprint is None:
+        qisys.sh.rm(path)
+        return
+    with open(path, "w") as fp:
+        fp.write(fingerprint + "\n")
@@ -12,6 +12,7 @@ import subprocess
 from qisys import ui
 import qisys.sh
 import qisys.command
+import qisys.parallel
 
 def is_elf(filename):
     """ Check that a file is in the efl format
@@ -32,7 +33,7 @@ def contains_debug_info(filename, objdump=None):
     return (retcode == 0)
 
 
-def split_debug(base_dir, objcopy=None, objdump=None):
+def split_debug(base_dir, objcopy=None, objdump=None, num_jobs=None):
     """ Split the debug information out of all the binaries in
     lib/ and bin/
 
@@ -45,9 +46,14 @@ def split_debug(base_dir, objcopy=None, objdump=None):
     Also uses objcopy so that the binaries and libraries still remain
     usable with gdb
 
+    Binaries are processed concurrently, using ``num_jobs`` threads
+    (defaults to the number of CPUs), and binaries whose
+    .debug companion is newer than the binary itself are skipped.
+
     :param:  the objcopy executable to use. (defaults to
      the first objcopy executable found in PATH)
 
+    :return: the number of bytes removed from the binaries
 
     """
     if objcopy is None:
@@ -70,31 +76,117 @@ def split_debug(base_dir, objcopy=None, objdump=None):
     binaries.extend(_get_binaries(bin_dir))
     binaries.extend(_get_binaries(lib_dir))
 
-    for src in binaries:
-        rel_name = os.path.relpath(src, base_dir)
-        if not contains_debug_info(src, objdump=objdump):
-            ui.info("-- Already stripped", rel_name)
-            continue
-        src_stat = os.stat(src)
-        dirname, basename = os.path.split(src)
-        debug_dir = os.path.join(dirname, ".debug")
-        qisys.sh.mkdir(debug_dir)
-        dest = os.path.join(src, debug_dir, basename)
-        to_run = list()
-        to_run.append([objcopy, "--only-keep-debug", src, dest])
-        to_run.append([objcopy, "--strip-debug", "--strip-unneeded",
-                                "--add-gnu-debuglink=%s" % dest, src])
-        try:
-            for cmd in to_run:
-                qisys.command.check_output(cmd, stderr=subprocess.STDOUT)
-            ui.info("-- Debug info extracted for", rel_name)
-        except qisys.command.CommandFailedException as e:
-            ui.error("Error while extracting debug for %s" % os.path.relpath(src, base_dir))
-            ui.error(str(e))
-        # After the commands have run, utime of the file has changed, causing
-        # cmake to re-install the libraries. Which is not cool ...
-        # So set back mtime to its previous value:
-        os.utime(src, (src_stat.st_atime, src_stat.st_mtime))
+    def _split(src):
+        return _split_one(base_dir, src, objcopy, objdump)
+
+    results = qisys.parallel.parallel_map(_split, binaries, num_jobs=num_jobs)
+    saved = [x for x in results if x is not None]
+    total = sum(saved)
+    if saved:
+        ui.info("-- Debug info extracted from", len(saved), "binaries,",
+                "saved", ui.format_size(total))
+    return total
+
+def _get_debug_file(src):
+    """ Path to the debug companion of a binary """
+    dirname, basename = os.path.split(src)
+    return os.path.join(dirname, ".debug", basename)
+
+def is_split_up_to_date(src):
+    """ Check that the debug info of a binary has already been extracted,
+    that is: the .debug companion of the binary is newer than the last
+    change of the binary.
+
+    Note: when the binary is re-installed, its mtime may be preserved, but
+    not its ctime, so look at both.
+
+    """
+    debug_file = _get_debug_file(src)
+    if not os.path.exists(debug_file):
+        return False
+    src_stat = os.stat(src)
+    debug_stat = os.stat(debug_file)
+    last_change = max(src_stat.st_mtime, src_stat.st_ctime)
+    return debug_stat.st_mtime >= last_change
+
+def _split_one(base_dir, src, objcopy, objdump):
+    """ Split the debug info of one binary.
+    Return the number of bytes saved, or None if nothing was done
+
+    """
+    rel_name = os.path.relpath(src, base_dir)
+    if is_split_up_to_date(src):
+        ui.debug("-- Up-to-date", rel_name)
+        return None
+    if not contains_debug_info(src, objdump=objdump):
+        ui.info("-- Already stripped", rel_name)
+        return None
+    src_stat = os.stat(src)
+    dest = _get_debug_file(src)
+    qisys.sh.mkdir(os.path.dirname(dest))
+    to_run = list()
+    to_run.append([objcopy, "--only-keep-debug", src, dest])
+    to_run.append([objcopy, "--strip-debug", "--strip-unneeded",
+                            "--add-gnu-debuglink=%s" % dest, src])
+    res = None
+    try:
+        for cmd in to_run:
+            qisys.command.check_output(cmd, stderr=subprocess.STDOUT)
+        ui.info("-- Debug info extracted for", rel_name)
+        res = src_stat.st_size - os.path.getsize(src)
+    except qisys.command.CommandFailedException as e:
+        ui.error("Error while extracting debug for %s" % rel_name)
+        ui.error(str(e))
+    # After the commands have run, utime of the file has changed, causing
+    # cmake to re-install the libraries. Which is not cool ...
+    # So set back mtime to its previous value:
+    os.utime(src, (src_stat.st_atime, src_stat.st_mtime))
+    if res is not None:
+        # Restoring the mtime changed the ctime of the binary, so
+        # touch the .debug file to mark the binary as done
+        os.utime(dest, None)
+        # So that the binary is not installed again, see is_stripped_copy
+        _write_strip_record(src, src_stat)
+    return res
+
+def _get_strip_record(path):
+    """ Path to the file recording the size and the modification time
+    of a binary before its debug info was stripped in place
+
+    """
+    dirname, basename = os.path.split(path)
+    return os.path.join(dirname, ".debug", basename + ".orig")
+
+def _write_strip_record(path, orig_stat):
+    """ Record that the binary at path was stripped in place.
+    orig_stat is the result of os.stat() before stripping, and the
+    modification time of the binary must have been restored
+
+    """
+    stripped_size = os.path.getsize(path)
+    with open(_get_strip_record(path), "w") as fp:
+        fp.write("%i %i %i\n" % (orig_stat.st_size, int(orig_stat.st_mtime),
+                                 stripped_size))
+
+def is_stripped_copy(src, dest):
+    """ Whether dest is a copy of src whose debug info was split,
+    and that has not changed since. To be used as the ``keep_fun``
+    of :py:func:`qisys.sh.install`, so that binaries are not installed
+    and split again each time
+
+    """
+    try:
+        with open(_get_strip_record(dest), "r") as fp:
+            record = [int(x) for x in fp.read().split()]
+    except (IOError, ValueError):
+        return False
+    if len(record) != 3:
+        return False
+    (orig_size, mtime, stripped_size) = record
+    src_stat = os.stat(src)
+    dest_stat = os.stat(dest)
+    return (src_stat.st_size, int(src_stat.st_mtime)) == (orig_size, mtime) \
+        and (dest_stat.st_size, int(dest_stat.st_mtime)) == (stripped_size, mtime)
 
 if __name__ == "__main__":
     import sys
@@ -0,0 +1,169 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" A GNU make compatible jobserver, so that a single -j bounds the
+total number of jobs used by all the builds started by qibuild
+
+The jobserver is a FIFO containing one token per job slot (minus one,
+since every client may always run one job). Make and Ninja builds
+started with the ``MAKEFLAGS`` returned by :py:meth:`JobServer.get_env`
+take a token before starting a job and put it back afterwards.
+
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+from qisys import ui
+import qisys.command
+
+# How often the number of tokens in use is sampled, in seconds
+_SAMPLE_PERIOD = 0.1
+
+
+def get_client_style(cmake_generator, make_program=None):
+    """ How a build tool can join the jobserver:
+
+    * "fifo": GNU make >= 4.4 and Ninja >= 1.13
+    * "pipe": GNU make >= 4.2, using --jobserver-auth and inherited
+      file descriptors
+    * "legacy": older GNU make, using --jobserver-fds
+    * None: the build tool does not support jobservers
+
+    """
+    if os.name != "posix" or not cmake_generator:
+        return None
+    if cmake_generator == "Ninja":
+        version = qisys.command.get_version(make_program or "ninja")
+        if version and version >= (1, 13):
+            return "fifo"
+        return None
+    if "Unix Makefiles" in cmake_generator:
+        version = qisys.command.get_version(make_program or "make")
+        if not version:
+            return None
+        if version >= (4, 4):
+            return "fifo"
+        if version >= (4, 2):
+            return "pipe"
+        return "legacy"
+    return None
+
+
+class JobServer(object):
+    """ To be used as a context manager:
+
+    >>> with JobServer(8) as jobserver:
+    ...     env = jobserver.get_env(os.environ, "pipe")
+    ...     subprocess.call(["make"], env=env)
+
+    Nothing is done if num_jobs is less than 2, or when not on
+    a POSIX system, and :py:meth:`get_env` then returns None.
+
+    """
+    def __init__(self, num_jobs):
+        self.num_jobs = num_jobs
+        self.fifo_path = None
+        self.peak_usage = 0
+        self._fd = None
+        self._tmpdir = None
+        self._samples = list()
+        self._stop_event = threading.Event()
+        self._monitor = None
+
+    @property
+    def active(self):
+        return self._fd is not None
+
+    def start(self):
+        """ Create the FIFO and fill it with tokens """
+        if os.name != "posix" or not self.num_jobs or self.num_jobs < 2:
+            return
+        self._tmpdir = tempfile.mkdtemp(prefix="qi-jobserver-")
+        self.fifo_path = os.path.join(self._tmpdir, "fifo")
+        os.mkfifo(self.fifo_path, 0600)
+        # Opening in read-write mode never blocks, and keeps
+        # the FIFO open while the clients come and go
+        self._fd = os.open(self.fifo_path, os.O_RDWR)
+        os.write(self._fd, "+" * self.num_jobs_tokens)
+        self._monitor = threading.Thread(target=self._sample_usage)
+        self._monitor.daemon = True
+        self._monitor.start()
+
+    @property
+    def num_jobs_tokens(self):
+        """ Number of tokens in the FIFO when no job is running """
+        return self.num_jobs - 1
+
+    def tokens_in_use(self):
+        """ Number of tokens currently taken by the clients """
+        import fcntl
+        import termios
+        buf = fcntl.ioctl(self._fd, termios.FIONREAD, struct.pack("i", 0))
+        available = struct.unpack("i", buf)[0]
+        return self.num_jobs_tokens - available
+
+    def _sample_usage(self):
+        while not self._stop_event.wait(_SAMPLE_PERIOD):
+            try:
+                in_use = self.tokens_in_use()
+            except (IOError, OSError, TypeError):
+                return
+            self.peak_usage = max(self.peak_usage, in_use)
+            self._samples.append(in_use)
+
+    def get_env(self, env, style):
+        """ Return a copy of env where MAKEFLAGS is set so that a build
+        tool using the given client style (see :py:func:`get_client_style`)
+        joins the jobserver.
+        Return None if the jobserver is not active or the build tool
+        cannot join it
+
+        """
+        if not self.active or not style:
+            return None
+        if style == "fifo":
+            flags = "-j%i --jobserver-auth=fifo:%s" % (self.num_jobs,
+                                                       self.fifo_path)
+        elif style == "pipe":
+            flags = "-j%i --jobserver-auth=%i,%i" % (self.num_jobs,
+                                                     self._fd, self._fd)
+        else:
+            flags = "--jobserver-fds=%i,%i -j" % (self._fd, self._fd)
+        res = env.copy()
+        previous = res.get("MAKEFLAGS")
+        if previous:
+            flags = previous + " " + flags
+        res["MAKEFLAGS"] = flags
+        return res
+
+    def report(self):
+        """ Display how many tokens were used """
+        if not self._samples:
+            return
+        average = float(sum(self._samples)) / len(self._samples)
+        ui.info(ui.green, "Jobserver:", ui.reset,
+                "%i tokens," % self.num_jobs_tokens,
+                "peak usage: %i," % self.peak_usage,
+                "average usage: %.1f" % average)
+
+    def stop(self):
+        """ Stop the monitoring and remove the FIFO """
+        if not self.active:
+            return
+        self._stop_event.set()
+        self._monitor.join()
+        os.close(self._fd)
+        self._fd = None
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
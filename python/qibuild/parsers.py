@@ -9,6 +9,7 @@ import os
 
 from qisys import ui
 import qisys.parsers
+import qisys.worktree
 import qibuild.worktree
 import qibuild.cmake_builder
 
@@ -53,6 +54,10 @@ def build_parser(parser):
              "It should match a declaration in .qi/qibuild.xml")
     group.add_argument("--verbose-make", action="store_true", default=False,
                        help="Print the executed commands while building")
+    group.add_argument("--timings", metavar="FILE",
+                       help="Write how long each step took for each project "
+                            "in FILE, using the Chrome trace format, and a "
+                            "summary in FILE.summary.txt")
 
 def deploy_parser(parser):
     group = parser.add_argument_group("deploy options")
@@ -60,6 +65,11 @@ def deploy_parser(parser):
     group.add_argument("--url", dest="urls", action="append",
                        help="deploy to each given url.")
     group.add_argument("--port", help="port", type=int, default=22)
+    group.add_argument("--verify", action="store_true",
+                       help="send every file, comparing checksums with the "
+                            "remote files, instead of only sending the files "
+                            "that changed since the last deploy")
+    parser.set_defaults(verify=False)
 
 def get_deploy_urls(args):
     if args.urls:
@@ -99,7 +109,10 @@ def get_build_worktree(args, verbose=True):
 
     """
     worktree = qisys.parsers.get_worktree(args)
-    build_worktree = qibuild.worktree.BuildWorkTree(worktree)
+    build_worktree = qisys.worktree.get_preloaded(qibuild.worktree.BuildWorkTree,
+                                                  worktree.root)
+    if not build_worktree:
+        build_worktree = qibuild.worktree.BuildWorkTree(worktree)
     if verbose:
         ui.info(ui.green, "Current build worktree:", ui.reset, ui.bold, build_worktree.root)
     if not hasattr(args, "build_type"):
@@ -163,6 +176,7 @@ def get_cmake_builder(args, default_dep_types=None):
     build_projects = get_build_projects(build_worktree, args, solve_deps=False)
     cmake_builder = qibuild.cmake_builder.CMakeBuilder(build_worktree, build_projects)
     cmake_builder.dep_types = get_dep_types(args, default=default_dep_types)
+    cmake_builder.timings_output = getattr(args, "timings", None)
     return cmake_builder
 
 ##
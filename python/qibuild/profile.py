@@ -9,6 +9,7 @@
 
 import os
 import qisys.qixml
+import qibuild.config
 
 class Profile:
     """ A profile is just a set of CMake flags for now.
@@ -50,7 +51,7 @@ def parse_profiles(xml_path):
         with open(xml_path, "w") as fp:
             fp.write("<qibuild />")
     res = dict()
-    tree = qisys.qixml.read(xml_path)
+    tree = qibuild.config.get_repository().read(xml_path)
     root = tree.getroot()
     profile_elems = root.findall("profiles/profile")
     for profile_elem in profile_elems:
@@ -75,7 +76,8 @@ def configure_build_profile(xml_path, name, flags):
     """ Add a new profile to an XML file """
     profile = Profile(name)
     profile.cmake_flags = flags
-    tree = qisys.qixml.read(xml_path)
+    repository = qibuild.config.get_repository()
+    tree = repository.edit(xml_path)
     root = tree.getroot()
     profiles_elem = root.find("profiles")
     if profiles_elem is None:
@@ -85,11 +87,12 @@ def configure_build_profile(xml_path, name, flags):
         if profile_elem.get("name") == name:
             profiles_elem.remove(profile_elem)
     profiles_elem.append(profile.elem())
-    qisys.qixml.write(tree, xml_path)
+    repository.write(tree, xml_path)
 
 def remove_build_profile(xml_path, name):
     """ Remove a build profile from XML file """
-    tree = qisys.qixml.read(xml_path)
+    repository = qibuild.config.get_repository()
+    tree = repository.edit(xml_path)
     root = tree.getroot()
     profiles = root.find("profiles")
     if profiles is None:
@@ -101,7 +104,7 @@ def remove_build_profile(xml_path, name):
     if match_elem is None:
         raise NoSuchProfile(xml_path, name)
     profiles.remove(match_elem)
-    qisys.qixml.write(tree, xml_path)
+    repository.write(tree, xml_path)
 
 def get_cmake_flags(xml_path, profile_names):
     """ Get the full list of flags to use give a list of
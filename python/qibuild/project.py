@@ -1,5 +1,3 @@
-import argparse
-import json
 import os
 import platform
 import re
@@ -7,9 +5,14 @@ import sys
 
 from qisys import ui
 import qisys.command
+import qisys.envsetter
 import qisys.sh
 import qibuild.cmake
 import qibuild.build
+import qibuild.build_config
+import qibuild.compiler_cache
+import qibuild.fingerprint
+import qibuild.jobserver
 import qibuild.gdb
 import qibuild.dylibs
 import qibuild.dlls
@@ -34,6 +37,9 @@ class BuildProject(object):
         self.build_depends = set()
         self.run_depends = set()
         self.test_depends = set()
+        # (destdir, prefix, components) of an install whose stamp is
+        # written by post_install()
+        self._pending_install = None
 
     @property
     def qiproject_xml(self):
@@ -44,7 +50,7 @@ class BuildProject(object):
     def cmake_qibuild_dir(self):
         return qibuild.cmake.get_cmake_qibuild_dir()
 
-    @property
+    @qibuild.build_config.cached_property
     def build_directory(self):
         """ Return a suitable build directory, depending on the
         build setting of the worktree: the name of the toolchain,
@@ -53,11 +59,27 @@ class BuildProject(object):
         """
         return os.path.join(self.path, self.build_config.build_directory())
 
-    @property
+    @qibuild.build_config.cached_property
     def cmake_cache(self):
         return os.path.join(self.build_directory, "CMakeCache.txt")
 
-    @property
+    @qibuild.build_config.cached_property
+    def build_stamp(self):
+        """ Path to the file containing the fingerprint of the last
+        successful build (see :py:meth:`get_build_fingerprint`)
+
+        """
+        return os.path.join(self.build_directory, "qibuild-build.sha1")
+
+    @qibuild.build_config.cached_property
+    def install_stamp(self):
+        """ Path to the file containing the fingerprint of the last
+        successful install (see :py:meth:`get_install_fingerprint`)
+
+        """
+        return os.path.join(self.build_directory, "qibuild-install.sha1")
+
+    @qibuild.build_config.cached_property
     def qitest_json(self):
         return os.path.join(self.build_directory, "qitest.json")
 
@@ -70,6 +92,11 @@ class BuildProject(object):
         """
         return self.build_config.cmake_args
 
+    @property
+    def settings_key(self):
+        """ See :py:attr:`.CMakeBuildConfig.settings_key` """
+        return self.build_config.settings_key
+
     @property
     def build_env(self):
         """ The environment to use when calling cmake or build commands
@@ -77,7 +104,7 @@ class BuildProject(object):
         """
         return self.build_config.build_env
 
-    @property
+    @qibuild.build_config.cached_property
     def sdk_directory(self):
         """ The sdk directory in the build directory """
         # TODO: handle unique sdk dir?
@@ -152,7 +179,8 @@ set(CMAKE_PREFIX_PATH ${{CMAKE_PREFIX_PATH}} CACHE INTERNAL ""  FORCE)
 
 {custom_cmake_code}
 """
-        custom_cmake_code = ""
+        custom_cmake_code = qibuild.compiler_cache.get_cmake_code(
+            self.build_config)
         if self.build_config.local_cmake:
             to_include = qisys.sh.to_posix_path(self.build_config.local_cmake)
             custom_cmake_code += 'include("%s")\n' % to_include
@@ -175,7 +203,6 @@ set(CMAKE_PREFIX_PATH ${{CMAKE_PREFIX_PATH}} CACHE INTERNAL ""  FORCE)
             custom_cmake_code=custom_cmake_code
         )
 
-        import qibuild
         qibuild_python = os.path.join(qibuild.__file__, "..", "..")
         qibuild_python = os.path.abspath(qibuild_python)
         qibuild_python = qisys.sh.to_posix_path(qibuild_python)
@@ -188,9 +215,18 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         dep_cmake = os.path.join(self.build_directory, "dependencies.cmake")
         qisys.sh.write_file_if_different(to_write, dep_cmake)
 
-    def configure(self, **kwargs):
-        """ Delegate to :py:func:`qibuild.cmake.cmake` """
+    def configure(self, force=False, **kwargs):
+        """ Delegate to :py:func:`qibuild.cmake.cmake`
+
+        Nothing is done if the project has already been configured
+        with the same settings (see :py:meth:`get_configure_fingerprint`),
+        unless ``force`` is True.
+
+        """
         qisys.sh.mkdir(self.build_directory, recursive=True)
+        toolchain = self.build_config.toolchain
+        if toolchain:
+            toolchain.update_toolchain_file()
         cmake_args = self.cmake_args
         # only required the first time, afterwards this setting is
         # written in the cache by dependencies.cmake
@@ -198,58 +234,82 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         cmake_qibuild_dir = os.path.join(cmake_qibuild_dir, "qibuild")
         cmake_qibuild_dir = qisys.sh.to_posix_path(cmake_qibuild_dir)
         cmake_args.append("-Dqibuild_DIR=%s" % cmake_qibuild_dir)
+        build_env = self.build_env
+        fingerprint = self.get_configure_fingerprint(cmake_args, env=build_env)
+        # Those options are only useful if cmake actually runs
+        diagnostics = [kwargs.get(x) for x in
+                       ("debug_trycompile", "trace_cmake", "profiling")]
+        if not force and not any(diagnostics) and \
+                os.path.exists(self.cmake_cache) and \
+                qibuild.cmake.read_configure_fingerprint(self.build_directory) == fingerprint:
+            ui.info("-- Configuration is up to date, skipping cmake",
+                    "(use --force to run it anyway)")
+            if kwargs.get("summarize_options"):
+                qibuild.cmake.display_options(self.build_directory)
+            return
+        qibuild.cmake.write_configure_fingerprint(self.build_directory, None)
         try:
             qibuild.cmake.cmake(self.path, self.build_directory,
-                                cmake_args, env=self.build_env, **kwargs)
+                                cmake_args, env=build_env, **kwargs)
         except qisys.command.CommandFailedException as error:
             raise qibuild.build.ConfigureFailed(self, error)
         # Write the qitest.json file:
         tests = self.parse_qitest_cmake()
-        with open(self.qitest_json, "w") as fp:
-            json.dump(tests, fp, indent=2)
+        qitest.conf.write_tests(tests, self.qitest_json)
+        qibuild.cmake.write_configure_fingerprint(self.build_directory,
+                                                  fingerprint)
+
+    def get_configure_fingerprint(self, cmake_args, env=None):
+        """ Fingerprint of all the inputs of the configuration of the project:
+        cmake arguments, toolchain file, dependencies.cmake, path.conf,
+        custom cmake code, environment and cmake files of the project
+
+        """
+        input_files = [
+            os.path.join(self.build_directory, "dependencies.cmake"),
+            os.path.join(self.sdk_directory, "share", "qi", "path.conf"),
+        ]
+        for arg in cmake_args:
+            if arg.startswith("-DCMAKE_TOOLCHAIN_FILE="):
+                input_files.append(arg.split("=", 1)[1])
+        if self.build_config.local_cmake:
+            input_files.append(self.build_config.local_cmake)
+        return qibuild.cmake.get_configure_fingerprint(self.path,
+            self.build_directory, cmake_args, env=env,
+            input_files=input_files, cmake_dirs=[self.cmake_qibuild_dir])
 
     def parse_qitest_cmake(self):
         """ The qitest.cmake is written from CMake """
         qitest_cmake_path = os.path.join(self.build_directory, "qitest.cmake")
-        tests = list()
         if not os.path.exists(qitest_cmake_path):
             return list()
-        with open(qitest_cmake_path, "r") as fp:
-            lines = fp.readlines()
-        parser = argparse.ArgumentParser()
-        parser.add_argument("cmd", nargs="+")
-        parser.add_argument("--name", required=True)
-        parser.add_argument("--gtest", action="store_true",
-                            help="Tell qitest this is a test using gtest")
-        parser.add_argument("--timeout", type=int)
-        parser.add_argument("--nightly", action="store_true")
-        parser.add_argument("--perf", action="store_true")
-        parser.add_argument("--working-directory")
-        parser.add_argument("--env", action="append",
-                            dest="environment")
-        parser.set_defaults(nightly=False, perf=False)
-        def log_error(message, line):
-            test_name = line.split(";")[1]
-            mess = "Could not parse test options for test: '%s'\n" % test_name
-            mess += "Error was: %s" % message
-            ui.error(mess)
-        for line in lines:
-            parser.error = lambda message : log_error(message, line)
-            line = line.strip()
-            try:
-                args = parser.parse_args(args=line.split(";"))
-            except SystemExit:
-                break
-            test = vars(args)
-            as_list = test["environment"]
-            if as_list:
-                test["environment"] = dict(x.split("=") for x in as_list)
-            tests.append(test)
-        return tests
+        return qitest.conf.parse_qitest_cmake(qitest_cmake_path)
 
     def build(self, num_jobs=None, rebuild=False, target=None,
-              coverity=False, env=None):
-        """ Build the project """
+              coverity=False, env=None, force=False, jobserver=None):
+        """ Build the project
+
+        When building everything, nothing is done if the sources,
+        the configuration and the dependencies have not changed since
+        the last successful build, unless ``force`` or ``rebuild`` is True.
+
+        :param jobserver: a :py:class:`qibuild.jobserver.JobServer`.
+            If the build tool can join it, it is used instead of
+            passing ``-j`` to the build tool.
+
+        """
+        sources_state = None
+        if target is None and not coverity:
+            sources_state = self.get_sources_state()
+            if not force and not rebuild:
+                fingerprint = self.get_build_fingerprint(sources_state)
+                stamp = qibuild.fingerprint.read_stamp(self.build_stamp)
+                if fingerprint and fingerprint == stamp:
+                    ui.info("-- Build is up to date, skipping",
+                            "(use --force to build anyway)")
+                    return
+            # Only written back if the build succeeds
+            qibuild.fingerprint.write_stamp(self.build_stamp, None)
         timer = ui.timer("make %s" % self.name)
         timer.start()
         build_type = self.build_config.build_type
@@ -271,17 +331,28 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         if rebuild:
             cmd += ["--clean-first"]
         cmd += [ "--" ]
-        cmd += self.parse_num_jobs(self.build_config.num_jobs)
 
         if not env:
-            build_env = self.build_env.copy()
+            build_env = self.build_env
         else:
             build_env = env
         build_env = self.fix_env(build_env)
+        jobserver_env = None
+        if jobserver:
+            make_program = qibuild.cmake.get_cached_var(self.build_directory,
+                                                        "CMAKE_MAKE_PROGRAM")
+            style = qibuild.jobserver.get_client_style(self.cmake_generator,
+                                                       make_program)
+            jobserver_env = jobserver.get_env(build_env, style)
+        if jobserver_env:
+            build_env = jobserver_env
+        else:
+            cmd += self.parse_num_jobs(self.build_config.num_jobs)
         if self.verbose_make:
             if self.cmake_generator:
                 if "Makefiles" in self.cmake_generator:
-                    build_env["VERBOSE"] = "1"
+                    build_env = qisys.envsetter.overlay(build_env,
+                                                        {"VERBOSE" : "1"})
                 if self.cmake_generator == "Ninja":
                     cmd.append("-v")
         try:
@@ -289,8 +360,88 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         except qisys.command.CommandFailedException:
             raise qibuild.build.BuildFailed(self)
 
+        if sources_state is not None:
+            qibuild.fingerprint.write_stamp(self.build_stamp,
+                self.get_build_fingerprint(sources_state))
         timer.stop()
 
+    def get_sources_state(self):
+        """ State of the sources of the project (see
+        :py:func:`qibuild.fingerprint.get_sources_state`)
+
+        """
+        return qibuild.fingerprint.get_sources_state(self.path,
+                                                     skip=[self.build_directory])
+
+    def get_build_fingerprint(self, sources_state=None):
+        """ Fingerprint of everything a build of the project depends on:
+        its sources, its configuration, the outputs in its sdk directory,
+        the fingerprints of the last builds of its dependencies, and the
+        libraries and headers of the toolchain packages it depends on.
+
+        Return None when it cannot be known, for instance when a
+        dependency was not built by qibuild
+
+        """
+        if not os.path.exists(self.cmake_cache):
+            return None
+        deps_stamps = self._get_deps_stamps("build_stamp")
+        if deps_stamps is None:
+            return None
+        return self._get_fingerprint(deps_stamps, sources_state=sources_state)
+
+    def _get_deps_stamps(self, stamp_name, required=True):
+        """ The stamps (build_stamp or install_stamp) of the dependencies
+        of the project, and the state of the toolchain packages it depends
+        on.
+
+        If required is True, return None if the stamp of a dependency
+        is missing
+
+        """
+        res = list()
+        toolchain = self.build_worktree.toolchain
+        for name in sorted(self.build_depends | self.test_depends):
+            dep_project = self.build_worktree.get_build_project(name,
+                                                                raises=False)
+            if not dep_project:
+                dep_package = None
+                if toolchain:
+                    dep_package = toolchain.get_package(name, raises=False)
+                if dep_package:
+                    res.append((name, self._get_package_state(dep_package)))
+                continue
+            dep_stamp = qibuild.fingerprint.read_stamp(
+                getattr(dep_project, stamp_name))
+            if not dep_stamp and required:
+                return None
+            res.append((name, dep_stamp))
+        return res
+
+    def _get_fingerprint(self, deps_stamps, sources_state=None):
+        """ Helper for get_build_fingerprint and get_install_fingerprint """
+        if sources_state is None:
+            sources_state = self.get_sources_state()
+        cache_stat = os.stat(self.cmake_cache)
+        outputs_state = list()
+        if os.path.exists(self.sdk_directory):
+            outputs_state = qibuild.fingerprint.get_files_state(self.sdk_directory)
+        return qibuild.fingerprint.compute(
+            sources_state, deps_stamps,
+            qibuild.cmake.read_configure_fingerprint(self.build_directory),
+            (cache_stat.st_mtime, cache_stat.st_size),
+            self.build_config.build_type, outputs_state)
+
+    @staticmethod
+    def _get_package_state(package):
+        """ State of the libraries and headers of a toolchain package """
+        res = list()
+        for name in ["lib", "include"]:
+            directory = os.path.join(package.path, name)
+            if os.path.isdir(directory):
+                res.append((name, qibuild.fingerprint.get_files_state(directory)))
+        return res
+
     def parse_num_jobs(self, num_jobs, cmake_generator=None):
         """ Convert a number of jobs to a list of cmake args """
         if not cmake_generator:
@@ -330,6 +481,25 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         :package split_debug: split the debug symbols out of the binaries
             useful for `qibuild deploy`
 
+        """
+        installed = self.install_files(destdir, prefix=prefix,
+                                       components=components,
+                                       num_jobs=num_jobs)
+        self.post_install(destdir, components=components,
+                          split_debug=split_debug)
+        return installed
+
+    def install_files(self, destdir, prefix="/", components=None, num_jobs=1):
+        """ Install the files of the project, (see :py:meth:`install`)
+        without touching anything else in destdir, so that several
+        projects can be installed at the same time
+
+        Nothing is done if the project was not built again since it was
+        last installed in destdir with the same components, and the
+        installed files are still there
+        (see :py:meth:`get_install_fingerprint`). The fingerprint of
+        the new installation is written by :py:meth:`post_install`
+
         """
         installed = list()
         if components is None:
@@ -337,8 +507,8 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         # DESTDIR=/tmp/foo and CMAKE_PREFIX="/usr/local" means
         # dest = /tmp/foo/usr/local
         destdir = qisys.sh.to_native_path(destdir)
-        build_env = self.build_env.copy()
-        build_env["DESTDIR"] = destdir
+        build_env = qisys.envsetter.overlay(self.build_env,
+                                            {"DESTDIR" : destdir})
         # Must make sure prefix is not seen as an absolute path here:
         dest = os.path.join(destdir, prefix[1:])
         dest = qisys.sh.to_native_path(dest)
@@ -346,47 +516,160 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         cprefix = qibuild.cmake.get_cached_var(self.build_directory,
                                                "CMAKE_INSTALL_PREFIX")
         if cprefix != prefix:
+            # Only the prefix changes: the configuration done by
+            # `qibuild configure` remains valid, so keep its fingerprint,
+            # and the next installs with the same prefix skip this step
+            fingerprint = qibuild.cmake.read_configure_fingerprint(
+                self.build_directory)
+            qibuild.cmake.write_configure_fingerprint(self.build_directory,
+                                                      None)
             qibuild.cmake.cmake(self.path, self.build_directory,
                 ['-DCMAKE_INSTALL_PREFIX=%s' % prefix],
                 clean_first=False,
                 env=build_env)
+            qibuild.cmake.write_configure_fingerprint(self.build_directory,
+                                                      fingerprint)
         else:
             mess = "Skipping configuration of project %s\n" % self.name
             mess += "CMAKE_INSTALL_PREFIX is already correct"
             ui.debug(mess)
 
+        fingerprint = self.get_install_fingerprint(destdir, prefix,
+                                                   components)
+        if fingerprint and \
+                qibuild.fingerprint.read_stamp(self.install_stamp) == fingerprint:
+            ui.info("-- Installation is up to date, skipping")
+            return self._read_install_manifests(components)
+        qibuild.fingerprint.write_stamp(self.install_stamp, None)
+
         # Hack for http://www.cmake.org/Bug/print_bug_page.php?bug_id=13934
         if self.using_make:
             self.build(target="preinstall", num_jobs=num_jobs, env=build_env)
         if components:
-            for component in components:
-                files = self._install_component(destdir, component)
-                installed.extend(files)
+            self._install_components(destdir, components)
         else:
             self.build(target="install", env=build_env)
-            manifest_path = os.path.join(self.build_directory, "install_manifest.txt")
-            installed.extend(read_install_manifest(manifest_path, destdir))
-        if "test" in components:
-            self._install_qitest_json(destdir)
+        installed.extend(self._read_install_manifests(components))
+        self._pending_install = (destdir, prefix, components)
+        return installed
+
+    def get_install_fingerprint(self, destdir, prefix, components):
+        """ Fingerprint of an installation of the project: the state of
+        its sources, configuration and build outputs, the fingerprints of
+        the last installs of its dependencies, the install settings, and
+        the state of the files listed in the install manifests.
+
+        Return None if the project was never installed with the same
+        components
+
+        """
+        manifests_state = list()
+        for manifest_path in self._get_install_manifests(components):
+            if not os.path.exists(manifest_path):
+                return None
+            for path in read_install_manifest(manifest_path, destdir):
+                # Paths in the manifests do not include DESTDIR
+                full_path = os.path.join(destdir, path.lstrip("/"))
+                try:
+                    manifests_state.append((path, os.stat(full_path).st_mtime))
+                except OSError:
+                    return None
+        if not os.path.exists(self.cmake_cache):
+            return None
+        # Not the build stamps of the dependencies: they are not written
+        # by the preinstall builds
+        deps_stamps = self._get_deps_stamps("install_stamp", required=False)
+        build_fingerprint = self._get_fingerprint(deps_stamps)
+        return qibuild.fingerprint.compute(build_fingerprint, destdir, prefix,
+                                           components, manifests_state)
+
+    def _get_install_manifests(self, components):
+        if not components:
+            return [os.path.join(self.build_directory, "install_manifest.txt")]
+        return [os.path.join(self.build_directory,
+                             "install_manifest_%s.txt" % x)
+                for x in components]
+
+    def get_last_installed_files(self, components=None):
+        """ The files installed by the last install of the project
+        with the same components, or None if it was never installed
+
+        """
+        manifests = self._get_install_manifests(components)
+        if not all(os.path.exists(x) for x in manifests):
+            return None
+        return self._read_install_manifests(components)
+
+    def _read_install_manifests(self, components):
+        installed = list()
+        for manifest_path in self._get_install_manifests(components):
+            installed.extend(read_install_manifest(manifest_path, None))
+        return installed
+
+    def post_install(self, destdir, components=None, split_debug=False):
+        """ Steps of :py:meth:`install` working on the whole destdir:
+        writing <destdir>/qitest.json and splitting debug symbols
+
+        Also write the fingerprint of the installation done by
+        :py:meth:`install_files`. This is done here, one project after
+        the other, once the dependencies of the project are installed
+        and the installed files are no longer modified
 
+        """
+        destdir = qisys.sh.to_native_path(destdir)
+        if components and "test" in components:
+            self._install_qitest_json(destdir)
         if split_debug:
             self.split_debug(destdir)
-        return installed
+        if self._pending_install:
+            (destdir, prefix, components) = self._pending_install
+            self._pending_install = None
+            qibuild.fingerprint.write_stamp(self.install_stamp,
+                self.get_install_fingerprint(destdir, prefix, components))
+
+    def _install_components(self, destdir, components):
+        """ Install several components with a single run of cmake,
+        each with its own install manifest
+
+        cmake_install.cmake is included from a function, so that the
+        variables set while installing a component, (for instance by
+        install(CODE) blocks), do not leak into the next one, as with
+        a separate ``cmake -DCOMPONENT=... -P cmake_install.cmake`` run
+        for each component
+
+        """
+        build_env = qisys.envsetter.overlay(self.build_env,
+                                            {"DESTDIR" : destdir})
+
+        install_script = os.path.join(self.build_directory,
+                                      "qibuild-install-components.cmake")
+        to_write = """\
+#############################################
+#QIBUILD AUTOGENERATED FILE. DO NOT EDIT.
+#############################################
+
+set(_qi_install_script "${CMAKE_CURRENT_LIST_DIR}/cmake_install.cmake")
+
+function(_qi_install_component component)
+  set(CMAKE_INSTALL_COMPONENT "${component}")
+  set(CMAKE_INSTALL_MANIFEST_FILES)
+  include("${_qi_install_script}")
+endfunction()
 
-    def _install_component(self, destdir, component):
-        build_env = self.build_env.copy()
-        build_env["DESTDIR"] = destdir
+foreach(_qi_component ${QI_COMPONENTS})
+  _qi_install_component("${_qi_component}")
+endforeach()
+"""
+        with open(install_script, "w") as fp:
+            fp.write(to_write)
 
         cmake_args = list()
         cmake_args += ["-DBUILD_TYPE=%s" % self.build_config.build_type]
-        cmake_args += ["-DCOMPONENT=%s" % component]
-        cmake_args += ["-P", "cmake_install.cmake", "--"]
-        ui.debug("Installing", component)
+        cmake_args += ["-DQI_COMPONENTS=%s" % ";".join(components)]
+        cmake_args += ["-P", install_script, "--"]
+        ui.debug("Installing", ", ".join(components))
         qisys.command.call(["cmake"] + cmake_args, cwd=self.build_directory,
                             env=build_env)
-        manifest_path = os.path.join(self.build_directory, "install_manifest_%s.txt" % component)
-        installed = read_install_manifest(manifest_path, destdir)
-        return installed
 
     def _install_qitest_json(self, destdir):
         if not os.path.exists(self.qitest_json):
@@ -439,7 +722,11 @@ set(QIBUILD_PYTHON_PATH "%s" CACHE STRING "" FORCE)
         return env
 
     def split_debug(self, destdir):
-        """ Split debug symbols after install """
+        """ Split debug symbols after install
+
+        Return the number of bytes saved
+
+        """
         if self.using_visual_studio:
             raise Exception("split debug not supported on Visual Studio")
         ui.info(ui.green, "Splitting debug symbols from binaries ...")
@@ -459,7 +746,9 @@ The following tools were not found: {missing}\
             mess = mess.format(name=self.name, missing = ", ".join(missing))
             ui.warning(mess)
             return
-        qibuild.gdb.split_debug(destdir, **tool_paths)
+        return qibuild.gdb.split_debug(destdir,
+                                       num_jobs=self.build_config.num_jobs,
+                                       **tool_paths)
 
     def get_build_dirs(self, all_configs=False):
         """Return a dictionary containing the build directory list
@@ -103,6 +103,8 @@ def test_build_env(build_worktree):
     path = build_config.build_env["PATH"]
     assert r"c:\swig" in path
     assert r"c:\mingw\bin" in path
+    # Computed once per config
+    assert build_config.build_env is build_config.build_env
 
 def test_local_cmake(build_worktree, toolchains):
     toolchains.create("foo")
@@ -112,3 +114,57 @@ def test_local_cmake(build_worktree, toolchains):
     build_config = qibuild.build_config.CMakeBuildConfig(build_worktree)
     build_config.set_active_config("foo")
     assert build_config.local_cmake == foo_cmake
+
+def test_compiler_cache(build_worktree, toolchains):
+    toolchains.create("foo")
+    qibuild_xml = qisys.sh.get_config_path("qi", "qibuild.xml")
+    with open(qibuild_xml, "w") as fp:
+        fp.write("""
+<qibuild>
+  <build>
+    <compiler_cache dir="/path/to/cache" max_size="1G" />
+  </build>
+</qibuild>
+""")
+    build_config = qibuild.build_config.CMakeBuildConfig(build_worktree)
+    assert build_config.compiler_cache.program == "ccache"
+    build_config.set_active_config("foo")
+    assert build_config.compiler_cache_dir == \
+            os.path.join("/path/to/cache", "foo")
+
+    # Worktree settings override the global ones
+    with open(build_worktree.qibuild_xml, "w") as fp:
+        fp.write("""
+<qibuild>
+  <build>
+    <compiler_cache enabled="false" />
+  </build>
+</qibuild>
+""")
+    build_config = qibuild.build_config.CMakeBuildConfig(build_worktree)
+    assert build_config.compiler_cache is None
+    assert build_config.compiler_cache_dir is None
+
+def test_cached_settings(build_worktree, toolchains):
+    toolchains.create("foo")
+    world_proj = build_worktree.add_test_project("world")
+    build_config = build_worktree.build_config
+    build_dir = world_proj.build_directory
+    assert world_proj.build_directory is build_dir
+    cmake_args = build_config.cmake_args
+    # Callers may modify the list they get
+    cmake_args.append("-DFOO=BAR")
+    assert build_config.cmake_args == ["-DCMAKE_BUILD_TYPE=Debug"]
+
+    build_config.build_type = "Release"
+    assert world_proj.build_directory.endswith("-release")
+    assert build_config.cmake_args == ["-DCMAKE_BUILD_TYPE=Release"]
+
+    build_config.set_active_config("foo")
+    assert "build-foo" in world_proj.sdk_directory
+
+    build_worktree.configure_build_profile("bar", [("WITH_BAR", "ON")])
+    build_config.profiles = ["bar"]
+    assert "-DWITH_BAR=ON" in build_config.cmake_args
+    build_worktree.configure_build_profile("bar", [("WITH_BAR", "OFF")])
+    assert "-DWITH_BAR=OFF" in build_config.cmake_args
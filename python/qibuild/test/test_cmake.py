@@ -28,3 +28,22 @@ def test_pip_debian_install(tmpdir):
     cmake_dir.ensure("qibuild", "qibuild-config.cmake", file=True)
     res = qibuild.cmake.find_installed_cmake_qibuild_dir(python_dir.strpath)
     assert res == cmake_dir.strpath
+
+def test_cmake_cache(tmpdir):
+    cache_path = tmpdir.join("CMakeCache.txt")
+    cache_path.write("""\
+// The generator
+CMAKE_GENERATOR:INTERNAL=Unix Makefiles
+# comment
+FOO:STRING=bar
+""")
+    cache = qibuild.cmake.get_cmake_cache(cache_path.strpath)
+    assert qibuild.cmake.get_cmake_cache(cache_path.strpath) is cache
+    assert cache.get("CMAKE_GENERATOR") == "Unix Makefiles"
+    assert cache.get("NOPE", "default") == "default"
+    assert qibuild.cmake.get_cached_var(tmpdir.strpath, "FOO") == "bar"
+    # Cache should be read again when the file changes
+    cache_path.write("FOO:STRING=baz\n")
+    assert cache.get("FOO") == "baz"
+    assert qibuild.cmake.read_cmake_cache(cache_path.strpath) == \
+        {"FOO" : "baz"}
@@ -1,4 +1,7 @@
+import os
+
 import qibuild.cmake_builder
+import qibuild.gdb
 import qibuild.parsers
 
 import mock
@@ -86,3 +89,69 @@ def test_runtime_single(build_worktree, args):
     args.single = True
     cmake_builder = qibuild.parsers.get_cmake_builder(args)
     assert cmake_builder.dep_types == []
+
+def test_install_packages_concurrently(tmpdir):
+    build_worktree = mock.Mock()
+    build_worktree.build_config.num_jobs = 4
+    deps_solver = mock.Mock()
+    hello_proj = mock.Mock()
+    hello_proj.name = "hello"
+    hello_proj.install_files.return_value = ["bin/hello"]
+    packages = list()
+    for i in range(10):
+        package = mock.Mock()
+        package.name = "package%i" % i
+        package.install.return_value = ["lib/libpackage%i.so" % i]
+        package.get_install_files.return_value = package.install.return_value
+        packages.append(package)
+    deps_solver.get_dep_projects.return_value = [hello_proj]
+    deps_solver.get_dep_packages.return_value = packages
+    cmake_builder = qibuild.cmake_builder.CMakeBuilder(build_worktree,
+                                                       [hello_proj])
+    cmake_builder.deps_solver = deps_solver
+    hello_proj.cmake_cache = tmpdir.ensure("CMakeCache.txt").strpath
+
+    installed = cmake_builder.install(tmpdir.strpath, split_debug=True)
+    assert installed == ["lib/libpackage%i.so" % i for i in range(10)] + \
+                        ["bin/hello"]
+    for package in packages:
+        package.install.assert_called_with(os.path.join(tmpdir.strpath, ""),
+                                           runtime=False, num_jobs=1,
+                                           keep_fun=qibuild.gdb.is_stripped_copy)
+    hello_proj.install_files.assert_called_with(tmpdir.strpath)
+    hello_proj.post_install.assert_called_with(tmpdir.strpath,
+                                               components=None)
+    hello_proj.split_debug.assert_called_once_with(tmpdir.strpath)
+
+def test_check_install_conflicts():
+    conflicts = qibuild.cmake_builder.check_install_conflicts([
+        ("foo", ["lib/libfoo.so", "include/common.h"]),
+        ("bar", ["lib/libbar.so", "include/common.h"]),
+        ("baz", ["lib/libbaz.so"]),
+    ])
+    assert conflicts == [("include/common.h", ["foo", "bar"])]
+
+def test_install_conflicting_elements_in_order():
+    cmake_builder = qibuild.cmake_builder.CMakeBuilder(mock.Mock(), list())
+    cmake_builder.build_config.num_jobs = 4
+    installed = list()
+    def install(elem):
+        installed.append(elem.name)
+        return elem.files
+    elems = list()
+    for (name, files, predicted) in [
+            ("foo", ["lib/libfoo.so", "include/common.h"], None),
+            ("bar", ["lib/libbar.so", "include/common.h"], None),
+            ("baz", ["lib/libbaz.so", "lib/libspam.so"], ["lib/libspam.so"]),
+            ("spam", ["lib/libspam.so"], ["lib/libspam.so"])]:
+        elem = mock.Mock()
+        elem.name = name
+        elem.files = files
+        elem.predicted = predicted
+        elems.append(elem)
+    cmake_builder.install_concurrently(elems, install, "Installing",
+                                       list_files=lambda x: x.predicted)
+    # baz and spam are installed after the others, in order.
+    # foo and bar are installed again, in order, once the conflict is known
+    assert sorted(installed[:2]) == ["bar", "foo"]
+    assert installed[2:] == ["baz", "spam", "foo", "bar"]
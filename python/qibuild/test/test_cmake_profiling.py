@@ -2,10 +2,12 @@
 ## Use of this source code is governed by a BSD-style license that can be
 ## found in the COPYING file.
 
+import json
 import os
 
 import qisys.sh
 import qibuild.cmake
+import qibuild.cmake.profiling
 
 from qibuild.cmake.profiling import parse_cmake_log
 from qibuild.cmake.profiling import gen_annotations
@@ -50,3 +52,33 @@ def test_gen_annotations(tmpdir):
     assert stage_lines[0].startswith(" 3")
     assert stage_lines[1].startswith("39")
     assert stage_lines[2].startswith("  ")
+
+def test_json_trace(tmpdir):
+    entries = [
+        {"version" : {"major" : 1, "minor" : 2}},
+        {"file" : "/src/CMakeLists.txt", "line" : 1, "cmd" : "project",
+         "frame" : 1, "global_frame" : 1, "time" : 10.0},
+        {"file" : "/src/CMakeLists.txt", "line" : 2, "cmd" : "qi_create_lib",
+         "frame" : 1, "global_frame" : 1, "time" : 11.0},
+        {"file" : "/qibuild/cmake/qibuild/target.cmake", "line" : 5,
+         "cmd" : "set", "frame" : 2, "global_frame" : 2, "time" : 12.0},
+        {"file" : "/qibuild/cmake/qibuild/target.cmake", "line" : 6,
+         "cmd" : "qi_use_lib", "frame" : 2, "global_frame" : 2, "time" : 12.5},
+        {"file" : "/src/CMakeLists.txt", "line" : 3, "cmd" : "qi_create_lib",
+         "frame" : 1, "global_frame" : 1, "time" : 15.0},
+        {"file" : "/src/CMakeLists.txt", "line" : 4, "cmd" : "message",
+         "frame" : 1, "global_frame" : 1, "time" : 16.0},
+    ]
+    cmake_log = tmpdir.join("cmake.log")
+    cmake_log.write("\n".join(json.dumps(x) for x in entries) + "\n" +
+                    "-- Configuring done\n")
+    analyzer = qibuild.cmake.profiling.analyze_trace(cmake_log.strpath,
+                                                     "/qibuild/cmake")
+    assert analyzer.calls["qi_create_lib"] == 2
+    assert analyzer.inclusive_times["qi_create_lib"] == 5
+    assert analyzer.inclusive_times["qi_use_lib"] == 2.5
+    assert analyzer.line_times[("/src/CMakeLists.txt", 2)] == 1
+    assert analyzer.get_kind("/qibuild/cmake/qibuild/target.cmake") == "qibuild"
+    assert analyzer.get_kind("/src/CMakeLists.txt") == "project"
+    report = analyzer.report()
+    assert report.splitlines()[2].split()[0] == "qi_create_lib"
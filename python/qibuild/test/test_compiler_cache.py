@@ -0,0 +1,57 @@
+import os
+import stat
+
+import qisys.sh
+import qibuild.compiler_cache
+
+def write_fake_ccache(tmpdir, hits, misses):
+    fake_ccache = tmpdir.join("ccache")
+    fake_ccache.write("""#!/bin/sh
+printf "direct_cache_hit\\t%i\\n"
+printf "preprocessed_cache_hit\\t0\\n"
+printf "cache_miss\\t%i\\n"
+""" % (hits, misses))
+    os.chmod(fake_ccache.strpath, stat.S_IRWXU)
+    return fake_ccache.strpath
+
+def use_compiler_cache(build_worktree, program):
+    with open(build_worktree.qibuild_xml, "w") as fp:
+        fp.write("""
+<qibuild>
+  <build>
+    <compiler_cache program="%s" max_size="2G" />
+  </build>
+</qibuild>
+""" % program)
+    build_worktree.build_config.read_local_settings()
+    return build_worktree.build_config
+
+def test_launcher_in_dependencies_cmake(qibuild_action, tmpdir):
+    fake_ccache = write_fake_ccache(tmpdir, 0, 0)
+    world_proj = qibuild_action.add_test_project("world")
+    build_config = use_compiler_cache(qibuild_action.build_worktree,
+                                      fake_ccache)
+    world_proj.write_dependencies_cmake(list())
+    dep_cmake = os.path.join(world_proj.build_directory, "dependencies.cmake")
+    with open(dep_cmake, "r") as fp:
+        contents = fp.read()
+    cache_dir = qisys.sh.to_posix_path(build_config.compiler_cache_dir)
+    launcher = "env;CCACHE_DIR=%s;CCACHE_MAXSIZE=2G;%s" % (cache_dir,
+                                                           fake_ccache)
+    assert 'set(CMAKE_CXX_COMPILER_LAUNCHER "%s"' % launcher in contents
+
+def test_missing_compiler_cache(build_worktree, record_messages):
+    build_config = use_compiler_cache(build_worktree, "no-such-ccache")
+    code = qibuild.compiler_cache.get_cmake_code(build_config)
+    assert "unset(CMAKE_${_lang}_COMPILER_LAUNCHER CACHE)" in code
+    assert record_messages.find("no-such-ccache not found")
+
+def test_hit_rate(build_worktree, tmpdir, record_messages):
+    fake_ccache = write_fake_ccache(tmpdir, 3, 1)
+    build_config = use_compiler_cache(build_worktree, fake_ccache)
+    after = qibuild.compiler_cache.read_stats(build_config)
+    assert after == {"direct_cache_hit" : 3, "preprocessed_cache_hit" : 0,
+                     "cache_miss" : 1}
+    before = {"direct_cache_hit" : 1}
+    qibuild.compiler_cache.report_stats(before, after)
+    assert record_messages.find("2 hits, 1 misses, hit rate: 66.7%")
@@ -356,6 +356,31 @@ class QiBuildConfig(unittest.TestCase):
         self.assertEqual(qibuild_cfg.local.build.sdk_dir, "/path/to/sdk")
         self.assertEqual(qibuild_cfg.local.build.build_dir, "/path/to/build")
 
+    def test_compiler_cache_settings(self):
+        xml = """
+<qibuild version="1">
+  <build>
+    <compiler_cache program="ccache" max_size="5G" />
+  </build>
+</qibuild>
+"""
+        local_xml = """
+<qibuild version="1">
+  <build>
+    <compiler_cache enabled="false" />
+  </build>
+</qibuild>
+"""
+        qibuild_cfg = cfg_from_string(xml)
+        new_cfg = cfg_from_string(cfg_to_string(qibuild_cfg))
+        compiler_cache = new_cfg.build.compiler_cache
+        self.assertTrue(compiler_cache.enabled)
+        self.assertEqual(compiler_cache.program, "ccache")
+        self.assertEqual(compiler_cache.max_size, "5G")
+        self.assertTrue(compiler_cache.dir is None)
+        qibuild_cfg.read_local_config(StringIO(local_xml))
+        self.assertFalse(qibuild_cfg.local.build.compiler_cache.enabled)
+
 
     def test_get_server_access(self):
         xml = """
@@ -463,3 +488,31 @@ def test_recompute_cmake_generator(tmpdir):
     assert qibuild_cfg.cmake.generator == "A"
     qibuild_cfg.set_active_config("b")
     assert qibuild_cfg.cmake.generator is None
+
+def test_config_repository(tmpdir):
+    repository = qibuild.config.ConfigRepository()
+    xml_path = tmpdir.join("qibuild.xml")
+    xml_path.write("<qibuild />")
+    tree = repository.read(xml_path.strpath)
+    assert repository.read(xml_path.strpath) is tree
+    # Editing does not change what other readers see
+    edited = repository.edit(xml_path.strpath)
+    qibuild.config.etree.SubElement(edited.getroot(), "defaults")
+    assert tree.find("defaults") is None
+    repository.write(edited, xml_path.strpath)
+    written = repository.read(xml_path.strpath)
+    assert written.find("defaults") is not None
+    # Files changed by someone else are parsed again
+    xml_path.write('<qibuild>\n  <defaults config="foo" />\n</qibuild>\n')
+    assert repository.read(xml_path.strpath).find("defaults").get("config") \
+            == "foo"
+
+def test_global_config_is_shared():
+    qibuild_cfg = qibuild.config.get_global_config()
+    assert qibuild.config.get_global_config() is qibuild_cfg
+    qibuild_cfg = qibuild.config.QiBuildConfig()
+    qibuild_cfg.read()
+    qibuild_cfg.set_server_access("gerrit", "john")
+    qibuild_cfg.write()
+    access = qibuild.config.get_global_config().get_server_access("gerrit")
+    assert access.username == "john"
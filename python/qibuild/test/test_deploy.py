@@ -3,7 +3,11 @@
 ## found in the COPYING file.
 
 
+import os
+
+import mock
 import pytest
+
 import qibuild.deploy
 
 def test_parse_url():
@@ -26,3 +30,86 @@ def test_project_like_urls_are_parsed_as_none():
     res = qibuild.deploy.parse_url("foo")
     assert res is None
 
+
+def test_deploy_record(tmpdir):
+    deploy_dir = tmpdir.mkdir("deploy")
+    deploy_dir.ensure("lib/libfoo.so").write("foo")
+    deploy_dir.ensure("bin/bar").write("bar")
+    record = qibuild.deploy.DeployRecord(tmpdir.join("record.json").strpath)
+    filenames = ["lib/libfoo.so", "/bin/bar"]
+    (changed, states) = record.get_changes(deploy_dir.strpath, filenames)
+    assert changed == filenames
+    record.update(states)
+
+    record = qibuild.deploy.DeployRecord(tmpdir.join("record.json").strpath)
+    (changed, _) = record.get_changes(deploy_dir.strpath, filenames)
+    assert changed == list()
+    (changed, _) = record.get_changes(deploy_dir.strpath, filenames,
+                                      verify=True)
+    assert changed == filenames
+
+    # Same contents, new mtime:
+    deploy_dir.join("bin/bar").setmtime(42)
+    (changed, states) = record.get_changes(deploy_dir.strpath, filenames)
+    assert changed == list()
+    assert states["bin/bar"]["mtime"] == 42
+
+    deploy_dir.join("lib/libfoo.so").write("new foo")
+    (changed, _) = record.get_changes(deploy_dir.strpath, filenames)
+    assert changed == ["lib/libfoo.so"]
+
+def test_only_send_changes(tmpdir):
+    deploy_dir = tmpdir.mkdir("deploy")
+    deploy_dir.ensure("a").write("a")
+    deploy_dir.ensure("b").write("b")
+    filelist = tmpdir.join("manifest.txt")
+    filelist.write("a\nb\n")
+    record = qibuild.deploy.DeployRecord(tmpdir.join("record.json").strpath)
+    url = "john@target:deployed"
+    sent = list()
+    def fake_rsync(cmd, quiet=False):
+        assert "--checksum" not in cmd
+        files_from = [x for x in cmd if x.startswith("--files-from=")][0]
+        with open(files_from.split("=", 1)[1], "r") as fp:
+            sent.append(fp.read().split())
+        return 42
+    with mock.patch("qisys.command.call"), \
+         mock.patch("qibuild.deploy._call_rsync", fake_rsync):
+        assert qibuild.deploy.deploy(deploy_dir.strpath, url,
+                                     filelist=filelist.strpath,
+                                     record=record) == 42
+        assert sent == [["a", "b"]]
+        deploy_dir.join("b").write("bb")
+        qibuild.deploy.deploy(deploy_dir.strpath, url,
+                              filelist=filelist.strpath, record=record)
+        assert sent[-1] == ["b"]
+        qibuild.deploy.deploy(deploy_dir.strpath, url,
+                              filelist=filelist.strpath, record=record)
+        assert len(sent) == 2
+
+@pytest.mark.skipif(os.name == 'nt', reason="no ssh multiplexing on windows")
+def test_ssh_multiplexing(tmpdir):
+    calls = list()
+    def fake_call(cmd, **kwargs):
+        calls.append(cmd)
+    def fake_rsync(cmd, quiet=False):
+        calls.append(cmd)
+        return 0
+    with mock.patch("qisys.command.call", fake_call), \
+         mock.patch("qibuild.deploy._call_rsync", fake_rsync), \
+         mock.patch("subprocess.call") as subprocess_call:
+        with qibuild.deploy.SSHMultiplexer() as ssh:
+            qibuild.deploy.deploy(tmpdir.strpath, "john@target:deployed",
+                                  ssh=ssh)
+            control_dir = ssh.control_dir
+            assert os.path.isdir(control_dir)
+        assert not os.path.exists(control_dir)
+        # master connection is closed at the end:
+        exit_cmd = subprocess_call.call_args[0][0]
+        assert exit_cmd[-3:] == ["-O", "exit", "john@target"]
+    (mkdir_cmd, rsync_cmd) = calls
+    control_path = "ControlPath=%s/%%r@%%h:%%p" % control_dir
+    assert control_path in mkdir_cmd
+    rsh = rsync_cmd[rsync_cmd.index("-e") + 1]
+    assert "ControlMaster=auto" in rsh
+    assert control_path in rsh
@@ -0,0 +1,44 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import qisys.command
+import qibuild.fingerprint
+
+def test_files_state(tmpdir):
+    tmpdir.ensure("CMakeLists.txt", file=True)
+    tmpdir.ensure("build-foo", "CMakeCache.txt", file=True)
+    tmpdir.ensure(".git", "config", file=True)
+    res = qibuild.fingerprint.get_files_state(tmpdir.strpath)
+    assert [x[0] for x in res] == ["CMakeLists.txt"]
+    assert qibuild.fingerprint.get_git_state(tmpdir.strpath) is None
+
+def test_git_state(tmpdir):
+    src = tmpdir.join("src")
+    src.ensure("main.cpp", file=True)
+    src.ensure("build-foo", "CMakeCache.txt", file=True)
+    qisys.command.call(["git", "init", "-q"], cwd=tmpdir.strpath)
+    qisys.command.call(["git", "add", "src/main.cpp"], cwd=tmpdir.strpath)
+    qisys.command.call(["git", "commit", "-q", "-m", "initial"],
+                       cwd=tmpdir.strpath)
+    state = qibuild.fingerprint.get_git_state(src.strpath)
+    assert len(state) == 1
+    # build directories are ignored
+    src.ensure("build-foo", "main.o", file=True)
+    assert qibuild.fingerprint.get_git_state(src.strpath) == state
+    src.join("main.cpp").write("int main() {}\n")
+    assert qibuild.fingerprint.get_git_state(src.strpath) != state
+
+def test_git_state_with_renames(tmpdir):
+    tmpdir.ensure("foo.cpp", file=True)
+    qisys.command.call(["git", "init", "-q"], cwd=tmpdir.strpath)
+    qisys.command.call(["git", "add", "foo.cpp"], cwd=tmpdir.strpath)
+    qisys.command.call(["git", "commit", "-q", "-m", "initial"],
+                       cwd=tmpdir.strpath)
+    qisys.command.call(["git", "mv", "foo.cpp", "bar.cpp"],
+                       cwd=tmpdir.strpath)
+    state = qibuild.fingerprint.get_git_state(tmpdir.strpath)
+    (_, entry, source, stat) = state
+    assert entry == "R  bar.cpp"
+    assert source == "foo.cpp"
+    assert stat[1] == 0
@@ -6,6 +6,7 @@ import os
 import subprocess
 
 import qisys.command
+import qisys.sh
 import qibuild.gdb
 
 import pytest
@@ -77,3 +78,52 @@ def test_gdb_not_installed(qibuild_action, tmpdir, record_messages):
     assert record_messages.find("Could not split debug symbols")
     assert tmpdir.check(dir=True)
 
+
+def build_with_debug(tmpdir, name):
+    bin_dir = tmpdir.ensure("bin", dir=True)
+    main_c = tmpdir.join("%s.c" % name)
+    main_c.write("int main() { return 0; }\n")
+    binary = bin_dir.join(name)
+    qisys.command.call(["gcc", "-g", main_c.strpath, "-o", binary.strpath])
+    return binary
+
+def test_split_debug_skips_up_to_date(tmpdir):
+    if not qisys.command.find_program("gcc", raises=False) or \
+       not qisys.command.find_program("objcopy", raises=False):
+        return
+    foo = build_with_debug(tmpdir, "foo")
+    bar = build_with_debug(tmpdir, "bar")
+    mtime = foo.mtime()
+    saved = qibuild.gdb.split_debug(tmpdir.strpath, num_jobs=2)
+    assert saved > 0
+    assert tmpdir.join("bin", ".debug", "foo").check(file=True)
+    assert tmpdir.join("bin", ".debug", "bar").check(file=True)
+    assert int(foo.mtime()) == int(mtime)
+    assert qibuild.gdb.is_split_up_to_date(foo.strpath)
+    assert qibuild.gdb.split_debug(tmpdir.strpath) == 0
+    # re-installing bar should cause it to be processed again
+    build_with_debug(tmpdir, "bar")
+    assert not qibuild.gdb.is_split_up_to_date(bar.strpath)
+    assert qibuild.gdb.split_debug(tmpdir.strpath) > 0
+
+def test_install_then_split_is_stable(tmpdir):
+    if not qisys.command.find_program("gcc", raises=False) or \
+       not qisys.command.find_program("objcopy", raises=False):
+        return
+    src = tmpdir.mkdir("src")
+    build_with_debug(src, "foo")
+    dest = tmpdir.join("dest")
+    installed_foo = dest.join("bin", "foo").strpath
+    keep_fun = qibuild.gdb.is_stripped_copy
+    qisys.sh.install(src.strpath, dest.strpath, keep_fun=keep_fun)
+    assert qibuild.gdb.split_debug(dest.strpath) > 0
+    before = os.stat(installed_foo)
+    qisys.sh.install(src.strpath, dest.strpath, keep_fun=keep_fun)
+    after = os.stat(installed_foo)
+    assert (after.st_ino, after.st_ctime) == (before.st_ino, before.st_ctime)
+    assert qibuild.gdb.split_debug(dest.strpath) == 0
+    # A new build of foo is installed and split again:
+    build_with_debug(src, "foo")
+    os.utime(src.join("bin", "foo").strpath, (0, 0))
+    qisys.sh.install(src.strpath, dest.strpath, keep_fun=keep_fun)
+    assert qibuild.gdb.split_debug(dest.strpath) > 0
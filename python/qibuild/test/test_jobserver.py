@@ -0,0 +1,59 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import os
+
+import qisys.command
+import qibuild.jobserver
+
+from qisys.test.conftest import skip_on_win
+
+@skip_on_win
+def test_tokens():
+    with qibuild.jobserver.JobServer(4) as jobserver:
+        assert jobserver.active
+        assert jobserver.tokens_in_use() == 0
+        env = jobserver.get_env({"MAKEFLAGS" : "-k"}, "fifo")
+        assert env["MAKEFLAGS"] == "-k -j4 --jobserver-auth=fifo:%s" % \
+            jobserver.fifo_path
+        assert jobserver.get_env(dict(), None) is None
+        fifo_path = jobserver.fifo_path
+    assert not os.path.exists(fifo_path)
+
+def test_not_active_with_one_job():
+    with qibuild.jobserver.JobServer(1) as jobserver:
+        assert not jobserver.active
+        assert jobserver.get_env(dict(), "pipe") is None
+
+@skip_on_win
+def test_make_joins_jobserver(tmpdir):
+    style = qibuild.jobserver.get_client_style("Unix Makefiles")
+    if not style:
+        return
+    targets = ["a", "b", "c", "d"]
+    makefile = tmpdir.join("Makefile")
+    to_write = "all: %s\n" % " ".join(targets)
+    for target in targets:
+        to_write += "%s:\n\tsleep 0.5\n\ttouch %s\n" % (target, target)
+    makefile.write(to_write)
+    with qibuild.jobserver.JobServer(3) as jobserver:
+        env = jobserver.get_env(os.environ, style)
+        qisys.command.call(["make"], cwd=tmpdir.strpath, env=env)
+        assert jobserver.tokens_in_use() == 0
+    # sampled while make runs: at most 2 tokens for 3 jobs
+    assert 1 <= jobserver.peak_usage <= 2
+    for target in targets:
+        assert tmpdir.join(target).check(file=True)
+
+@skip_on_win
+def test_client_style_from_make_version(monkeypatch):
+    def get_style(version):
+        monkeypatch.setattr(qisys.command, "get_version",
+                            lambda *args, **kwargs: version)
+        return qibuild.jobserver.get_client_style("Unix Makefiles")
+    assert get_style((4, 4)) == "fifo"
+    assert get_style((4, 2, 1)) == "pipe"
+    assert get_style((4, 1)) == "legacy"
+    assert get_style((3, 81)) == "legacy"
+    assert get_style(None) is None
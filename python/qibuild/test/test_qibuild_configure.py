@@ -27,6 +27,28 @@ def test_deps(qibuild_action):
     qibuild_action("configure", "-a")
 
 
+def test_skip_up_to_date_configure(qibuild_action, record_messages):
+    world_proj = qibuild_action.add_test_project("world")
+    qibuild_action("configure", "world")
+    assert not record_messages.find("Configuration is up to date")
+    qibuild_action("configure", "world")
+    assert record_messages.find("Configuration is up to date")
+
+    # Changing the cmake args, or the cmake code of the project, or
+    # using --force should run cmake again
+    record_messages.reset()
+    qibuild_action("configure", "world", "-DFOO=BAR")
+    assert not record_messages.find("Configuration is up to date")
+    record_messages.reset()
+    cmake_lists = os.path.join(world_proj.path, "CMakeLists.txt")
+    with open(cmake_lists, "a") as fp:
+        fp.write("# new line\n")
+    qibuild_action("configure", "world", "-DFOO=BAR")
+    assert not record_messages.find("Configuration is up to date")
+    record_messages.reset()
+    qibuild_action("configure", "world", "-DFOO=BAR", "--force")
+    assert not record_messages.find("Configuration is up to date")
+
 def test_qi_use_lib(qibuild_action):
     use_lib_proj = qibuild_action.add_test_project("uselib")
     qibuild_action("configure", "uselib")
@@ -0,0 +1,86 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import os
+import time
+
+import qisys.daemon
+import qibuild.worktree
+import qitoolchain
+
+def start_daemon(root):
+    daemon = qisys.daemon.Daemon(root,
+                                 observers=[qibuild.worktree.BuildWorkTree])
+    pid = os.fork()
+    if pid == 0:
+        try:
+            daemon.serve_forever()
+        finally:
+            os._exit(0)
+    for _ in range(100):
+        sock = qisys.daemon.connect(root)
+        if sock:
+            sock.close()
+            return pid
+        time.sleep(0.05)
+    assert False, "daemon did not start"
+
+def stop_daemon(root, pid):
+    assert qisys.daemon.stop(root)
+    os.waitpid(pid, 0)
+    assert not os.path.exists(qisys.daemon.socket_path(root))
+
+def test_run_through_daemon(build_worktree, capsys):
+    build_worktree.create_project("world")
+    pid = start_daemon(build_worktree.root)
+    try:
+        assert qisys.daemon.run_client("qibuild", ["list"]) == 0
+        (out, _) = capsys.readouterr()
+        assert "world" in out
+        # The daemon notices the worktree changed
+        build_worktree.create_project("hello")
+        assert qisys.daemon.run_client("qibuild", ["list"]) == 0
+        (out, _) = capsys.readouterr()
+        assert "hello" in out
+        assert qisys.daemon.run_client("qibuild",
+                                       ["find", "--cmake", "nosuchpkg"]) != 0
+    finally:
+        stop_daemon(build_worktree.root, pid)
+
+def test_fallback(build_worktree):
+    assert qisys.daemon.run_client("qibuild", ["list"]) is None
+
+def test_fallback_on_non_utf8_env(build_worktree, monkeypatch):
+    pid = start_daemon(build_worktree.root)
+    try:
+        monkeypatch.setenv("QI_NOT_UTF8", "caf\xe9")
+        assert qisys.daemon.run_client("qibuild", ["list"]) is None
+    finally:
+        stop_daemon(build_worktree.root, pid)
+
+def test_non_ascii_env(build_worktree, monkeypatch, capsys):
+    build_worktree.create_project("world")
+    pid = start_daemon(build_worktree.root)
+    try:
+        monkeypatch.setenv("QI_UTF8", "caf\xc3\xa9")
+        assert qisys.daemon.run_client("qibuild", ["list"]) == 0
+        (out, _) = capsys.readouterr()
+        assert "world" in out
+    finally:
+        stop_daemon(build_worktree.root, pid)
+
+def test_only_when_socket_exists(build_worktree, monkeypatch):
+    def connect(root):
+        assert False, "should not try to connect"
+    monkeypatch.setattr(qisys.daemon, "connect", connect)
+    assert qisys.daemon.run_client("qibuild", ["list"]) is None
+
+def test_watch_toolchain_configs(build_worktree, toolchains):
+    daemon = qisys.daemon.Daemon(build_worktree.root,
+                                 observers=[qibuild.worktree.BuildWorkTree])
+    daemon.load()
+    assert qitoolchain.get_tc_config_path() in daemon.get_watched_files()
+    assert daemon.is_up_to_date()
+    toolchains.create("foo")
+    assert not daemon.is_up_to_date()
@@ -1,6 +1,7 @@
 import sys
 import os
 
+from qisys import ui
 import qisys.command
 
 import qibuild.find
@@ -149,3 +150,64 @@ def test_install_returns(qibuild_action, tmpdir):
                              '/include/relative/bar/bar.h',
                              '/share/recurse/a_dir/b_dir/c_dir/d_file',
                              '/share/recurse/a_dir/a_file'}
+
+def test_skip_up_to_date_install(qibuild_action, tmpdir, record_messages):
+    testme = qibuild_action.add_test_project("testme")
+    dest = tmpdir.join("dest")
+    testme.configure()
+    testme.build()
+    installed = testme.install(dest.strpath, components=["runtime", "test"])
+    assert dest.join("qitest.json").check(file=True)
+    assert not record_messages.find("Installation is up to date")
+
+    # Both components were installed with the same cmake run
+    assert os.path.exists(os.path.join(testme.build_directory,
+                                       "install_manifest_runtime.txt"))
+    assert os.path.exists(os.path.join(testme.build_directory,
+                                       "install_manifest_test.txt"))
+    assert testme.install(dest.strpath,
+                          components=["runtime", "test"]) == installed
+    assert record_messages.find("Installation is up to date")
+
+    # Removing an installed file triggers a new install
+    record_messages.reset()
+    os.remove(dest.join(installed[0]).strpath)
+    testme.install(dest.strpath, components=["runtime", "test"])
+    assert not record_messages.find("Installation is up to date")
+    assert dest.join(installed[0]).check(file=True)
+
+    # So does installing other components
+    testme.install(dest.strpath, components=["runtime"])
+    assert not record_messages.find("Installation is up to date")
+
+def test_install_components_in_separate_scopes(qibuild_action, tmpdir):
+    comps = qibuild_action.create_project("comps")
+    cmake = """\
+cmake_minimum_required(VERSION 2.8)
+project(comps C)
+find_package(qibuild)
+install(CODE "set(LEAKED TRUE)" COMPONENT runtime)
+install(CODE "file(WRITE \\"\\$ENV{DESTDIR}/leaked.txt\\" \\"\\${LEAKED}\\")"
+        COMPONENT test)
+"""
+    with open(os.path.join(comps.path, "CMakeLists.txt"), "w") as fp:
+        fp.write(cmake)
+    comps.configure()
+    comps.build()
+    dest = tmpdir.join("dest")
+    comps.install(dest.strpath, components=["runtime", "test"])
+    assert dest.join("leaked.txt").read() == ""
+
+def test_skip_up_to_date_install_with_deps(qibuild_action, tmpdir,
+                                           record_messages):
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "hello")
+    dest = tmpdir.join("dest").strpath
+    qibuild_action("install", "hello", dest)
+    record_messages.reset()
+    qibuild_action("install", "hello", dest)
+    up_to_date = [x for x in ui._MESSAGES
+                  if "Installation is up to date" in x]
+    assert len(up_to_date) == 2
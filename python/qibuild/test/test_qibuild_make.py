@@ -33,3 +33,63 @@ def test_running_from_build_dir_incremental(qibuild_action):
     qibuild_action("make", "hello")
     hello = qibuild.find.find_bin([hello_proj.sdk_directory], "hello")
     qisys.command.call([hello])
+
+def test_skip_up_to_date_build(qibuild_action, record_messages):
+    world_proj = qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "hello")
+    assert not record_messages.find("Build is up to date")
+    record_messages.reset()
+    qibuild_action("make", "hello")
+    assert record_messages.find("Build is up to date")
+
+    # Changing the sources of world should build hello again, too
+    record_messages.reset()
+    world_cpp = os.path.join(world_proj.path, "world", "world.cpp")
+    with open(world_cpp, "a") as fp:
+        fp.write("\n// new line\n")
+    qibuild_action("make", "hello")
+    assert not record_messages.find("Build is up to date")
+
+    record_messages.reset()
+    qibuild_action("make", "--force", "hello")
+    assert not record_messages.find("Build is up to date")
+
+def test_make_with_jobserver(qibuild_action):
+    qibuild_action.add_test_project("world")
+    hello_proj = qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "-j", "4", "hello")
+    hello = qibuild.find.find_bin([hello_proj.sdk_directory], "hello")
+    qisys.command.call([hello])
+
+def test_install_keeps_build_stamps(qibuild_action, tmpdir, record_messages):
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    qibuild_action("make", "hello")
+    qibuild_action("install", "hello", tmpdir.join("dest").strpath)
+    record_messages.reset()
+    qibuild_action("make", "hello")
+    assert record_messages.find("Build is up to date")
+
+def test_toolchain_package_changes_trigger_build(qibuild_action, toolchains,
+                                                 record_messages):
+    toolchains.create("foo")
+    bar_package = toolchains.add_package("foo", "bar")
+    qibuild_action.create_project("hello", build_depends=["bar"])
+    qibuild_action("configure", "-c", "foo", "hello")
+    qibuild_action("make", "-c", "foo", "hello")
+    record_messages.reset()
+    qibuild_action("make", "-c", "foo", "hello")
+    assert record_messages.find("Build is up to date")
+
+    # Updating the libraries of the package builds hello again
+    record_messages.reset()
+    lib_dir = os.path.join(bar_package.path, "lib")
+    os.mkdir(lib_dir)
+    with open(os.path.join(lib_dir, "libbar.so"), "w") as fp:
+        fp.write("new library\n")
+    qibuild_action("make", "-c", "foo", "hello")
+    assert not record_messages.find("Build is up to date")
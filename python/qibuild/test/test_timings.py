@@ -0,0 +1,51 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import json
+
+import qibuild.timings
+
+def test_critical_path():
+    timings = qibuild.timings.Timings()
+    timings.add_event("world", "configure", 0, 1)
+    timings.add_event("world", "build", 1, 5)
+    timings.add_event("foo", "build", 5, 6)
+    timings.add_event("hello", "build", 6, 8)
+    timings.add_event("hello", "install", 8, 20)
+    deps = {"hello" : ["world", "foo"], "foo" : list(), "world" : list()}
+    assert timings.get_critical_path(deps) == [("world", 5), ("hello", 2)]
+    summary = timings.summary(deps=deps)
+    assert summary.splitlines()[1].split()[:2] == ["install", "hello"]
+    assert "Critical path (7.00s)" in summary
+
+def test_parse_ninja_log(tmpdir):
+    ninja_log = tmpdir.join(".ninja_log")
+    ninja_log.write("""\
+# ninja log v5
+0\t1500\t0\tCMakeFiles/foo.dir/foo.cpp.o\tabcd
+1500\t1700\t0\tfoo\tef01
+0\t300\t0\tCMakeFiles/foo.dir/foo.cpp.o\tabcd
+""")
+    res = qibuild.timings.parse_ninja_log(ninja_log.strpath)
+    assert res == {"CMakeFiles/foo.dir/foo.cpp.o" : 0.3, "foo" : 0.2}
+
+def test_qibuild_make_timings(qibuild_action, tmpdir):
+    qibuild_action.add_test_project("world")
+    qibuild_action.add_test_project("hello")
+    qibuild_action("configure", "hello")
+    output = tmpdir.join("timings.json")
+    qibuild_action("make", "hello", "--timings", output.strpath)
+    trace = json.loads(output.read())
+    names = [x["name"] for x in trace["traceEvents"]]
+    assert names == ["build world", "build hello"]
+    summary = tmpdir.join("timings.json.summary.txt").read()
+    assert "Critical path" in summary
+
+def test_write_does_not_overwrite_txt_trace(tmpdir):
+    timings = qibuild.timings.Timings()
+    timings.add_event("hello", "build", 0, 1)
+    output = tmpdir.join("timings.txt")
+    summary_path = timings.write(output.strpath)
+    assert summary_path == tmpdir.join("timings.txt.summary.txt").strpath
+    assert json.loads(output.read())["traceEvents"]
@@ -0,0 +1,210 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Record how long each phase (configure, build, install, deploy, test)
+takes for every project, and write reports about it:
+
+* a JSON file in the Chrome trace format (open it with
+  chrome://tracing or https://ui.perfetto.dev)
+* a text summary, with the slowest steps first and the critical path
+  through the dependencies
+
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+import qisys.events
+
+# Phases whose durations add up along the dependency graph
+CRITICAL_PHASES = ["configure", "build"]
+
+
+class Timings(object):
+    """ Thread-safe recorder of timed events """
+    def __init__(self):
+        self.events = list()
+        self.targets = dict()
+        self._lock = threading.Lock()
+        self._threads = dict()
+        self._origin = time.time()
+
+    @contextlib.contextmanager
+    def record(self, name, phase):
+        """ Record the duration of the enclosed block, even if
+        it raises
+
+        >>> with timings.record("hello", "build"):
+        ...     project.build()
+
+        The block is also recorded in the events stream, and the
+        fields of the last event are yielded (see
+        :py:func:`qisys.events.record`)
+
+        """
+        start = time.time()
+        try:
+            with qisys.events.record(phase, name) as event:
+                yield event
+        finally:
+            self.add_event(name, phase, start, time.time())
+
+    def add_event(self, name, phase, start, end):
+        """ Add an event, with start and end as returned by time.time() """
+        thread_id = threading.current_thread().ident
+        with self._lock:
+            tid = self._threads.setdefault(thread_id, len(self._threads))
+            self.events.append({"name" : name, "phase" : phase,
+                                "start" : start, "end" : end,
+                                "tid" : tid})
+
+    def add_ninja_log(self, name, build_dir):
+        """ Read per-target times from the .ninja_log file in build_dir,
+        if any
+
+        """
+        ninja_log = os.path.join(build_dir, ".ninja_log")
+        if os.path.exists(ninja_log):
+            with self._lock:
+                self.targets[name] = parse_ninja_log(ninja_log)
+
+    def get_durations(self):
+        """ Return a dict (name, phase) -> total duration in seconds """
+        res = dict()
+        for event in self.events:
+            key = (event["name"], event["phase"])
+            res[key] = res.get(key, 0) + event["end"] - event["start"]
+        return res
+
+    def get_critical_path(self, deps):
+        """ Return the longest chain of projects through the dependency
+        graph, as a list of (name, duration), where the duration
+        is the time spent configuring and building the project.
+
+        :param deps: a dict name -> list of names of the dependencies
+
+        """
+        durations = dict()
+        for ((name, phase), duration) in self.get_durations().iteritems():
+            if phase in CRITICAL_PHASES:
+                durations[name] = durations.get(name, 0) + duration
+        # name -> (length of the longest path ending with name, previous)
+        longest = dict()
+        def visit(name, visiting):
+            if name in longest:
+                return longest[name][0]
+            visiting.add(name)
+            best = (0, None)
+            for dep in deps.get(name, list()):
+                if dep not in durations or dep in visiting:
+                    continue
+                length = visit(dep, visiting)
+                if length > best[0]:
+                    best = (length, dep)
+            visiting.discard(name)
+            longest[name] = (best[0] + durations[name], best[1])
+            return longest[name][0]
+        if not durations:
+            return list()
+        for name in durations:
+            visit(name, set())
+        current = max(longest, key=lambda x: longest[x][0])
+        res = list()
+        while current:
+            res.append((current, durations[current]))
+            current = longest[current][1]
+        res.reverse()
+        return res
+
+    def to_chrome_trace(self):
+        """ Return the events as a dict in the Chrome trace format """
+        trace_events = list()
+        for event in sorted(self.events, key=lambda x: x["start"]):
+            trace_events.append({
+                "name" : "%s %s" % (event["phase"], event["name"]),
+                "cat" : event["phase"],
+                "ph" : "X",
+                "pid" : 0,
+                "tid" : event["tid"],
+                "ts" : int((event["start"] - self._origin) * 1e6),
+                "dur" : int((event["end"] - event["start"]) * 1e6),
+                "args" : {"project" : event["name"]},
+            })
+        res = {"traceEvents" : trace_events, "displayTimeUnit" : "ms"}
+        if self.targets:
+            res["otherData"] = {"ninja_targets" : self.targets}
+        return res
+
+    def summary(self, deps=None, num_targets=10):
+        """ A text summary of the recorded events, slowest first """
+        lines = list()
+        durations = self.get_durations()
+        if not durations:
+            return "No timings recorded\n"
+        total = sum(durations.values())
+        max_len = max(len("%s %s" % key) for key in durations)
+        lines.append("Time spent per project and phase:")
+        for (key, duration) in sorted(durations.iteritems(),
+                                      key=lambda x: x[1], reverse=True):
+            (name, phase) = key
+            label = "%s %s" % (phase, name)
+            lines.append("  %s %8.2fs %5.1f%%" % (label.ljust(max_len),
+                         duration, 100 * duration / (total or 1)))
+        if deps is not None:
+            critical_path = self.get_critical_path(deps)
+            if critical_path:
+                length = sum(x[1] for x in critical_path)
+                lines.append("")
+                lines.append("Critical path (%.2fs):" % length)
+                for (name, duration) in critical_path:
+                    lines.append("  %s %8.2fs" % (name.ljust(max_len), duration))
+        targets = list()
+        for (name, project_targets) in self.targets.iteritems():
+            for (target, duration) in project_targets.iteritems():
+                targets.append((duration, name, target))
+        if targets:
+            lines.append("")
+            lines.append("Slowest targets:")
+            targets.sort(reverse=True)
+            for (duration, name, target) in targets[:num_targets]:
+                lines.append("  %8.2fs %s: %s" % (duration, name, target))
+        return "\n".join(lines) + "\n"
+
+    def write(self, output, deps=None):
+        """ Write the Chrome trace to output, and the text summary
+        next to it, in <output>.summary.txt
+
+        Return the path of the text summary
+
+        """
+        with open(output, "w") as fp:
+            json.dump(self.to_chrome_trace(), fp, indent=2)
+        summary_path = output + ".summary.txt"
+        with open(summary_path, "w") as fp:
+            fp.write(self.summary(deps=deps))
+        return summary_path
+
+
+def parse_ninja_log(ninja_log):
+    """ Parse a .ninja_log file, returning a dict target -> duration
+    of its last build, in seconds
+
+    """
+    res = dict()
+    with open(ninja_log, "r") as fp:
+        for line in fp:
+            if line.startswith("#"):
+                continue
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 4:
+                continue
+            try:
+                (start, end) = (int(parts[0]), int(parts[1]))
+            except ValueError:
+                continue
+            res[parts[3]] = (end - start) / 1000.0
+    return res
@@ -5,7 +5,9 @@ import qisys.command
 import qisys.worktree
 import qibuild.build
 import qibuild.build_config
+import qibuild.config
 import qibuild.project
+import qitoolchain
 
 
 class BuildWorkTree(qisys.worktree.WorkTreeObserver):
@@ -15,6 +17,7 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
     def __init__(self, worktree):
         self.worktree = worktree
         self.root = self.worktree.root
+        self._qibuild_xml = None
         self.build_config = qibuild.build_config.CMakeBuildConfig(self)
         self.build_projects = list()
         self._load_build_projects()
@@ -30,10 +33,13 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
         Will be created if it does not exist
 
         """
+        if self._qibuild_xml:
+            return self._qibuild_xml
         config_path = os.path.join(self.worktree.dot_qi, "qibuild.xml")
         if not os.path.exists(config_path):
             with open(config_path, "w") as fp:
                 fp.write("<qibuild />\n")
+        self._qibuild_xml = config_path
         return config_path
 
     @property
@@ -46,6 +52,15 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
         """ The default config to use """
         return self.build_config.default_config
 
+    def get_watched_files(self):
+        """ The configuration files the build configuration is read from,
+        (see :py:class:`qisys.daemon.Daemon`)
+
+        """
+        res = [qibuild.config.get_global_cfg_path(), self.qibuild_xml]
+        res.extend(qitoolchain.get_config_files())
+        return res
+
     def get_build_project(self, name, raises=True):
         """ Get a :py:class:`.BuildProject` given its name """
         for build_project in self.build_projects:
@@ -68,6 +83,9 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
     def on_project_moved(self, project):
         self._load_build_projects()
 
+    def on_projects_changed(self, changes):
+        self._load_build_projects()
+
     def _load_build_projects(self):
         """ Create BuildProject for every buildable project in the
         worktree
@@ -84,21 +102,24 @@ class BuildWorkTree(qisys.worktree.WorkTreeObserver):
         """ Configure a build profile for the worktree """
         qibuild.profile.configure_build_profile(self.qibuild_xml,
                                                 name, flags)
+        self.build_config.invalidate_cache()
 
     def remove_build_profile(self, name):
         """ Remove a build profile for this worktree """
         qibuild.profile.remove_build_profile(self.qibuild_xml, name)
+        self.build_config.invalidate_cache()
 
     def set_default_config(self, name):
         """ Set the default toolchain for this worktree """
-        tree = qisys.qixml.read(self.qibuild_xml)
+        repository = qibuild.config.get_repository()
+        tree = repository.edit(self.qibuild_xml)
         root = tree.getroot()
         defaults = root.find("defaults")
         if defaults is None:
             defaults = qisys.qixml.etree.Element("defaults")
             root.append(defaults)
         defaults.set("config", name)
-        qisys.qixml.write(tree, self.qibuild_xml)
+        repository.write(tree, self.qibuild_xml)
 
     def set_active_config(self, active_config):
         """ Set the config to use for this worktree
@@ -52,6 +52,9 @@ class DocWorkTree(qisys.worktree.WorkTreeObserver):
         """ Called when a project has moved """
         self._load_doc_projects()
 
+    def on_projects_changed(self, changes):
+        self._load_doc_projects()
+
     def get_doc_project(self, name, raises=False):
         for project in self.doc_projects:
             if isinstance(project, TemplateProject):
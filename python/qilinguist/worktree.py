@@ -33,6 +33,9 @@ class LinguistWorkTree(qisys.worktree.WorkTreeObserver):
         """ Called when a build project has been moved """
         self._load_linguist_projects()
 
+    def on_projects_changed(self, changes):
+        self._load_linguist_projects()
+
     def get_linguist_project(self, name, raises=False):
         for project in self.linguist_projects:
             if project.name == name:
@@ -12,6 +12,7 @@
 import sys
 
 from qisys import ui
+import qisys.events
 import qisys.parsers
 import qisrc.git
 import qisrc.sync
@@ -61,7 +62,12 @@ def do(args):
         ui.info_count(i, len(git_projects),
                       ui.blue, git_project.src.ljust(max_src), end="\r")
 
-        (status, out) = git_project.sync(rebase_devel=args.rebase_devel)
+        with qisys.events.record("sync", git_project.src) as event:
+            (status, out) = git_project.sync(rebase_devel=args.rebase_devel)
+            if status is None:
+                event["skipped"] = out
+            if status is False:
+                event["error"] = out
         if status is None:
             ui.info("\n", "\n", ui.brown, git_project.src, "  [skipped]")
             skipped.append((git_project.src, out))
@@ -43,18 +43,17 @@ class Manifest(object):
 
     def load(self):
         """ (re)-parse the xml configuration file """
-        project_names = list()
+        project_names = set()
         self.repos = list()
         self.remotes = list()
         self.groups = qisrc.groups.Groups()
-        root = qisys.qixml.read(self.manifest_xml).getroot()
         parser = ManifestParser(self)
-        parser.parse(root)
+        parser.parse_file(self.manifest_xml)
 
         for repo in self.repos:
             if repo.project in project_names:
                 raise ManifestError("%s found twice" % repo.project)
-            project_names.append(repo.project)
+            project_names.add(repo.project)
 
         for remote in self.remotes:
             remote.parse_url()
@@ -28,7 +28,10 @@ def get_git_worktree(args):
 
     """
     worktree = qisys.parsers.get_worktree(args)
-    git_worktree = qisrc.worktree.GitWorkTree(worktree)
+    git_worktree = qisys.worktree.get_preloaded(qisrc.worktree.GitWorkTree,
+                                                worktree.root)
+    if not git_worktree:
+        git_worktree = qisrc.worktree.GitWorkTree(worktree)
     return git_worktree
 
 
@@ -9,6 +9,7 @@
 import os
 
 from qisys import ui
+import qisys.events
 import qisys.qixml
 import qisrc.git
 import qisrc.manifest
@@ -86,7 +87,8 @@ class WorkTreeSyncer(object):
             self._sync_build_profiles(local_manifest)
             self._sync_groups(local_manifest)
         self.new_repos = self.get_new_repos()
-        res = self._sync_repos(self.old_repos, self.new_repos)
+        with self.git_worktree.worktree.batch():
+            res = self._sync_repos(self.old_repos, self.new_repos)
         # re-read self.old_repos so we can do several syncs:
         self.old_repos = self.get_old_repos()
         # if everything went well, save the manifests configurations:
@@ -114,13 +116,14 @@ class WorkTreeSyncer(object):
         ui.info(ui.green, ":: Configuring projects ...")
         max_src = max(len(x.src) for x in to_configure)
         n = len(to_configure)
-        for i, repo in enumerate(to_configure):
-            ui.info_count(i, n, ui.white, "Configuring", ui.reset,
-                          ui.blue, repo.src.ljust(max_src), end="\r")
-            git_project = srcs[repo.src]
-            git_project.apply_remote_config(repo)
-        ui.info(" " * (max_src + 19), end="\r")
-        self.git_worktree.save_git_config()
+        with self.git_worktree.worktree.batch():
+            for i, repo in enumerate(to_configure):
+                ui.info_count(i, n, ui.white, "Configuring", ui.reset,
+                              ui.blue, repo.src.ljust(max_src), end="\r")
+                git_project = srcs[repo.src]
+                git_project.apply_remote_config(repo)
+            ui.info(" " * (max_src + 19), end="\r")
+            self.git_worktree.save_git_config()
 
     def dump_manifests(self):
         """ Save the manifests in .qi/manifests.xml """
@@ -260,11 +263,13 @@ class WorkTreeSyncer(object):
             if project:  # Repo is already there, re-apply config
                 project.apply_remote_config(repo)
                 continue
-            if not self.git_worktree.clone_missing(repo):
-                res = False
-            else:
-                project = self.git_worktree.get_git_project(repo.src)
-                project.apply_remote_config(repo)
+            with qisys.events.record("clone", repo.src) as event:
+                if not self.git_worktree.clone_missing(repo):
+                    res = False
+                    event["error"] = "Cloning failed"
+                else:
+                    project = self.git_worktree.get_git_project(repo.src)
+                    project.apply_remote_config(repo)
 
         if to_move:
             ui.info(ui.green, ":: Moving repositories ...")
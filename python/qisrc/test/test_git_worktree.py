@@ -149,3 +149,13 @@ def test_read_groups(git_worktree, git_server):
     expected = [git_worktree.get_git_project(x) for x in expected_srcs]
     actual = git_worktree.get_git_projects(groups=["foobar", "mygroup"])
     assert expected == actual
+
+def test_add_git_project_in_batch(git_worktree, test_git):
+    foo_path = git_worktree.tmpdir.mkdir("foo").strpath
+    test_git(foo_path).initialize()
+    with git_worktree.worktree.batch():
+        foo_proj = git_worktree.add_git_project("foo")
+        assert foo_proj is not None
+        assert foo_proj.src == "foo"
+        assert git_worktree.get_git_project("foo") is foo_proj
+    assert git_worktree.get_git_project("foo").src == "foo"
@@ -53,18 +53,38 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         """ Delegates to WorkTreeSyncer """
         return self._syncer.sync()
 
+    def _add_git_project(self, git_project):
+        """ Add just one git project, without reloading the others """
+        self.git_projects = [x for x in self.git_projects
+                             if x.src != git_project.src]
+        self.git_projects.append(git_project)
+        self.git_projects.sort(key=operator.attrgetter("src"))
+
     def load_git_projects(self):
         """ Build a list of git projects using the
         xml configuration
 
+        """
+        self._load_git_projects(dict())
+
+    def _load_git_projects(self, known):
+        """ Helper for load_git_projects. Re-use the GitProject
+        instances in the known dict (src -> GitProject)
+
         """
         self.git_projects = list()
+        elems = dict((x.get("src"), x)
+                     for x in self._root_xml.findall("project"))
         for worktree_project in self.worktree.projects:
             project_src = worktree_project.src
+            git_project = known.get(project_src)
+            if git_project:
+                self.git_projects.append(git_project)
+                continue
             if not qisrc.git.is_git(worktree_project.path):
                 continue
             git_project = qisrc.project.GitProject(self, worktree_project)
-            git_elem = self._get_elem(project_src)
+            git_elem = elems.get(project_src)
             if git_elem is not None:
                 git_project.load_xml(git_elem)
             self.git_projects.append(git_project)
@@ -118,6 +138,13 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
                 fp.write("""<git />""")
         return git_xml_path
 
+    def get_watched_files(self):
+        """ The files the git projects are read from,
+        (see :py:class:`qisys.daemon.Daemon`)
+
+        """
+        return [self.git_xml]
+
     @property
     def manifests(self):
         return self._syncer.manifests
@@ -142,11 +169,16 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         elem = qisys.qixml.etree.Element("project")
         elem.set("src", src)
         self._root_xml.append(elem)
-        qisys.qixml.write(self._root_xml, self.git_xml)
-        # This will trigger the call to self.load_git_projects()
-        self.worktree.add_project(src)
-        new_proj = self.get_git_project(src)
-        return new_proj
+        self._save_git_xml()
+        # Outside a batch, this triggers the call to
+        # self.load_git_projects(), but inside a batch, the
+        # notification is deferred
+        worktree_project = self.worktree.add_project(src)
+        if qisrc.git.is_git(worktree_project.path):
+            git_project = qisrc.project.GitProject(self, worktree_project)
+            git_project.load_xml(elem)
+            self._add_git_project(git_project)
+        return self.get_git_project(src)
 
     def on_project_removed(self, project):
         self.load_git_projects()
@@ -157,6 +189,12 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
     def on_project_moved(self, project):
         self.load_git_projects()
 
+    def on_projects_changed(self, changes):
+        # The git projects cloned during the batch may have been
+        # configured in memory since, so keep them
+        known = dict((x.src, x) for x in self.git_projects)
+        self._load_git_projects(known)
+
     def clone_missing(self, repo):
         """ Add a new project.
         :returns: a boolean telling if the clone succeeded
@@ -176,6 +214,11 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
             else:
                 # Do nothing, the remote will be re-configured later
                 # anyway
+                if self.worktree.in_batch:
+                    git_elem = self._get_elem(git_project.src)
+                    if git_elem is not None:
+                        git_project.load_xml(git_elem)
+                    self._add_git_project(git_project)
                 return True
         return self._clone_missing(git_project, repo)
 
@@ -197,7 +240,7 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
             self.worktree.remove_project(repo.src)
             return False
         self.save_project_config(git_project)
-        self.load_git_projects()
+        self._add_git_project(git_project)
         return True
 
     def move_repo(self, repo, new_src):
@@ -301,13 +344,23 @@ class GitWorkTree(qisys.worktree.WorkTreeObserver):
         """ Save the project instance in .qi/git.xml """
         project_xml = project.dump_xml()
         self._set_elem(project.src, project_xml)
-        qisys.qixml.write(self._root_xml, self.git_xml)
+        self._save_git_xml()
 
     def save_git_config(self):
         """ Save the worktree config in .qi/git.xml """
         for project in self.git_projects:
             project_xml = project.dump_xml()
             self._set_elem(project.src, project_xml)
+        self._save_git_xml()
+
+    def _save_git_xml(self):
+        """ Write .qi/git.xml, at the end of the current
+        batch if there is one (see :py:meth:`qisys.worktree.WorkTree.batch`)
+
+        """
+        self.worktree.schedule(self.git_xml, self._write_git_xml)
+
+    def _write_git_xml(self):
         qisys.qixml.write(self._root_xml, self.git_xml)
 
     def __repr__(self):
@@ -35,6 +35,7 @@ import operator
 import subprocess
 import zipfile
 
+import qisys.scan
 import qisys.sh
 import qisys.command
 from qisys import ui
@@ -83,16 +84,17 @@ Please set only one of these two options to 'True'
     archive_path = archive_basepath + ".zip"
     ui.debug("Compressing", directory, "to", archive_path)
     archive = zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED)
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            full_path = os.path.join(root, filename)
+    for root, _, entries in qisys.scan.walk(directory):
+        for entry in entries:
+            full_path = entry.path
             rel_path  = os.path.relpath(full_path, directory)
             arcname   = os.path.join(os.path.basename(directory), rel_path)
             if sys.stdout.isatty() and not quiet:
                 sys.stdout.write("adding {0}\n".format(rel_path))
                 sys.stdout.flush()
-            if not qisys.sh.broken_symlink(full_path):
-                archive.write(full_path, arcname)
+            if entry.is_symlink() and qisys.sh.broken_symlink(full_path):
+                continue
+            archive.write(full_path, arcname)
     archive.close()
     return archive_path
 
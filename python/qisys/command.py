@@ -7,6 +7,7 @@
 """
 
 import os
+import re
 import sys
 import contextlib
 import subprocess
@@ -299,6 +300,26 @@ def check_output(*popenargs, **kwargs):
     return output
 
 
+_VERSIONS = dict()
+
+def get_version(program):
+    """ Return the version of a program as a tuple of ints,
+    by running ``program --version``, or None
+
+    """
+    if program in _VERSIONS:
+        return _VERSIONS[program]
+    res = None
+    try:
+        out = check_output([program, "--version"], stderr=subprocess.PIPE)
+        match = re.search(r"(\d+)\.(\d+)", out)
+        if match:
+            res = tuple(int(x) for x in match.groups())
+    except (OSError, CommandFailedException):
+        pass
+    _VERSIONS[program] = res
+    return res
+
 def check_output_error(*popenargs, **kwargs):
     """Run command with arguments and return its output and error as a byte string.
 
@@ -390,6 +411,8 @@ def call(cmd, cwd=None, env=None, ignore_ret_code=False, quiet=False):
     call_kwargs = {"env":env, "cwd":cwd}
     if quiet:
         call_kwargs["stdout"] = subprocess.PIPE
+    # The process writes directly to the terminal
+    ui.flush()
     returncode = subprocess.call(cmd, **call_kwargs)
 
     if returncode != 0 and not ignore_ret_code:
@@ -418,6 +441,7 @@ def call_background(cmd, cwd=None, env=None):
     the process has been killed.
 
     """
+    ui.flush()
     process = subprocess.Popen(cmd, cwd=cwd, env=env)
     caught_error = None
     try:
@@ -0,0 +1,435 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" An optional daemon keeping a worktree loaded in memory, so that
+qibuild, qisrc, qitoolchain ... commands do not have to import their
+actions and to parse the worktree, its projects and the configuration
+files each time they are run.
+
+Start it from the worktree with ``qibuild daemon``. It listens on
+``<worktree>/.qi/daemon.sock``, and while this socket exists, every
+command run inside this worktree is sent to it (see
+:py:func:`run_client`). Otherwise, commands run as usual.
+
+Each command is run in a process forked from the daemon, with the
+current directory, environment, standard input and outputs of the
+client, so the actions are free to change anything. The daemon loads
+the worktree again when one of the files it, or the preloaded objects,
+were read from changes.
+
+Set ``QI_NO_DAEMON=1`` in the environment to never use the daemon.
+
+"""
+
+import argparse
+import errno
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+from qisys import ui
+import qisys.parsers
+import qisys.script
+import qisys.worktree
+
+# Messages are (channel, data) frames:
+#  "r": the request, sent by the client
+#  "0": standard input, sent by the client. Empty data means end of file
+#  "1", "2": standard output and error, sent by the daemon
+#  "x": the exit code of the command, sent by the daemon
+_HEADER = struct.Struct("!cI")
+
+SCRIPTS = ["qibuild", "qisrc", "qitoolchain", "qitest", "qidoc", "qilinguist"]
+
+
+def socket_path(root):
+    """ Path to the socket of the daemon of the worktree in root """
+    return os.path.join(root, ".qi", "daemon.sock")
+
+def _send(sock, channel, data):
+    sock.sendall(_HEADER.pack(channel, len(data)) + data)
+
+def _recv_exactly(sock, size):
+    chunks = list()
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+def _recv(sock):
+    """ Return the next (channel, data) frame,
+    or (None, None) if the connection was closed
+
+    """
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return (None, None)
+    (channel, size) = _HEADER.unpack(header)
+    data = _recv_exactly(sock, size)
+    if data is None:
+        return (None, None)
+    return (channel, data)
+
+def _encode(value):
+    """ json.loads returns unicode strings, encode them back
+    to utf-8 so that they can be used in os.environ, sys.argv ...
+
+    """
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, list):
+        return [_encode(x) for x in value]
+    if isinstance(value, dict):
+        return dict((_encode(k), _encode(v)) for (k, v) in value.iteritems())
+    return value
+
+def connect(root):
+    """ Return a socket connected to the daemon of the worktree in root,
+    or None if it is not running
+
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path(root))
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+def run_client(script, args):
+    """ Run a command through the daemon of the current worktree.
+
+    Return its exit code, or None if no daemon is running,
+    in which case the caller should run the command itself.
+
+    """
+    if os.environ.get("QI_NO_DAEMON") or not hasattr(socket, "AF_UNIX"):
+        return None
+    if args[:1] == ["daemon"]:
+        return None
+    root = qisys.parsers.guess_worktree_root(args)
+    if not root or not os.path.exists(socket_path(root)):
+        return None
+    request = {
+        "script" : script,
+        "args" : args,
+        "cwd" : os.getcwd(),
+        "env" : dict(os.environ),
+        "isatty" : [_isatty(sys.stdout), _isatty(sys.stderr)],
+    }
+    try:
+        request = json.dumps(request)
+    except ValueError:
+        # Arguments or environment that are not valid UTF-8:
+        # run the command without the daemon
+        return None
+    sock = connect(root)
+    if not sock:
+        return None
+    outputs = {"1" : sys.stdout, "2" : sys.stderr}
+    try:
+        _send(sock, "r", request)
+        input_thread = threading.Thread(target=_forward_input,
+                                        args=(sock, sys.stdin))
+        input_thread.daemon = True
+        input_thread.start()
+        while True:
+            (channel, data) = _recv(sock)
+            if channel is None:
+                sys.stderr.write("Error: lost connection to the qibuild daemon\n")
+                return 1
+            if channel == "x":
+                return json.loads(data)
+            fp = outputs[channel]
+            fp.write(data)
+            fp.flush()
+    except KeyboardInterrupt:
+        # Closing the connection interrupts the command
+        return 130
+    finally:
+        sock.close()
+
+def _isatty(fp):
+    try:
+        return fp.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+def _forward_input(sock, fp):
+    try:
+        while True:
+            line = fp.readline()
+            _send(sock, "0", line)
+            if not line:
+                return
+    except (IOError, ValueError, socket.error):
+        return
+
+
+class Daemon(object):
+    """ Keep the worktree in root, and the objects built on top of
+    it, loaded, and run the commands sent by :py:func:`run_client`
+
+    :param observers: classes such as BuildWorkTree or GitWorkTree,
+                      built from the worktree and preloaded as well.
+                      The files returned by their get_watched_files()
+                      method, if any, are watched too
+    :param watched: other files to watch
+
+    """
+    def __init__(self, root, observers=None, watched=None):
+        self.root = os.path.abspath(root)
+        self.socket_path = socket_path(self.root)
+        self.observers = observers or list()
+        self.watched = watched or list()
+        self.modules = dict()
+        self.worktree = None
+        self.preloaded = list()
+        self._state = None
+        self._stopped = False
+
+    def load(self):
+        """ (Re)load the worktree and the action modules """
+        for script in SCRIPTS:
+            if script in self.modules:
+                continue
+            try:
+                self.modules[script] = qisys.script.action_modules_from_package(
+                                            "%s.actions" % script)
+            except ImportError:
+                pass
+        qisys.worktree.clear_preloaded()
+        self.worktree = None
+        self.preloaded = list()
+        try:
+            worktree = qisys.worktree.WorkTree(self.root)
+            qisys.worktree.preload(worktree)
+            for observer in self.observers:
+                obj = observer(worktree)
+                qisys.worktree.preload(obj)
+                self.preloaded.append(obj)
+            self.worktree = worktree
+        except Exception, e:
+            # Let the commands load the worktree and report the error
+            qisys.worktree.clear_preloaded()
+            self.preloaded = list()
+            ui.warning("Could not load worktree in", self.root, ":", e)
+        self._state = self.get_state()
+
+    def get_watched_files(self):
+        """ The files the loaded worktree depends on """
+        res = list(self.watched)
+        dot_qi = os.path.join(self.root, ".qi")
+        for name in os.listdir(dot_qi):
+            if name.endswith(".xml"):
+                res.append(os.path.join(dot_qi, name))
+        if self.worktree:
+            for project in self.worktree.projects:
+                res.append(project.qiproject_xml)
+        for obj in self.preloaded:
+            get_watched_files = getattr(obj, "get_watched_files", None)
+            if get_watched_files:
+                res.extend(get_watched_files())
+        return res
+
+    def get_state(self):
+        res = list()
+        for path in self.get_watched_files():
+            try:
+                st = os.stat(path)
+            except OSError:
+                res.append((path, None))
+                continue
+            res.append((path, st.st_mtime, st.st_size, st.st_ino))
+        return res
+
+    def is_up_to_date(self):
+        return self._state == self.get_state()
+
+    def serve_forever(self):
+        """ Accept and run commands until :py:func:`stop` is called """
+        sock = connect(self.root)
+        if sock:
+            sock.close()
+            raise Exception("A daemon is already running in %s" % self.root)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.load()
+        # Forked children are reaped automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0600)
+        server.listen(16)
+        ui.info(ui.green, "Listening on", ui.reset, ui.bold, self.socket_path)
+        try:
+            while not self._stopped:
+                (conn, _) = server.accept()
+                try:
+                    self._handle(server, conn)
+                finally:
+                    conn.close()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    def _handle(self, server, conn):
+        (channel, data) = _recv(conn)
+        if channel != "r":
+            return
+        request = _encode(json.loads(data))
+        if request.get("stop"):
+            self._stopped = True
+            _send(conn, "x", "0")
+            return
+        if not self.is_up_to_date():
+            ui.info(ui.green, "Reloading worktree")
+            self.load()
+        ui.debug("Running", request["script"], " ".join(request["args"]))
+        pid = os.fork()
+        if pid == 0:
+            server.close()
+            exit_code = 1
+            try:
+                exit_code = self._run(conn, request)
+            finally:
+                os._exit(exit_code)
+
+    def _run(self, conn, request):
+        """ Run a command in the forked process, with the standard input
+        and outputs of the client
+
+        """
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        # So that the whole command can be interrupted
+        os.setpgrp()
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        script = request["script"]
+        args = request["args"]
+        sys.argv = [script] + args
+
+        lock = threading.Lock()
+        done = threading.Event()
+        (stdin_read, stdin_write) = os.pipe()
+        os.dup2(stdin_read, 0)
+        os.close(stdin_read)
+        input_thread = threading.Thread(target=self._pump_input,
+                                        args=(conn, stdin_write, done))
+        input_thread.daemon = True
+        input_thread.start()
+        output_threads = list()
+        for (fd, isatty) in zip([1, 2], request["isatty"]):
+            # Use a terminal when the client has one, for the colors
+            if isatty:
+                (read_end, write_end) = os.openpty()
+            else:
+                (read_end, write_end) = os.pipe()
+            os.dup2(write_end, fd)
+            os.close(write_end)
+            thread = threading.Thread(target=self._pump_output,
+                                      args=(conn, lock, read_end, str(fd)))
+            thread.start()
+            output_threads.append(thread)
+        sys.stdin = os.fdopen(0, "r")
+        sys.stdout = os.fdopen(1, "w")
+        sys.stderr = os.fdopen(2, "w", 0)
+
+        exit_code = 0
+        try:
+            try:
+                modules = self.modules.get(script)
+                if modules is None:
+                    modules = qisys.script.action_modules_from_package(
+                                "%s.actions" % script)
+                qisys.script.root_command_main(script,
+                                               argparse.ArgumentParser(),
+                                               modules, args=args)
+            except SystemExit, e:
+                if e.code is None:
+                    exit_code = 0
+                elif isinstance(e.code, int):
+                    exit_code = e.code
+                else:
+                    sys.stderr.write("%s\n" % e.code)
+                    exit_code = 1
+            except KeyboardInterrupt:
+                exit_code = 130
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+            ui.flush()
+        finally:
+            done.set()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.close(1)
+            os.close(2)
+            for thread in output_threads:
+                thread.join(5)
+            with lock:
+                _send(conn, "x", json.dumps(exit_code))
+        return exit_code
+
+    @staticmethod
+    def _pump_output(conn, lock, fd, channel):
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except OSError, e:
+                # Reading a terminal closed on the other end
+                if e.errno == errno.EIO:
+                    break
+                raise
+            if not data:
+                break
+            with lock:
+                _send(conn, channel, data)
+        os.close(fd)
+
+    @staticmethod
+    def _pump_input(conn, fd, done):
+        while True:
+            try:
+                (channel, data) = _recv(conn)
+            except socket.error:
+                channel = None
+            if channel is None:
+                # The client went away: interrupt the command
+                if not done.is_set():
+                    os.killpg(0, signal.SIGINT)
+                return
+            if fd is None:
+                continue
+            if data:
+                os.write(fd, data)
+            else:
+                os.close(fd)
+                fd = None
+
+def stop(root):
+    """ Stop the daemon of the worktree in root.
+    Return False if it was not running
+
+    """
+    sock = connect(root)
+    if not sock:
+        return False
+    try:
+        _send(sock, "r", json.dumps({"stop" : True}))
+        _recv(sock)
+    finally:
+        sock.close()
+    return True
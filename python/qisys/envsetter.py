@@ -7,6 +7,7 @@ designed to take care of environment variables.
 
 
 """
+import hashlib
 import os
 import sys
 import subprocess
@@ -14,6 +15,54 @@ import subprocess
 import qisys
 import qisys.sh
 
+# set of environment variables that are in fact list of paths
+# FIXME: what should we do with other env?
+# FIXME: how can we avoid to hardcode this?
+BAT_VARIABLES = set(("INCLUDE", "LIB", "LIBPATH", "PATH"))
+
+
+class FrozenEnv(dict):
+    """ A read-only environment, shared between several users.
+    Use :py:func:`overlay` or ``.copy()`` to get a modified version
+
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("This environment is shared and cannot be modified. "
+                        "Use qisys.envsetter.overlay() or .copy()")
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+def overlay(env, changes):
+    """ Return env with the variables in the changes dict set.
+
+    ``env`` is never modified: if some variables have to change,
+    a copy is returned, otherwise ``env`` itself
+
+    """
+    if all(env.get(key) == value for (key, value) in changes.iteritems()):
+        return env
+    res = dict(env)
+    res.update(changes)
+    return res
+
+def get_bat_cache_path(bat_file):
+    """ Where to store the variables set by a .bat script.
+    The name of the file depends on the contents of the script
+    and on the variables it may change
+
+    """
+    hasher = hashlib.sha1()
+    hasher.update(os.path.abspath(bat_file))
+    with open(bat_file, "rb") as fp:
+        hasher.update(fp.read())
+    for key in sorted(BAT_VARIABLES):
+        hasher.update("%s=%s\n" % (key, os.environ.get(key, "")))
+    return qisys.sh.get_cache_path("qi", "bat",
+                                   hasher.hexdigest() + ".env")
+
+
 class EnvSetter():
     r""" A class to manage environment variables
 
@@ -42,8 +91,8 @@ class EnvSetter():
     # returning a *reference* to the directory ...
     def __init__(self, build_env=None):
         if not build_env:
-            build_env = os.environ.copy()
-        self._build_env = build_env
+            build_env = os.environ
+        self._build_env = build_env.copy()
 
     def get_build_env(self):
         """ Returns a dict containing the new environnment
@@ -110,12 +159,27 @@ class EnvSetter():
         if not os.path.exists(bat_file):
             raise Exception("general.env.bat_file (%s) does not exists" % bat_file)
 
-        # set of environment variables that are in fact list of paths
-        # FIXME: what should we do with other env?
-        # FIXME: how can we avoid to hardcode this?
-        interesting = set(("INCLUDE", "LIB", "LIBPATH", "PATH"))
-        result = {}
+        # Running the script is slow, so its results are stored
+        cache_path = get_bat_cache_path(bat_file)
+        if os.path.exists(cache_path):
+            with open(cache_path, "r") as fp:
+                lines = fp.read().splitlines()
+            result = dict(x.split("=", 1) for x in lines if "=" in x)
+        else:
+            result = self._run_bat(bat_file)
+            with open(cache_path, "w") as fp:
+                for (key, value) in sorted(result.iteritems()):
+                    fp.write("%s=%s\n" % (key, value))
+
+        for (variable, directories_list) in result.iteritems():
+            directories = directories_list.split(os.path.pathsep)
+            for directory in directories:
+                self.prepend_directory_to_variable(directory, variable)
+
 
+    def _run_bat(self, bat_file):
+        """ Return the interesting variables set by the .bat script """
+        result = {}
         process = subprocess.Popen('"%s"& set' % (bat_file),
                              stdout=subprocess.PIPE,
                              shell=True)
@@ -132,16 +196,11 @@ class EnvSetter():
             line = line.strip()
             key, value = line.split('=', 1)
             key = key.upper()
-            if key in interesting:
+            if key in BAT_VARIABLES:
                 if value.endswith(os.pathsep):
                     value = value[:-1]
                 result[key] = value
-
-        for (variable, directories_list) in result.iteritems():
-            directories = directories_list.split(os.path.pathsep)
-            for directory in directories:
-                self.prepend_directory_to_variable(directory, variable)
-
+        return result
 
     def read_config(self, qibuild_cfg):
         """ Read a :py:class:`qibuild.config.QiBuildConfig` instance
@@ -0,0 +1,120 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" A stream of events describing the long running operations (configuring,
+building, installing and deploying projects, syncing git projects,
+updating toolchains, running tests ...), for tools such as continuous
+integration dashboards, which should not have to parse the output.
+
+Enabled with ``--events-file PATH``. One JSON object per line is appended
+to PATH::
+
+    {"event": "start", "operation": "build", "name": "foo", "time": 1400000000.0}
+    {"event": "finish", "operation": "build", "name": "foo", "time": 1400000012.3,
+     "duration": 12.3}
+    {"event": "fail", "operation": "build", "name": "bar", "time": 1400000013.5,
+     "duration": 1.2, "exit_code": 2, "error": "..."}
+
+Some events have more fields, such as ``bytes`` for downloads and deploys.
+
+The events are written by a background thread (see
+:py:class:`qisys.ui.BufferedWriter`), so emitting them is cheap,
+and does nothing at all when no events file is set.
+
+"""
+
+import contextlib
+import json
+import time
+
+from qisys import ui
+
+_STREAM = None
+
+
+class EventStream(object):
+    """ Write events to a file """
+    def __init__(self, path):
+        self.path = path
+        self._fp = open(path, "a")
+        self._writer = ui.BufferedWriter()
+
+    def emit(self, event, operation, name, **kwargs):
+        """ Write one event """
+        res = {"event" : event, "operation" : operation, "name" : name,
+               "time" : time.time()}
+        for (key, value) in kwargs.iteritems():
+            if value is not None:
+                res[key] = value
+        self._writer.write(self._fp, json.dumps(res) + "\n")
+
+    def close(self):
+        """ Write the remaining events and close the file """
+        self._writer.close()
+        self._fp.close()
+
+
+def configure(args):
+    """ Open the events file given on the command line, if any """
+    events_file = getattr(args, "events_file", None)
+    if events_file:
+        open_stream(events_file)
+
+def open_stream(path):
+    """ Start writing events to path """
+    global _STREAM
+    close_stream()
+    _STREAM = EventStream(path)
+
+def close_stream():
+    """ Stop writing events """
+    global _STREAM
+    if _STREAM:
+        _STREAM.close()
+        _STREAM = None
+
+def emit(event, operation, name, **kwargs):
+    """ Emit an event, if an events file is set """
+    if _STREAM:
+        _STREAM.emit(event, operation, name, **kwargs)
+
+@contextlib.contextmanager
+def record(operation, name, **kwargs):
+    """ Emit a "start" event, then a "finish" or "fail" event with
+    the duration of the enclosed block.
+
+    Yield a dict of additional fields for the last event. If an
+    "error" is set in it, or if the block raises, a "fail" event is
+    emitted::
+
+        with qisys.events.record("download", url) as event:
+            event["bytes"] = download(url)
+
+    """
+    fields = dict(kwargs)
+    if not _STREAM:
+        yield fields
+        return
+    start = time.time()
+    emit("start", operation, name, **kwargs)
+    try:
+        yield fields
+    except BaseException, e:
+        if fields.get("error") is None:
+            fields["error"] = str(e) or type(e).__name__
+        if fields.get("exit_code") is None:
+            fields["exit_code"] = _get_exit_code(e)
+        fields["duration"] = time.time() - start
+        emit("fail", operation, name, **fields)
+        raise
+    fields["duration"] = time.time() - start
+    if fields.get("error") is not None:
+        emit("fail", operation, name, **fields)
+    else:
+        emit("finish", operation, name, **fields)
+
+def _get_exit_code(exception):
+    if isinstance(exception, SystemExit):
+        return exception.code
+    return getattr(exception, "returncode", None)
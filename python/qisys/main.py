@@ -6,6 +6,7 @@ import os
 
 import argparse
 
+import qisys.daemon
 import qisys.script
 
 def print_version(script_name):
@@ -19,12 +20,16 @@ def main():
         script_name = script_name.replace("-script", "")
         script_name = script_name.replace(".py", "")
     script_name = os.path.basename(script_name)
-    parser = argparse.ArgumentParser()
-    package_name = ("%s.actions" % script_name)
-    modules = qisys.script.action_modules_from_package(package_name)
-
     if len(sys.argv) == 2 and sys.argv[1] == '--version':
         print_version(script_name)
         sys.exit(0)
 
+    # Use the worktree daemon when it is running
+    exit_code = qisys.daemon.run_client(script_name, sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+    parser = argparse.ArgumentParser()
+    package_name = ("%s.actions" % script_name)
+    modules = qisys.script.action_modules_from_package(package_name)
     qisys.script.root_command_main(script_name, parser, modules)
@@ -0,0 +1,51 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Helpers to run a function over several items concurrently
+
+"""
+
+import multiprocessing
+import multiprocessing.pool
+
+# Waiting on a pool result without a timeout cannot be
+# interrupted by ctrl-c with python2, so use a (very) large one
+_WAIT_TIMEOUT = 60 * 60 * 24 * 365
+
+
+def get_num_jobs(num_jobs=None):
+    """ Return the number of jobs to use: ``num_jobs`` if set,
+    else the number of CPUs on the machine
+
+    """
+    if num_jobs:
+        return num_jobs
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def parallel_map(func, items, num_jobs=None, chunksize=None):
+    """ Call ``func`` on every item, using a pool of
+    ``num_jobs`` threads.
+
+    Return the list of results, in the same order as ``items``.
+    If one of the calls raises, the exception is re-raised here.
+
+    When there is only one job or only one item, everything
+    runs in the calling thread.
+
+    """
+    items = list(items)
+    num_jobs = min(get_num_jobs(num_jobs), len(items))
+    if num_jobs <= 1:
+        return [func(item) for item in items]
+    pool = multiprocessing.pool.ThreadPool(num_jobs)
+    try:
+        async_res = pool.map_async(func, items, chunksize=chunksize)
+        return async_res.get(_WAIT_TIMEOUT)
+    finally:
+        pool.terminate()
+        pool.join()
@@ -24,9 +24,18 @@ def log_parser(parser):
         help="Colorize output, defaults to 'auto'")
     group.add_argument("--title", choices=["always", "never", "auto"],
         help="Update terminal title, defaults to 'auto'")
+    group.add_argument("--log-format", dest="log_format",
+        choices=["text", "json"],
+        help="Output format of the messages: 'json' writes one JSON object "
+             "per line, without colors. Defaults to 'text'")
+    group.add_argument("--buffered-output", dest="buffered_output",
+        action="store_true",
+        help="Write messages from a background thread, and refresh "
+             "progress lines at most 10 times per second")
 
     parser.set_defaults(verbose=False, quiet=False, color="auto")
     parser.set_defaults(verbose=False, quiet=False, title="auto")
+    parser.set_defaults(log_format="text", buffered_output=False)
 
 def default_parser(parser):
     """Parser settings for every action."""
@@ -38,6 +47,9 @@ def default_parser(parser):
     group.add_argument("--pdb", action="store_true", help="Use pdb on error")
     group.add_argument("--quiet-commands", action="store_true", dest="quiet_commands",
         help="Do not print command outputs")
+    group.add_argument("--events-file", dest="events_file", metavar="PATH",
+        help="Append a JSON object describing each step (start, finish "
+             "or failure) to this file, one per line")
 
 def worktree_parser(parser):
     """Parser settings for every action using a work tree."""
@@ -45,6 +57,28 @@ def worktree_parser(parser):
     parser.add_argument("-w", "--worktree", "--work-tree", dest="worktree",
         help="Use a specific work tree path.")
 
+def guess_worktree_root(argv):
+    """ The root of the worktree an action will use, from the raw
+    command line arguments, or None if not in a worktree
+
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-w", "--worktree", "--work-tree", dest="worktree")
+    try:
+        (args, _) = parser.parse_known_args(argv)
+    except SystemExit:
+        return None
+    return get_worktree_root(args)
+
+def get_worktree_root(args=None, raises=False):
+    """ The root of the worktree :py:func:`get_worktree` uses """
+    wt_root = None
+    if args:
+        wt_root = args.worktree
+    if not wt_root:
+        wt_root = qisys.worktree.guess_worktree(raises=raises)
+    return wt_root
+
 def project_parser(parser, positional=True):
     """Parser settings for every action using projects."""
     group = parser.add_argument_group("projects specifications options")
@@ -72,11 +106,10 @@ def get_worktree(args=None):
     the current working directory
 
     """
-    wt_root = None
-    if args:
-        wt_root = args.worktree
-    if not wt_root:
-        wt_root = qisys.worktree.guess_worktree(raises=True)
+    wt_root = get_worktree_root(args, raises=True)
+    worktree = qisys.worktree.get_preloaded(qisys.worktree.WorkTree, wt_root)
+    if worktree:
+        return worktree
     return qisys.worktree.WorkTree(wt_root)
 
 def get_projects(worktree, args):
@@ -6,13 +6,40 @@
 """ This is just a set of convenience functions to be used with
 `The ElemtTree XML API <http://docs.python.org/library/xml.etree.elementtree.html>`_
 
+Files are parsed with lxml when it is installed, or with cElementTree,
+but :py:func:`read` always returns plain ``xml.etree.ElementTree``
+objects, so that the elements it returns can be mixed with the ones
+created with :py:data:`etree`
+
 """
 
+import os
 import re
+import tempfile
+from StringIO import StringIO
+
 from qisys import ui
 
 from xml.etree import ElementTree as etree
 
+try:
+    from lxml import etree as _fast_etree
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+    try:
+        from xml.etree import cElementTree as _fast_etree
+    except ImportError:
+        _fast_etree = etree
+
+# Size of the chunks given to the parser
+_CHUNK_SIZE = 64 * 1024
+
+# Read the umask once: it can only be read by changing it,
+# which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 def indent(elem, level=0):
     """ Poor man's pretty print for elementTree
 
@@ -110,18 +137,157 @@ def parse_required_attr(tree, name, xml_path=None):
 
 
 
+def _fix_text(text):
+    """ Like xml.etree, return ASCII text as str, and unicode otherwise """
+    if isinstance(text, unicode):
+        try:
+            return text.encode("ascii")
+        except UnicodeError:
+            pass
+    return text
+
+
+class _TreeBuilder(etree.TreeBuilder):
+    """ A TreeBuilder building the same elements with lxml as with
+    xml.etree: lxml gives the attributes in an immutable mapping,
+    and all the text as unicode
+
+    """
+    def start(self, tag, attrs, *args):
+        attrs = dict((_fix_text(k), _fix_text(v)) for (k, v) in attrs.items())
+        return etree.TreeBuilder.start(self, _fix_text(tag), attrs)
+
+    def end(self, tag):
+        return etree.TreeBuilder.end(self, _fix_text(tag))
+
+    def data(self, data):
+        etree.TreeBuilder.data(self, _fix_text(data))
+
+
+def _get_parser(target=None):
+    """ A parser as fast as possible, building ``xml.etree.ElementTree``
+    elements
+
+    """
+    if target is None:
+        target = _TreeBuilder()
+    if HAS_LXML:
+        return _fast_etree.XMLParser(target=target, remove_comments=True,
+                                     remove_pis=True)
+    return _fast_etree.XMLParser(target=target)
+
+def _parse(source):
+    parser = _get_parser()
+    if isinstance(source, basestring):
+        with open(source, "rb") as fp:
+            _feed(parser, fp)
+    else:
+        _feed(parser, source)
+    return etree.ElementTree(element=parser.close())
+
+def _feed(parser, fp):
+    while True:
+        chunk = fp.read(_CHUNK_SIZE)
+        if not chunk:
+            return
+        parser.feed(chunk)
+
 def read(xml_path):
     """ Return a etree object from an xml path
 
     """
-    tree = etree.ElementTree()
     try:
-        tree.parse(xml_path)
+        tree = _parse(xml_path)
     except Exception, e:
         raise_parse_error(str(e), xml_path=xml_path)
     return tree
 
 
+def iterparse(xml_path, tag=None, with_root=False):
+    """ Iterate over the children of the root of a xml file,
+    (optionally only those with the given tag),
+    while the file is being parsed.
+
+    Each child is yielded once it is complete, then discarded, so
+    that large files (manifests with thousands of repos, for instance)
+    are read in bounded memory. The elements must only be read, and
+    not kept. Use :py:func:`read` otherwise.
+
+    If with_root is True, a copy of the root element, with its
+    attributes but without children, is yielded first.
+
+    As with :py:func:`read`, the elements are ``xml.etree.ElementTree``
+    elements, whether lxml is installed or not.
+
+    """
+    collector = _ChildrenCollector(tag=tag)
+    parser = _get_parser(target=collector)
+    root_done = not with_root
+    with open(xml_path, "rb") as fp:
+        try:
+            while True:
+                chunk = fp.read(_CHUNK_SIZE)
+                if chunk:
+                    parser.feed(chunk)
+                else:
+                    parser.close()
+                if not root_done and collector.root is not None:
+                    root = collector.root
+                    yield etree.Element(root.tag, dict(root.attrib))
+                    root_done = True
+                children = collector.children
+                collector.children = list()
+                for child in children:
+                    yield child
+                if not chunk:
+                    return
+        except SyntaxError, e:
+            raise_parse_error(str(e), xml_path=xml_path)
+
+
+class _ChildrenCollector(object):
+    """ Parser target for :py:func:`iterparse`: build
+    ``xml.etree.ElementTree`` elements, and detach the children of
+    the root from it as soon as they are complete
+
+    """
+    def __init__(self, tag=None):
+        self.tag = tag
+        self.root = None
+        self.children = list()
+        self._builder = _TreeBuilder()
+        self._depth = 0
+
+    def start(self, tag, attrib, *args):
+        elem = self._builder.start(tag, attrib)
+        if self.root is None:
+            self.root = elem
+        self._depth += 1
+        return elem
+
+    def end(self, tag):
+        elem = self._builder.end(tag)
+        self._depth -= 1
+        if self._depth == 1:
+            if self.tag is None or elem.tag == self.tag:
+                self.children.append(elem)
+            self.root.remove(elem)
+        return elem
+
+    def data(self, data):
+        self._builder.data(data)
+
+    def close(self):
+        return self._builder.close()
+
+
+def tostring(xml_obj, **kwargs):
+    """ Return the contents :py:func:`write` would write """
+    output = StringIO()
+    write(xml_obj, output, **kwargs)
+    return output.getvalue()
+
+
 def write(xml_obj, output, **kwargs):
     """ Write an xml object to the given path
 
@@ -130,6 +296,11 @@ def write(xml_obj, output, **kwargs):
 
     The result of the writing will always be nicely
     indented
+
+    When output is a path, the file is replaced atomically, and
+    left untouched if its contents would not change.
+    Return False in this case, True otherwise
+
     """
     tree = None
     root = None
@@ -140,7 +311,53 @@ def write(xml_obj, output, **kwargs):
         tree = etree.ElementTree(element=xml_obj)
         root = xml_obj
     indent(root)
-    tree.write(output, **kwargs)
+    if not isinstance(output, basestring):
+        tree.write(output, **kwargs)
+        return True
+    buf = StringIO()
+    tree.write(buf, **kwargs)
+    return write_if_changed(buf.getvalue(), output)
+
+
+def write_if_changed(contents, path):
+    """ Atomically replace the contents of path, unless
+    they are already equal to contents
+
+    Return True if the file was written
+
+    """
+    try:
+        with open(path, "rb") as fp:
+            if fp.read() == contents:
+                return False
+    except IOError:
+        pass
+    dirname = os.path.dirname(os.path.abspath(path))
+    (fd, tmp_path) = tempfile.mkstemp(dir=dirname, prefix=".qixml-")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(contents)
+        _copy_mode(path, tmp_path)
+        if os.name == "nt" and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+
+def _copy_mode(path, tmp_path):
+    """ mkstemp creates files only readable by their owner:
+    use the permissions of path or the default ones instead
+
+    """
+    try:
+        mode = os.stat(path).st_mode & 0777
+    except OSError:
+        mode = 0666 & ~_UMASK
+    os.chmod(tmp_path, mode)
 
 
 class XMLParser(object):
@@ -174,21 +391,43 @@ class XMLParser(object):
         self._parse_attributes()
         self.backtrace.append(root.tag)
         for child in root:
-            method_name = "_parse_{tagname}".format(tagname = child.tag)
-            try:
-                method = getattr(self.__class__, method_name)
-            except AttributeError as err:
-                self._parse_unknown_element(child, err)
-                continue
-            if method.func_code.co_argcount != 2:
-                mess = "Handler for tag `%s' must take" % child.tag
-                mess += " two arguments. (method: %s, takes " % method_name
-                mess += "%d argument(s))" % method.func_code.co_argcount
-                raise TypeError(mess)
-            method(self, child)
+            self._parse_child(child)
         self.backtrace.pop()
         self._parse_epilogue()
 
+    def parse_file(self, xml_path):
+        """ Same as ``parse(qisys.qixml.read(xml_path).getroot())``,
+        but the file is read using :py:func:`iterparse`, so the
+        children of the root are discarded once they are parsed.
+
+        """
+        children = iterparse(xml_path, with_root=True)
+        root = next(children, None)
+        if root is None:
+            raise_parse_error("No root element", xml_path=xml_path)
+        self._root = root
+        self._parse_prologue()
+        self._parse_attributes()
+        self.backtrace.append(root.tag)
+        for child in children:
+            self._parse_child(child)
+        self.backtrace.pop()
+        self._parse_epilogue()
+
+    def _parse_child(self, child):
+        method_name = "_parse_{tagname}".format(tagname = child.tag)
+        try:
+            method = getattr(self.__class__, method_name)
+        except AttributeError as err:
+            self._parse_unknown_element(child, err)
+            return
+        if method.func_code.co_argcount != 2:
+            mess = "Handler for tag `%s' must take" % child.tag
+            mess += " two arguments. (method: %s, takes " % method_name
+            mess += "%d argument(s))" % method.func_code.co_argcount
+            raise TypeError(mess)
+        method(self, child)
+
     def _parse_unknown_element(self, element, err):
         """ This function will by default ignore unknown elements. You can overload
         it to change its behavior.
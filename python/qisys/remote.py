@@ -15,6 +15,7 @@ import urllib2
 import StringIO
 
 from qisys import ui
+import qisys.events
 import qisys.sh
 
 import qibuild.config
@@ -36,8 +37,7 @@ def get_server_access(server_name):
     :return: A ``qibuild.config.Access`` instance
 
     """
-    qibuild_cfg = qibuild.config.QiBuildConfig()
-    qibuild_cfg.read()
+    qibuild_cfg = qibuild.config.get_global_config()
     access = qibuild_cfg.get_server_access(server_name)
     return access
 
@@ -148,56 +148,60 @@ def download(url, output_dir, output_name=None,
         mess += "Error was %s" % e
         raise Exception(mess)
 
-    url_split = urlparse.urlsplit(url)
-    url_obj = None
-    #pylint: disable-msg=E1103
-    server_name = url_split.netloc
-    try:
+    with qisys.events.record("download", url) as event:
+        url_split = urlparse.urlsplit(url)
+        url_obj = None
         #pylint: disable-msg=E1103
-        if url_split.scheme == "ftp":
-        # We cannot use urllib2 here because it has no support
-        # for username/password for ftp, so we will use ftplib
-        # here.
+        server_name = url_split.netloc
+        try:
             #pylint: disable-msg=E1103
-
-            (username, password, root) = get_ftp_access(server_name)
-            ftp = ftplib.FTP(server_name, username, password)
-            if root:
-                ftp.cwd(root)
-            class Tranfert:
-                pass
-            #pylint: disable-msg=E1103
-            size = ftp.size(url_split.path[1:])
-            Tranfert.xferd = 0
-            def retr_callback(data):
-                Tranfert.xferd += len(data)
-                if callback:
-                    callback(size, Tranfert.xferd)
-                dest_file.write(data)
-            #pylint: disable-msg=E1103
-            cmd = "RETR " + url_split.path[1:]
-            ftp.retrbinary(cmd, retr_callback)
-        else:
-            url_obj = authenticated_urlopen(url)
-            content_length = url_obj.headers.dict['content-length']
-            size = int(content_length)
-            buff_size = 100 * 1024
-            xferd = 0
-            while xferd < size:
-                data = url_obj.read(buff_size)
-                if not data:
-                    break
-                xferd += len(data)
-                if callback:
-                    callback(size, xferd)
-                dest_file.write(data)
-    except Exception, e:
-        error  = "Could not download file from %s\n to %s\n" % (url, dest_name)
-        error += "Error was: %s" % e
-    finally:
-        dest_file.close()
-        if url_obj:
-            url_obj.close()
+            if url_split.scheme == "ftp":
+            # We cannot use urllib2 here because it has no support
+            # for username/password for ftp, so we will use ftplib
+            # here.
+                #pylint: disable-msg=E1103
+
+                (username, password, root) = get_ftp_access(server_name)
+                ftp = ftplib.FTP(server_name, username, password)
+                if root:
+                    ftp.cwd(root)
+                class Tranfert:
+                    pass
+                #pylint: disable-msg=E1103
+                size = ftp.size(url_split.path[1:])
+                Tranfert.xferd = 0
+                def retr_callback(data):
+                    Tranfert.xferd += len(data)
+                    if callback:
+                        callback(size, Tranfert.xferd)
+                    dest_file.write(data)
+                #pylint: disable-msg=E1103
+                cmd = "RETR " + url_split.path[1:]
+                ftp.retrbinary(cmd, retr_callback)
+                event["bytes"] = Tranfert.xferd
+            else:
+                url_obj = authenticated_urlopen(url)
+                content_length = url_obj.headers.dict['content-length']
+                size = int(content_length)
+                buff_size = 100 * 1024
+                xferd = 0
+                while xferd < size:
+                    data = url_obj.read(buff_size)
+                    if not data:
+                        break
+                    xferd += len(data)
+                    if callback:
+                        callback(size, xferd)
+                    dest_file.write(data)
+                event["bytes"] = xferd
+        except Exception, e:
+            error  = "Could not download file from %s\n to %s\n" % (url, dest_name)
+            error += "Error was: %s" % e
+        finally:
+            dest_file.close()
+            if url_obj:
+                url_obj.close()
+        event["error"] = error
     if error:
         qisys.sh.rm(dest_name)
         raise Exception(error)
@@ -0,0 +1,148 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Fast directory scanning
+
+Uses scandir (``os.scandir`` on Python 3.5+, or the scandir module
+when it is installed): the type of each entry is known from listing the
+directory, so there is no need to call stat() on each file to know if
+it is a directory or a symlink, as ``os.walk`` and ``os.path.islink``
+do. Falls back on ``os.listdir`` and cached ``os.lstat`` calls
+otherwise.
+
+"""
+
+import fnmatch
+import os
+import re
+import stat
+
+try:
+    from os import scandir as _scandir
+    HAS_SCANDIR = True
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+        HAS_SCANDIR = True
+    except ImportError:
+        HAS_SCANDIR = False
+
+
+class _DirEntry(object):
+    """ Emulates the DirEntry objects returned by scandir """
+    __slots__ = ("name", "path", "_lstat", "_stat")
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self._lstat = None
+        self._stat = None
+
+    def stat(self, follow_symlinks=True):
+        if not follow_symlinks:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+        if self._stat is None:
+            if self.is_symlink():
+                self._stat = os.stat(self.path)
+            else:
+                self._stat = self.stat(follow_symlinks=False)
+        return self._stat
+
+    def is_symlink(self):
+        try:
+            return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+        except OSError:
+            return False
+
+    def is_dir(self, follow_symlinks=True):
+        try:
+            return stat.S_ISDIR(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def is_file(self, follow_symlinks=True):
+        try:
+            return stat.S_ISREG(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except OSError:
+            return False
+
+    def __repr__(self):
+        return "<DirEntry %s>" % self.name
+
+
+def scandir(path):
+    """ Return the entries of a directory, as a list of DirEntry objects """
+    if HAS_SCANDIR:
+        return list(_scandir(path))
+    return [_DirEntry(path, x) for x in os.listdir(path)]
+
+def _compile(patterns):
+    """ Return a function matching names against a list of glob patterns,
+    or None if there are no patterns
+
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, basestring):
+        patterns = [patterns]
+    regex = "|".join("(?:%s)" % fnmatch.translate(x) for x in patterns)
+    if os.name == "nt":
+        return re.compile(regex, re.IGNORECASE).match
+    return re.compile(regex).match
+
+def list_dir(path, patterns=None):
+    """ Return the entries of a directory whose names match one of the
+    glob patterns, or an empty list if the directory does not exist
+
+    """
+    try:
+        entries = scandir(path)
+    except OSError:
+        return list()
+    match = _compile(patterns)
+    if match:
+        entries = [x for x in entries if match(x.name)]
+    return entries
+
+def walk(top, prune=None, patterns=None):
+    """ Like ``os.walk(top)``, but yield (root, dirs, files) tuples
+    where dirs and files are lists of DirEntry objects.
+
+    As with ``os.walk``, symlinks to directories are listed in dirs,
+    but not walked into, and removing entries from dirs prevents
+    walking into them.
+
+    :param prune: glob patterns of directory names not to list
+                  nor walk into, such as ``[".git", "*.framework"]``
+    :param patterns: glob patterns of the names of the files to list
+
+    """
+    prune = _compile(prune)
+    match = _compile(patterns)
+    to_visit = [top]
+    while to_visit:
+        root = to_visit.pop()
+        try:
+            entries = scandir(root)
+        except OSError:
+            continue
+        dirs = list()
+        files = list()
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not prune or not prune(entry.name):
+                    dirs.append(entry)
+            elif not match or match(entry.name):
+                files.append(entry)
+        yield (root, dirs, files)
+        # Depth first, in the order of the directory, like os.walk
+        for entry in reversed(dirs):
+            if not entry.is_symlink():
+                to_visit.append(entry.path)
@@ -17,6 +17,7 @@ from qisys import ui
 
 
 import qisys.command
+import qisys.events
 
 class InvalidAction(Exception):
     """Just a custom exception """
@@ -130,7 +131,9 @@ def main_wrapper(module, args):
        - backtrace is not printed by default
        - backtrace is printed is --backtrace was given
        - a pdb session is run if --pdb was given
+       - events are written if --events-file was given
     """
+    qisys.events.configure(args)
     try:
         module.do(args)
     except Exception as e:
@@ -152,6 +155,8 @@ def main_wrapper(module, args):
             raise
         ui.error(e)
         sys.exit(2)
+    finally:
+        qisys.events.close_stream()
 
 def _dump_arguments(name, args):
     """ Dump an argparser namespace to log """
@@ -12,7 +12,10 @@ import sys
 import contextlib
 import time
 import errno
+import fnmatch
+import re
 import stat
+import hashlib
 import shutil
 import tempfile
 import subprocess
@@ -20,6 +23,11 @@ import ntpath
 import posixpath
 
 from qisys import ui
+import qisys.parallel
+import qisys.scan
+
+# From linux/fs.h, used by _reflink()
+_FICLONE = 0x40049409
 
 def get_config_path(*args):
     """ Get a config path to read or write some configuration.
@@ -145,13 +153,15 @@ def _copy_link(src, dest, quiet):
     if os.path.lexists(dest):
         rm(dest)
     if sys.stdout.isatty() and not quiet:
-        print "-- Installing %s -> %s" % (dest, target)
+        ui.info("-- Installing %s -> %s" % (dest, target))
     os.symlink(target, dest)
 
 
 def _handle_dirs(src, dest, root, directories, filter_fun, quiet):
     """ Helper function used by install()
 
+    directories is a list of DirEntry objects (see qisys.scan)
+
     """
     installed = list()
     rel_root = os.path.relpath(root, src)
@@ -160,69 +170,208 @@ def _handle_dirs(src, dest, root, directories, filter_fun, quiet):
         rel_root = ""
     new_root = os.path.join(dest, rel_root)
 
-    for directory in directories:
-        to_filter = os.path.join(rel_root, directory)
+    for entry in directories:
+        to_filter = os.path.join(rel_root, entry.name)
         if not filter_fun(to_filter):
             continue
-        dsrc = os.path.join(root, directory)
-        ddest = os.path.join(new_root, directory)
+        dsrc = entry.path
+        ddest = os.path.join(new_root, entry.name)
 
-        if os.path.islink(dsrc):
+        if entry.is_symlink():
+            mkdir(new_root, recursive=True)
             _copy_link(dsrc, ddest, quiet)
-            installed.append(directory)
+            installed.append(to_filter)
         else:
             if os.path.lexists(ddest) and not os.path.isdir(ddest):
                 raise Exception("Expecting a directory but found a file: %s" % ddest)
             mkdir(ddest, recursive=True)
-        return installed
+    return installed
 
 
 def _handle_files(src, dest, root, files, filter_fun, quiet):
     """ Helper function used by install()
 
+    files is a list of DirEntry objects (see qisys.scan).
+    Symlinks are copied right away, the other files are returned
+    as a list of (src, dest) to be copied by a _FileInstaller
+
     """
     installed = list()
+    to_copy = list()
     rel_root = os.path.relpath(root, src)
     if rel_root == ".":
         rel_root = ""
     new_root = os.path.join(dest, rel_root)
 
-    for f in files:
-        if not filter_fun(os.path.join(rel_root, f)):
+    created = False
+    for entry in files:
+        rel_path = os.path.join(rel_root, entry.name)
+        if not filter_fun(rel_path):
             continue
-        fsrc = os.path.join(root, f)
-        fdest = os.path.join(new_root, f)
-        if os.path.islink(fsrc):
+        fsrc = entry.path
+        fdest = os.path.join(new_root, entry.name)
+        if not created:
             mkdir(new_root, recursive=True)
+            created = True
+        if entry.is_symlink():
             _copy_link(fsrc, fdest, quiet)
-            rel_path = os.path.join(rel_root, f)
-            installed.append(rel_path)
         else:
-            if os.path.lexists(fdest) and os.path.isdir(fdest):
-                raise Exception("Expecting a file but found a directory: %s" % fdest)
-            if sys.stdout.isatty() and not quiet:
-                print "-- Installing %s" % fdest
-            mkdir(new_root, recursive=True)
+            to_copy.append((fsrc, fdest))
+        installed.append(rel_path)
+    return (installed, to_copy)
+
+
+def file_digest(path):
+    """ Return the sha1 of the contents of a file """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(64 * 1024), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _up_to_date_copy(src_stat, dest_stat, src, dest, checksum=False):
+    """ Whether dest is already an up-to-date copy of src.
+
+    By default, compare sizes and modification times, (like rsync does),
+    if checksum is True, compare sizes and contents
+
+    """
+    if stat.S_ISLNK(dest_stat.st_mode):
+        return False
+    if (src_stat.st_dev, src_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+        # hard link to the source
+        return True
+    if src_stat.st_size != dest_stat.st_size:
+        return False
+    if checksum:
+        return file_digest(src) == file_digest(dest)
+    return int(src_stat.st_mtime) == int(dest_stat.st_mtime)
+
+
+def _device(path):
+    """ Helper for install(): the device of path, or of its
+    first existing parent
+
+    """
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return os.stat(path).st_dev
+
+
+class _FileInstaller(object):
+    """ Helper for install(): copy files, preserving their permissions
+    and their modification times, unless the destination is already
+    an up-to-date copy
+
+    When source and destination are on the same filesystem, try to make
+    copy-on-write clones (Linux only), or hard links if ``hardlink``
+    is True
+
+    """
+    def __init__(self, same_fs, quiet=False, checksum=False, hardlink=False,
+                 keep_fun=None):
+        self.quiet = quiet
+        self.checksum = checksum
+        self.keep_fun = keep_fun
+        self.hardlink = hardlink and same_fs and hasattr(os, "link")
+        self.reflink = same_fs and sys.platform.startswith("linux")
+
+    def __call__(self, src_and_dest):
+        """ Install one file. Return True if it was copied """
+        (src, dest) = src_and_dest
+        src_stat = os.stat(src)
+        try:
+            dest_stat = os.lstat(dest)
+        except OSError:
+            dest_stat = None
+        if dest_stat is not None:
+            if stat.S_ISDIR(dest_stat.st_mode):
+                raise Exception("Expecting a file but found a directory: %s" % dest)
+            if _up_to_date_copy(src_stat, dest_stat, src, dest,
+                                checksum=self.checksum):
+                ui.debug("Up-to-date:", dest)
+                return False
+            if self.keep_fun and self.keep_fun(src, dest):
+                ui.debug("Keeping:", dest)
+                return False
             # We do not want to fail if dest exists but is read only
             # (following what `install` does, but not what `cp` does)
-            rm(fdest)
-            shutil.copy(fsrc, fdest)
-    return installed
+            try:
+                os.remove(dest)
+            except OSError, e:
+                # may have been removed by an other thread
+                if e.errno != errno.ENOENT:
+                    raise
+        if sys.stdout.isatty() and not self.quiet:
+            ui.info("-- Installing %s" % dest)
+        self.copy(src, dest)
+        return True
 
+    def copy(self, src, dest):
+        """ Copy src to dest, trying hard links and clones first """
+        if self.hardlink:
+            try:
+                os.link(src, dest)
+                return
+            except OSError:
+                self.hardlink = False
+        if self.reflink:
+            if self._reflink(src, dest):
+                return
+            # not supported by the filesystem, do not try again
+            self.reflink = False
+        shutil.copy2(src, dest)
 
-def install(src, dest, filter_fun=None, quiet=False):
+    @staticmethod
+    def _reflink(src, dest):
+        """ Make dest a copy-on-write clone of src.
+        Return False if this is not supported
+
+        """
+        import fcntl
+        try:
+            with open(src, "rb") as src_fp:
+                with open(dest, "wb") as dest_fp:
+                    fcntl.ioctl(dest_fp.fileno(), _FICLONE, src_fp.fileno())
+        except (IOError, OSError):
+            return False
+        shutil.copystat(src, dest)
+        return True
+
+
+def install(src, dest, filter_fun=None, quiet=False,
+            checksum=False, hardlink=False, num_jobs=None, keep_fun=None):
     """Install a directory to a destination.
 
     If filter_fun is not None, then the file will only be
     installed if filter_fun(relative/path/to/file) returns
     True.
 
+    If keep_fun is not None, a file already present in dest but
+    differing from its source is left untouched if
+    keep_fun(src/path/to/file, dest/path/to/file) returns True,
+    (for instance because it was modified in place on purpose).
+
     Few notes: rewriting ``cp`` or ``install`` is a hard problem.
     This version will happily erase whatever is inside dest,
     (even it the dest is readonly, dest will be erased before being
     written) and it won't complain if dest does not exists (missing
     directories will simply be created)
 
+    Files that are already present in dest with the same size and
+    modification time are not copied again. Use ``checksum=True``
+    to compare the contents instead of the modification times.
+
+    Files are copied using ``num_jobs`` threads (defaults to the
+    number of CPUs). When possible, copy-on-write clones are made
+    instead of real copies. Use ``hardlink=True`` to create hard
+    links instead, but note that modifying the installed file will
+    then modify the source too.
+
     This function will preserve relative symlinks between directories,
     used for instance in Mac frameworks::
 
@@ -231,7 +380,8 @@ def install(src, dest, filter_fun=None, quiet=False):
             |__ 4        -> 4.0
             |__ 4.0
 
-    Return the list of files installed (with relative paths)
+    Return the list of files installed (with relative paths),
+    including the ones that were already up-to-date
     """
     installed = list()
     # FIXME: add a `safe mode` ala install?
@@ -249,13 +399,23 @@ def install(src, dest, filter_fun=None, quiet=False):
         def filter_fun(_unused):
             return True
 
+    same_fs = _device(src) == _device(dest)
+    install_file = _FileInstaller(same_fs, quiet=quiet,
+                                  checksum=checksum, hardlink=hardlink,
+                                  keep_fun=keep_fun)
+
     if os.path.isdir(src):
         if src == dest:
             raise Exception("source and destination are the same directory")
-        for (root, dirs, files) in os.walk(src):
-            dirs = _handle_dirs (src, dest, root, dirs,  filter_fun, quiet)
-            files = _handle_files(src, dest, root, files, filter_fun, quiet)
+        to_copy = list()
+        for (root, dirs, files) in qisys.scan.walk(src):
+            links = _handle_dirs(src, dest, root, dirs, filter_fun, quiet)
+            installed.extend(links)
+            (files, copies) = _handle_files(src, dest, root, files,
+                                            filter_fun, quiet)
             installed.extend(files)
+            to_copy.extend(copies)
+        qisys.parallel.parallel_map(install_file, to_copy, num_jobs=num_jobs)
     else:
         # Emulate posix `install' behavior:
         # if dest is a dir, install in the directory, else
@@ -265,12 +425,7 @@ def install(src, dest, filter_fun=None, quiet=False):
         if src == dest:
             raise Exception("source and destination are the same file")
         mkdir(os.path.dirname(dest), recursive=True)
-        if sys.stdout.isatty() and not quiet:
-            print "-- Installing %s" % dest
-        # We do not want to fail if dest exists but is read only
-        # (following what `install` does, but not what `cp` does)
-        rm(dest)
-        shutil.copy(src, dest)
+        install_file((src, dest))
         installed.append(dest)
     return installed
 
@@ -446,18 +601,18 @@ def ls_r(directory):
 
     """
     res = list()
-    for root, dirs, files in os.walk(directory):
+    for root, dirs, files in qisys.scan.walk(directory):
         new_root = os.path.relpath(root, directory)
         if new_root == "." and not files:
             continue
         if new_root == "." and files:
-            res.extend(files)
+            res.extend(x.name for x in files)
             continue
         if not files and not dirs:
             res.append(new_root + os.path.sep)
             continue
-        for f in files:
-            res.append(os.path.join(new_root, f))
+        for entry in files:
+            res.append(os.path.join(new_root, entry.name))
     res.sort()
     return res
 
@@ -587,66 +742,144 @@ def change_cwd(directory):
     os.chdir(previous_cwd)
 
 
-def is_runtime(filename):
-    """ Filter function to only install runtime components of packages
+class RuntimeFilter(object):
+    """ Filter function to only install runtime components of packages.
 
-    """
-    # FIXME: this looks like a hack.
-    # Maybe a user-generated MANIFEST at the root of the package path
-    # would be better?
+    The rules for a platform (defaults to ``sys.platform``) are compiled
+    once into a regular expression. The first rule matching the
+    (relative) path of a file tells whether it is needed at runtime,
+    files matching no rule are.
+
+    ``patterns`` are glob patterns, matched before the default rules,
+    usually read from the :py:data:`RUNTIME_MANIFEST` of a package.
+    Patterns starting with ``!`` match files not needed at runtime
 
-    basename = os.path.basename(filename)
-    basedir = filename.split(os.path.sep)[0]
-    if filename.startswith("bin"):
-        if sys.platform.startswith("win"):
-            if filename.endswith(".exe"):
-                return True
-            if filename.endswith(".dll"):
-                return True
+    """
+    def __init__(self, platform=None, patterns=None):
+        if platform is None:
+            platform = sys.platform
+        self.platform = platform
+        self.patterns = tuple(patterns or ())
+        rules = list()
+        for pattern in self.patterns:
+            if pattern.startswith("!"):
+                rules.append((self._translate(pattern[1:]), False))
             else:
-                return False
-        else:
-            return True
-    if filename.startswith("lib"):
-        # exception for python:
-        if "python" in filename:
-            if filename.endswith(("Makefile", "pyconfig.h")):
-                return True
-        # shared libraries
+                rules.append((self._translate(pattern), True))
+        rules.extend(self._default_rules(platform))
+        regex = "|".join("(?P<r%i>%s)" % (i, rule)
+                         for (i, (rule, _)) in enumerate(rules))
+        self._match = re.compile(regex, re.DOTALL).match
+        self._results = dict(("r%i" % i, result)
+                             for (i, (_, result)) in enumerate(rules))
+
+    @staticmethod
+    def _translate(pattern):
+        pattern = pattern.replace(posixpath.sep, os.path.sep)
+        return fnmatch.translate(pattern)
+
+    @staticmethod
+    def _default_rules(platform):
+        """ (regex, is_runtime) for each rule, in order """
+        sep = re.escape(os.path.sep)
+        # The name of the file, not containing any separator
+        name = "[^%s]*" % sep
+        on_windows = platform.startswith("win")
         shared_lib_ext = ""
-        if sys.platform.startswith("win"):
+        if on_windows:
             shared_lib_ext = ".dll"
-        if sys.platform.startswith("linux"):
+        if platform.startswith("linux"):
             shared_lib_ext = ".so"
-        if sys.platform == "darwin":
+        if platform == "darwin":
             shared_lib_ext = ".dylib"
-        if shared_lib_ext in basename:
-            return True
-        # python
-        if basename.endswith(".py"):
-            return True
-        if basename.endswith(".pyd"):
-            return True
+        rules = list()
+        if on_windows:
+            rules.append((r"bin.*\.(?:exe|dll)$", True))
+            rules.append(("bin", False))
         else:
-            return False
-    if filename.startswith(os.path.join("share", "cmake")):
-        return False
-    if filename.startswith(os.path.join("share", "man")):
-        return False
-    if basedir == "share":
-        return True
-    if basedir == "include":
+            rules.append(("bin", True))
         # exception for python:
-        if filename.endswith("pyconfig.h"):
-            return True
-        else:
-            return False
-    if basedir.endswith(".framework"):
+        rules.append((r"lib.*python.*(?:Makefile|pyconfig\.h)$", True))
+        # shared libraries, in the name of the file
+        rules.append(("(?=lib)(?:.*%s)?%s%s%s$" % (sep, name,
+                                                re.escape(shared_lib_ext),
+                                                name), True))
+        # python
+        rules.append((r"lib.*\.pyd?$", True))
+        rules.append(("lib", False))
+        rules.append(("share%scmake" % sep, False))
+        rules.append(("share%sman" % sep, False))
+        rules.append(("share(?:%s|$)" % sep, True))
+        # exception for python:
+        rules.append((r"include%s.*pyconfig\.h$" % sep, True))
+        rules.append(("include(?:%s|$)" % sep, False))
+        rules.append((RUNTIME_MANIFEST + "$", False))
+        return rules
+
+    def __call__(self, filename):
+        match = self._match(filename)
+        if match:
+            return self._results[match.lastgroup]
+        # True by default: better have too much stuff than
+        # not enough
         return True
 
-    # True by default: better have too much stuff than
-    # not enough
-    return True
+    def select(self, filenames):
+        """ Return the files needed at runtime among filenames """
+        match = self._match
+        results = self._results
+        res = list()
+        for filename in filenames:
+            matched = match(filename)
+            if not matched or results[matched.lastgroup]:
+                res.append(filename)
+        return res
+
+
+#: A file, at the root of a package, listing glob patterns of the files
+#: needed at runtime (see :py:class:`RuntimeFilter`), one per line.
+#: Empty lines and lines starting with # are ignored
+RUNTIME_MANIFEST = "runtime.manifest"
+
+# (platform, patterns) -> RuntimeFilter
+_RUNTIME_FILTERS = dict()
+
+def read_runtime_manifest(package_path):
+    """ Return the patterns listed in the runtime manifest of
+    a package, or an empty list
+
+    """
+    manifest = os.path.join(package_path, RUNTIME_MANIFEST)
+    try:
+        with open(manifest, "r") as fp:
+            lines = [x.strip() for x in fp]
+    except IOError:
+        return list()
+    return [x for x in lines if x and not x.startswith("#")]
+
+def get_runtime_filter(package_path=None, platform=None):
+    """ Return the :py:class:`RuntimeFilter` for the platform, using
+    the runtime manifest of the package in package_path, if any.
+    Filters are only compiled once
+
+    """
+    if platform is None:
+        platform = sys.platform
+    patterns = tuple()
+    if package_path:
+        patterns = tuple(read_runtime_manifest(package_path))
+    key = (platform, patterns)
+    res = _RUNTIME_FILTERS.get(key)
+    if res is None:
+        res = RuntimeFilter(platform=platform, patterns=patterns)
+        _RUNTIME_FILTERS[key] = res
+    return res
+
+def is_runtime(filename):
+    """ Filter function to only install runtime components of packages
+
+    """
+    return get_runtime_filter()(filename)
 
 
 def broken_symlink(file_path):
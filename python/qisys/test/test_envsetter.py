@@ -11,6 +11,8 @@ import os
 import sys
 import unittest
 
+import mock
+
 import qisys.sh
 import qisys.envsetter
 
@@ -99,6 +101,44 @@ class EnvSetterTestCase(unittest.TestCase):
         build_env["spam"] = "eggs"
         self.assertTrue(envsetter.get_build_env().get("spam") is None)
 
+    def test_overlay(self):
+        env = qisys.envsetter.FrozenEnv(os.environ)
+        self.assertRaises(TypeError, env.__setitem__, "spam", "eggs")
+        self.assertRaises(TypeError, env.update, {"spam" : "eggs"})
+        # No change, no copy:
+        self.assertTrue(qisys.envsetter.overlay(env, dict()) is env)
+        self.assertTrue(qisys.envsetter.overlay(env,
+                        {"PATH" : env["PATH"]}) is env)
+        new_env = qisys.envsetter.overlay(env, {"spam" : "eggs"})
+        self.assertEquals(new_env["spam"], "eggs")
+        self.assertFalse("spam" in env)
+        new_env["spam"] = "bacon"
+
+    def test_source_bat_is_cached(self):
+        with qisys.sh.TempDir() as tmp:
+            sourceme = os.path.join(tmp, "sourceme.bat")
+            with open(sourceme, "w") as fp:
+                fp.write("set PATH=%PATH%;c:\\absurd\n")
+            cache_dir = os.path.join(tmp, "cache")
+            get_cache_path = lambda *args: os.path.join(cache_dir, *args)
+            run_bat = mock.Mock(return_value={"PATH" : self.absurd})
+            with mock.patch("qisys.sh.get_cache_path", get_cache_path):
+                with mock.patch.object(qisys.envsetter.EnvSetter,
+                                       "_run_bat", run_bat):
+                    qisys.sh.mkdir(os.path.join(cache_dir, "qi", "bat"),
+                                   recursive=True)
+                    for i in range(2):
+                        envsetter = qisys.envsetter.EnvSetter()
+                        envsetter.source_bat(sourceme)
+                        self._check_is_in_path(self.absurd,
+                                               envsetter.get_build_env()["PATH"])
+                    self.assertEquals(run_bat.call_count, 1)
+                    # Changing the script runs it again
+                    with open(sourceme, "a") as fp:
+                        fp.write("set LIB=c:\\lib\n")
+                    qisys.envsetter.EnvSetter().source_bat(sourceme)
+                    self.assertEquals(run_bat.call_count, 2)
+
     if sys.platform.startswith("win"):
         def test_source_bat(self):
             vc_path  = r'c:\microsoft\vc\bin'
@@ -0,0 +1,61 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import json
+
+import pytest
+
+import qisys.events
+import qisys.remote
+
+def read_events(path):
+    with open(path, "r") as fp:
+        return [json.loads(line) for line in fp]
+
+def test_record(tmpdir):
+    events_file = tmpdir.join("events.json").strpath
+    qisys.events.open_stream(events_file)
+    try:
+        with qisys.events.record("build", "foo") as event:
+            event["bytes"] = 42
+        with qisys.events.record("sync", "bar") as event:
+            event["error"] = "could not fetch"
+        with pytest.raises(SystemExit):
+            with qisys.events.record("test", "baz"):
+                raise SystemExit(2)
+    finally:
+        qisys.events.close_stream()
+    events = read_events(events_file)
+    assert [(x["event"], x["operation"], x["name"]) for x in events] == [
+        ("start", "build", "foo"), ("finish", "build", "foo"),
+        ("start", "sync", "bar"), ("fail", "sync", "bar"),
+        ("start", "test", "baz"), ("fail", "test", "baz")]
+    assert events[1]["bytes"] == 42
+    assert events[1]["duration"] >= 0
+    assert events[3]["error"] == "could not fetch"
+    assert events[5]["exit_code"] == 2
+    assert "exit_code" not in events[1]
+
+def test_no_stream():
+    with qisys.events.record("build", "foo") as event:
+        event["bytes"] = 42
+    qisys.events.emit("start", "build", "foo")
+
+def test_download_events(tmpdir):
+    src = tmpdir.join("src.txt")
+    src.write("hello\n")
+    events_file = tmpdir.join("events.json").strpath
+    qisys.events.open_stream(events_file)
+    try:
+        qisys.remote.download("file://" + src.strpath,
+                              tmpdir.mkdir("dest").strpath)
+        with pytest.raises(Exception):
+            qisys.remote.download("file://" + tmpdir.join("nowhere").strpath,
+                                  tmpdir.join("dest").strpath)
+    finally:
+        qisys.events.close_stream()
+    events = read_events(events_file)
+    assert [x["event"] for x in events] == ["start", "finish", "start", "fail"]
+    assert events[1]["bytes"] == 6
+    assert "nowhere" in events[3]["error"]
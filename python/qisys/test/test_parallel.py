@@ -0,0 +1,24 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import pytest
+
+import qisys.parallel
+
+def test_parallel_map_keeps_order():
+    res = qisys.parallel.parallel_map(lambda x: x * 2, range(50), num_jobs=4)
+    assert res == [x * 2 for x in range(50)]
+
+def test_parallel_map_raises():
+    def check(x):
+        if x == 3:
+            raise Exception("Bad item: %i" % x)
+        return x
+    # pylint: disable-msg=E1101
+    with pytest.raises(Exception) as e:
+        qisys.parallel.parallel_map(check, range(10), num_jobs=4)
+    assert "Bad item: 3" in str(e.value)
+
+def test_parallel_map_no_items():
+    assert qisys.parallel.parallel_map(lambda x: x, list()) == list()
@@ -93,3 +93,14 @@ def test_auto_add_nested(worktree, args):
 """)
     worktree2 = qisys.worktree.WorkTree(tmpdir.strpath)
     assert len(worktree2.projects) == 3
+
+def test_guess_worktree_root(worktree, tmpdir):
+    bar = worktree.tmpdir.mkdir("foo").mkdir("bar")
+    with qisys.sh.change_cwd(bar.strpath):
+        assert qisys.parsers.guess_worktree_root(["list"]) == worktree.root
+    with qisys.sh.change_cwd(tmpdir.strpath):
+        assert qisys.parsers.guess_worktree_root(["list"]) is None
+        assert qisys.parsers.guess_worktree_root(
+            ["list", "-w", worktree.root]) == worktree.root
+        assert qisys.parsers.guess_worktree_root(
+            ["list", "--worktree=%s" % worktree.root]) == worktree.root
@@ -205,4 +205,92 @@ def test_sanitize_xml():
     invalid_xml = u'<failure message="\u001a\r\nflag\r\n" />'
     valid_xml = qisys.qixml.sanitize_xml(invalid_xml)
     assert "\r\nflag\r\n" in valid_xml
-    etree.fromstring(valid_xml)  # Doesn't raise
\ No newline at end of file
+    etree.fromstring(valid_xml)  # Doesn't raise
+
+
+def test_read_returns_etree_objects(tmpdir):
+    foo_xml = tmpdir.join("foo.xml")
+    foo_xml.write("<foo><!-- comment --><bar /></foo>")
+    root = qisys.qixml.read(foo_xml.strpath).getroot()
+    assert [x.tag for x in root] == ["bar"]
+    root.append(etree.Element("baz"))
+    assert [x.tag for x in root] == ["bar", "baz"]
+
+@pytest.fixture(params=[True, False], ids=["lxml", "etree"])
+def xml_backend(request, monkeypatch):
+    if request.param and not qisys.qixml.HAS_LXML:
+        pytest.skip("lxml is not available")
+    monkeypatch.setattr(qisys.qixml, "HAS_LXML", request.param)
+    if not request.param:
+        from xml.etree import cElementTree
+        monkeypatch.setattr(qisys.qixml, "_fast_etree", cElementTree)
+    return request.param
+
+def test_iterparse(tmpdir, xml_backend):
+    foo_xml = tmpdir.join("foo.xml")
+    foo_xml.write("""
+<foo version="1">
+  <bar name="a"><baz /></bar>
+  <spam />
+  <bar name="b" />
+</foo>
+""")
+    children = list(qisys.qixml.iterparse(foo_xml.strpath, with_root=True))
+    assert children[0].tag == "foo"
+    assert children[0].get("version") == "1"
+    assert [x.tag for x in children[1:]] == ["bar", "spam", "bar"]
+    names = [x.get("name") for x in
+             qisys.qixml.iterparse(foo_xml.strpath, tag="bar")]
+    assert names == ["a", "b"]
+    foo_xml.write("<foo><bar></foo>")
+    # pylint: disable-msg=E1101
+    with pytest.raises(Exception) as e:
+        list(qisys.qixml.iterparse(foo_xml.strpath))
+    assert "foo.xml" in str(e.value)
+
+def test_parse_file(tmpdir):
+    class Foo(object):
+        def __init__(self):
+            self.version = None
+            self.bars = list()
+
+    class FooParser(qisys.qixml.XMLParser):
+        def _parse_bar(self, elem):
+            self.target.bars.append(elem.get("name"))
+
+    foo_xml = tmpdir.join("foo.xml")
+    foo_xml.write('<foo version="2"><bar name="a" /><bar name="b" /></foo>')
+    foo = Foo()
+    FooParser(foo).parse_file(foo_xml.strpath)
+    assert foo.version == "2"
+    assert foo.bars == ["a", "b"]
+
+def test_write_if_changed(tmpdir):
+    foo_xml = tmpdir.join("foo.xml")
+    elem = etree.fromstring('<foo><bar /></foo>')
+    assert qisys.qixml.write(elem, foo_xml.strpath)
+    foo_xml.chmod(0640)
+    assert qisys.qixml.tostring(elem) == foo_xml.read()
+    assert not qisys.qixml.write(elem, foo_xml.strpath)
+    elem.append(etree.Element("baz"))
+    assert qisys.qixml.write(elem, foo_xml.strpath)
+    assert "baz" in foo_xml.read()
+    assert foo_xml.stat().mode & 0777 == 0640
+    assert tmpdir.listdir() == [foo_xml]
+
+def test_iterparse_returns_etree_objects(tmpdir, xml_backend):
+    foo_xml = tmpdir.join("foo.xml")
+    foo_xml.write("<foo><!-- comment --><bar><baz /></bar></foo>")
+    (root, bar) = list(qisys.qixml.iterparse(foo_xml.strpath, with_root=True))
+    for elem in (root, bar):
+        assert isinstance(elem, etree.Element)
+    assert [x.tag for x in bar] == ["baz"]
+    etree.SubElement(bar, "spam")
+    assert [x.tag for x in bar] == ["baz", "spam"]
+
+def test_read_same_objects_with_both_backends(tmpdir, xml_backend):
+    foo_xml = tmpdir.join("foo.xml")
+    foo_xml.write("<foo name=\"bar\">text</foo>")
+    root = qisys.qixml.read(foo_xml.strpath).getroot()
+    assert type(root.get("name")) is str
+    assert type(root.text) is str
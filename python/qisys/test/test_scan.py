@@ -0,0 +1,63 @@
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+import os
+
+import pytest
+
+import qisys.scan
+
+def create_tree(tmpdir):
+    tmpdir.ensure("lib", "libfoo.so")
+    tmpdir.ensure("lib", "libfoo.a")
+    tmpdir.ensure("lib", "Foo.framework", "Foo")
+    tmpdir.ensure("include", "foo", "foo.h")
+    tmpdir.ensure("share", "empty", dir=True)
+    tmpdir.join("lib", "libfoo.so.1").mksymlinkto("libfoo.so")
+    tmpdir.join("inc").mksymlinkto("include")
+    tmpdir.join("broken").mksymlinkto("nowhere")
+
+def to_names(walked, top):
+    res = list()
+    for (root, dirs, files) in walked:
+        rel_root = os.path.relpath(root, top)
+        res.append((rel_root, sorted(x.name for x in dirs),
+                    sorted(x.name for x in files)))
+    return sorted(res)
+
+@pytest.fixture(params=[True, False], ids=["scandir", "fallback"])
+def has_scandir(request, monkeypatch):
+    if request.param and not qisys.scan.HAS_SCANDIR:
+        pytest.skip("scandir is not available")
+    monkeypatch.setattr(qisys.scan, "HAS_SCANDIR", request.param)
+    return request.param
+
+def test_walk_like_os_walk(tmpdir, has_scandir):
+    create_tree(tmpdir)
+    top = tmpdir.strpath
+    expected = [(os.path.relpath(root, top), sorted(dirs), sorted(files))
+                for (root, dirs, files) in os.walk(top)]
+    assert to_names(qisys.scan.walk(top), top) == sorted(expected)
+
+def test_walk_prune_and_patterns(tmpdir, has_scandir):
+    create_tree(tmpdir)
+    top = tmpdir.strpath
+    walked = qisys.scan.walk(top, prune=["*.framework", "share"],
+                             patterns=["*.so*", "*.h"])
+    assert to_names(walked, top) == [
+        (".", ["inc", "include", "lib"], []),
+        ("include", ["foo"], []),
+        ("include/foo", [], ["foo.h"]),
+        ("lib", [], ["libfoo.so", "libfoo.so.1"]),
+    ]
+
+def test_entries(tmpdir, has_scandir):
+    create_tree(tmpdir)
+    entries = qisys.scan.list_dir(tmpdir.join("lib").strpath, patterns="*.so*")
+    entries = dict((x.name, x) for x in entries)
+    assert sorted(entries) == ["libfoo.so", "libfoo.so.1"]
+    assert entries["libfoo.so.1"].is_symlink()
+    assert entries["libfoo.so.1"].is_file()
+    assert not entries["libfoo.so"].is_symlink()
+    assert qisys.scan.list_dir(tmpdir.join("nowhere").strpath) == list()
@@ -77,3 +77,108 @@ def test_is_runtime():
     assert qisys.sh.is_runtime("include/python2.7/pyconfig.h") is True
     if sys.platform == "darwin":
         assert qisys.sh.is_runtime("lib/libfoo.dylib") is True
+
+def test_runtime_filter_platforms():
+    files = ["bin/foo", "bin/foo.exe", "lib/libfoo.so.1", "lib/foo.dll",
+             "lib/libfoo.dylib", "lib/foo.py", "share/foo/foo.txt",
+             "share/cmake/foo/foo-config.cmake", "include/foo.h"]
+    files = [x.replace("/", os.path.sep) for x in files]
+    def select(platform):
+        runtime_filter = qisys.sh.RuntimeFilter(platform=platform)
+        selected = runtime_filter.select(files)
+        assert selected == [x for x in files if runtime_filter(x)]
+        return [x.replace(os.path.sep, "/") for x in selected]
+    assert select("linux2") == ["bin/foo", "bin/foo.exe", "lib/libfoo.so.1",
+                                "lib/foo.py", "share/foo/foo.txt"]
+    assert select("win32") == ["bin/foo.exe", "lib/foo.dll",
+                               "lib/foo.py", "share/foo/foo.txt"]
+    assert select("darwin") == ["bin/foo", "bin/foo.exe", "lib/libfoo.dylib",
+                                "lib/foo.py", "share/foo/foo.txt"]
+
+def test_runtime_manifest(tmpdir):
+    src = tmpdir.mkdir("src")
+    src.ensure("lib/libfoo.so", file=True)
+    src.ensure("lib/libfoo.a", file=True)
+    src.ensure("lib/foo/plugin.conf", file=True)
+    src.ensure("share/foo/big.dat", file=True)
+    src.join(qisys.sh.RUNTIME_MANIFEST).write("""\
+# plugins configuration
+lib/foo/*.conf
+!share/foo/*.dat
+""")
+    runtime_filter = qisys.sh.get_runtime_filter(src.strpath, platform="linux2")
+    assert qisys.sh.get_runtime_filter(src.strpath,
+                                       platform="linux2") is runtime_filter
+    dest = tmpdir.join("dest")
+    installed = qisys.sh.install(src.strpath, dest.strpath,
+                                 filter_fun=runtime_filter)
+    assert sorted(installed) == [os.path.join("lib", "foo", "plugin.conf"),
+                                 os.path.join("lib", "libfoo.so")]
+
+def test_install_returns_installed_files(tmpdir):
+    src = tmpdir.mkdir("src")
+    src.ensure("bin/foo", file=True)
+    src.ensure("lib/libfoo.so", file=True)
+    src.join("lib/libfoo.so.1").mksymlinkto("libfoo.so")
+    dest = tmpdir.join("dest")
+    installed = qisys.sh.install(src.strpath, dest.strpath)
+    assert sorted(installed) == [os.path.join("bin", "foo"),
+                                 os.path.join("lib", "libfoo.so"),
+                                 os.path.join("lib", "libfoo.so.1")]
+    # Same list when nothing has to be copied:
+    assert sorted(qisys.sh.install(src.strpath, dest.strpath)) == sorted(installed)
+
+def test_install_skips_up_to_date_files(tmpdir):
+    src = tmpdir.mkdir("src")
+    a_file = src.join("a")
+    a_file.write("a\n")
+    src.join("b").write("b\n")
+    dest = tmpdir.join("dest")
+    qisys.sh.install(src.strpath, dest.strpath)
+    assert dest.join("a").read() == "a\n"
+    assert int(dest.join("a").mtime()) == int(a_file.mtime())
+    # Change the installed file behind our back, it should not be
+    # overwritten if the size and the mtime did not change:
+    dest.join("a").write("A\n")
+    dest.join("a").setmtime(a_file.mtime())
+    qisys.sh.install(src.strpath, dest.strpath)
+    assert dest.join("a").read() == "A\n"
+    # But should be when comparing contents:
+    qisys.sh.install(src.strpath, dest.strpath, checksum=True)
+    assert dest.join("a").read() == "a\n"
+    # Or when the source changes:
+    a_file.write("aa\n")
+    qisys.sh.install(src.strpath, dest.strpath)
+    assert dest.join("a").read() == "aa\n"
+
+@pytest.mark.skipif(not hasattr(os, "link"), reason="no hard links")
+def test_install_with_hard_links(tmpdir):
+    src = tmpdir.mkdir("src")
+    src.join("a").write("a\n")
+    dest = tmpdir.join("dest")
+    qisys.sh.install(src.strpath, dest.strpath, hardlink=True)
+    assert os.path.samefile(src.join("a").strpath, dest.join("a").strpath)
+
+def test_install_in_parallel(tmpdir):
+    src = tmpdir.mkdir("src")
+    for i in range(100):
+        src.ensure("dir%i" % (i % 7), "file%i" % i).write(str(i))
+    dest = tmpdir.join("dest")
+    qisys.sh.install(src.strpath, dest.strpath, num_jobs=4)
+    assert qisys.sh.ls_r(dest.strpath) == qisys.sh.ls_r(src.strpath)
+    assert dest.join("dir2", "file9").read() == "9"
+
+def test_install_keep_fun(tmpdir):
+    src = tmpdir.mkdir("src")
+    src.join("a").write("a\n")
+    src.join("b").write("b\n")
+    dest = tmpdir.join("dest")
+    qisys.sh.install(src.strpath, dest.strpath)
+    dest.join("a").write("modified\n")
+    dest.join("b").write("modified\n")
+    def keep_a(src_path, dest_path):
+        assert src_path == src.join(os.path.basename(dest_path)).strpath
+        return dest_path.endswith("a")
+    qisys.sh.install(src.strpath, dest.strpath, keep_fun=keep_a)
+    assert dest.join("a").read() == "modified\n"
+    assert dest.join("b").read() == "b\n"
@@ -4,6 +4,11 @@
 
 """ Just some tests for ui """
 
+import json
+from StringIO import StringIO
+
+import mock
+
 import qisys.ui as ui
 
 def main():
@@ -19,6 +24,43 @@ def main():
     ui.info(ui.darkred, "darkred is really dead")
     ui.info(ui.yellow, "this is yellow")
 
+def test_format_size():
+    assert ui.format_size(42) == "42 B"
+    assert ui.format_size(1536) == "1.5 KB"
+    assert ui.format_size(3 * 1024 ** 3) == "3.0 GB"
+
+def test_strip_colors():
+    assert ui.strip_colors([ui.red, "Error:", ui.reset, "no such file"]) == \
+        "Error: no such file"
+    assert ui.strip_colors(["foo", "\n", ui.bold, "bar"]) == "foo \nbar"
+
+def test_buffered_writer():
+    out = StringIO()
+    writer = ui.BufferedWriter(refresh_period=3600)
+    writer.write(out, "first\n")
+    writer.flush()
+    assert out.getvalue() == "first\n"
+    writer._last_progress = ui.time.time()
+    for i in range(10):
+        writer.write(out, "progress %i\r" % i, progress=True)
+    # Only the last progress line is kept
+    assert out.getvalue() == "first\n"
+    writer.write(out, "done\n")
+    writer.close()
+    assert out.getvalue() == "first\nprogress 9\rdone\n"
+
+def test_json_output():
+    out = StringIO()
+    with mock.patch.dict(ui.CONFIG, {"format" : "json", "record" : False}):
+        ui.info_count(0, 2, ui.blue, "foo", fp=out)
+        ui.info("bar", "baz", fp=out, end="\r")
+    (first, second) = [json.loads(x) for x in out.getvalue().splitlines()]
+    assert first["level"] == "info"
+    assert first["message"] == "* (1/2) foo"
+    assert first["count"] == [1, 2]
+    assert second["message"] == "bar baz"
+    assert second["progress"]
+
 if __name__ == "__main__":
     import sys
     if "-v" in  sys.argv:
@@ -168,3 +168,31 @@ def test_add_nested_projects(worktree):
 
     worktree.remove_project("spam")
     assert [p.src for p in worktree.projects] == ["foo"]
+
+def test_batch(worktree):
+    mock_observer = mock.Mock()
+    worktree.register(mock_observer)
+    worktree_xml = worktree.worktree_xml
+    with open(worktree_xml, "r") as fp:
+        before = fp.read()
+    with mock.patch.object(worktree, "load_projects",
+                           wraps=worktree.load_projects) as load_projects:
+        with worktree.batch():
+            with worktree.batch():
+                worktree.create_project("foo")
+            worktree.create_project("bar")
+            assert worktree.get_project("foo")
+            assert worktree.get_project("bar")
+            with open(worktree_xml, "r") as fp:
+                assert fp.read() == before
+            assert not mock_observer.on_projects_changed.called
+        assert load_projects.call_count == 1
+    assert [p.src for p in worktree.projects] == ["bar", "foo"]
+    with open(worktree_xml, "r") as fp:
+        contents = fp.read()
+    assert "foo" in contents
+    assert "bar" in contents
+    (changes,) = mock_observer.on_projects_changed.call_args[0]
+    assert [(x, y.src) for (x, y) in changes] == [("added", "foo"),
+                                                  ("added", "bar")]
+    assert not mock_observer.on_project_added.called
@@ -12,8 +12,12 @@
 
 import sys
 import os
+import atexit
 import datetime
 import functools
+import json
+import threading
+import time
 
 # Try using pyreadline so that we can
 # have colors on windows, too.
@@ -85,9 +89,23 @@ CONFIG = {
     "title": "auto",
     "timestamp": False,
     "interactive": True,
+    "format": "text",  # or "json", one JSON object per line
+    "buffered": False,  # write from a background thread
     "record": False  # used for testing
 }
 
+# Prefixes of the messages, by level
+_LEVEL_TOKENS = {
+    "error"   : [bold, red, "[ERROR]: "],
+    "warning" : [brown, "[WARN ]: "],
+    "info"    : [],
+    "debug"   : [blue, "[DEBUG]: "],
+}
+
+# Minimum time between two updates of a progress line when
+# output is buffered, in seconds
+REFRESH_PERIOD = 0.1
+
 
 # used for testing
 _MESSAGES = list()
@@ -101,6 +119,8 @@ def configure_logging(args):
     CONFIG["verbose"] = verbose
     CONFIG["quiet"] = args.quiet
     CONFIG["timestamp"] = args.timestamp
+    CONFIG["format"] = getattr(args, "log_format", "text")
+    CONFIG["buffered"] = getattr(args, "buffered_output", False)
 
 
 def config_title(fp):
@@ -138,9 +158,155 @@ def update_title(mystr, fp):
     if _enable_xterm_title:
         mystr = '\x1b]0;%s\x07' % mystr
 
-        fp.write(mystr)
+        _write(fp, mystr)
+
+
+class BufferedWriter(object):
+    """ Write messages from a background thread, so that
+    slow terminals or log collectors do not slow down the
+    code displaying them.
+
+    Progress lines (ending with a carriage return) are
+    coalesced: a progress line still waiting to be written is
+    replaced by the next one, and they are written at most once
+    per refresh_period. Other messages are never dropped, and
+    all the messages are written in order.
+
+    """
+    def __init__(self, refresh_period=REFRESH_PERIOD):
+        self.refresh_period = refresh_period
+        # list of [fp, text, progress]
+        self._pending = list()
+        self._busy = False
+        self._flushing = 0
+        self._closed = False
+        self._last_progress = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run,
+                                        name="qisys.ui writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, fp, text, progress=False):
+        with self._cond:
+            pending = self._pending
+            if progress and pending and pending[-1][2] and \
+                    pending[-1][0] is fp:
+                pending[-1][1] = text
+                return
+            pending.append([fp, text, progress])
+            self._cond.notify()
+
+    def flush(self):
+        """ Wait until every message has been written """
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            while self._pending or self._busy:
+                self._cond.wait()
+            self._flushing -= 1
+
+    def close(self):
+        """ Write the remaining messages and stop the thread """
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                if len(self._pending) == 1 and self._pending[0][2] and \
+                        not self._flushing:
+                    delay = self._last_progress + self.refresh_period - \
+                            time.time()
+                    if delay > 0:
+                        # Newer progress lines may replace this one
+                        self._cond.wait(delay)
+                        continue
+                to_write = self._pending
+                self._pending = list()
+                self._busy = True
+            try:
+                self._write(to_write)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, to_write):
+        # Group consecutive messages to the same file
+        fp = None
+        chunks = list()
+        for (msg_fp, text, progress) in to_write:
+            if msg_fp is not fp:
+                _write_chunks(fp, chunks)
+                fp = msg_fp
+                chunks = list()
+            chunks.append(text)
+            if progress:
+                self._last_progress = time.time()
+        _write_chunks(fp, chunks)
+
+
+def _write_chunks(fp, chunks):
+    if not chunks:
+        return
+    try:
+        fp.write("".join(chunks))
+        fp.flush()
+    except (IOError, ValueError):
+        # closed or broken file: nothing left to display to
+        pass
+
+
+_writer = None
+
+def _get_writer():
+    """ The BufferedWriter to use, or None if output is not
+    buffered
+
+    """
+    global _writer
+    if CONFIG["buffered"]:
+        if _writer is None:
+            _writer = BufferedWriter()
+        return _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+    return None
+
+def _write(fp, text, progress=False):
+    writer = _get_writer()
+    if writer:
+        writer.write(fp, text, progress=progress)
+    else:
+        fp.write(text)
         fp.flush()
 
+def flush():
+    """ Wait until every message has been written.
+    To be called before something else writes to the
+    terminal, such as a sub process
+
+    """
+    if _writer:
+        _writer.flush()
+
+def _close_writer():
+    global _writer
+    if _writer:
+        _writer.close()
+        _writer = None
+
+atexit.register(_close_writer)
+
 def _msg(*tokens, **kwargs):
     """ Helper method for error, warning, info, debug
 
@@ -150,6 +316,11 @@ def _msg(*tokens, **kwargs):
     fp = kwargs.get("fp", sys.stdout)
     sep = kwargs.get("sep", " ")
     end = kwargs.get("end", "\n")
+    level = kwargs.get("level", "info")
+    if CONFIG["format"] == "json":
+        _json_msg(tokens, fp, sep, end, level, kwargs.get("count"))
+        return
+    tokens = _LEVEL_TOKENS[level] + list(tokens)
     with_color = config_color(fp)
     res = list()  # Initialize result list, to be concatenated before printing
     nocolorres = list()  # result list without colors
@@ -174,27 +345,58 @@ def _msg(*tokens, **kwargs):
         res.append(reset.code)
     res.append(end)
     stringres = ''.join(res)
-    stringnc = ''.join(nocolorres)
     if CONFIG["record"]:
         _MESSAGES.append(stringres)
     if kwargs.get("update_title", False):
+        stringnc = ''.join(nocolorres)
         update_title(stringnc, fp)
     if _console and with_color:
+        flush()
         _console.write_color(stringres)
     else:
-        fp.write(stringres)
-        fp.flush()
+        _write(fp, stringres, progress=end.endswith("\r"))
+
+def strip_colors(tokens, sep=" "):
+    """ The text of a message for :py:func:`info`, :py:func:`error` ...
+    without the colors
+
+    >>> strip_colors([red, "Error:", reset, "no such file"])
+    'Error: no such file'
+
+    """
+    text = list()
+    for token in tokens:
+        if isinstance(token, _Color):
+            continue
+        if sep == " " and token == "\n":
+            text.append("\n")
+        else:
+            text.append(str(token))
+            text.append(sep)
+    return ''.join(text[:-1] if text and text[-1] == sep else text)
+
+def _json_msg(tokens, fp, sep, end, level, count):
+    """ Write a message as a JSON object on one line """
+    message = strip_colors(tokens, sep=sep)
+    res = {"level": level, "message": message, "time": time.time()}
+    if end.endswith("\r"):
+        res["progress"] = True
+    if count:
+        res["count"] = count
+    if CONFIG["record"]:
+        _MESSAGES.append(message + end)
+    _write(fp, json.dumps(res) + "\n")
 
 def error(*tokens, **kwargs):
     """ Print an error message """
-    tokens = [bold, red, "[ERROR]: "] + list(tokens)
     kwargs["fp"] = sys.stderr
+    kwargs["level"] = "error"
     _msg(*tokens, **kwargs)
 
 def warning(*tokens, **kwargs):
     """ Print a warning message """
-    tokens = [brown, "[WARN ]: "] + list(tokens)
     kwargs["fp"] = sys.stderr
+    kwargs["level"] = "warning"
     _msg(*tokens, **kwargs)
 
 def info(*tokens, **kwargs):
@@ -217,13 +419,14 @@ def info_count(i, n, *rest, **kwargs):
     num_digits = len(str(n)) # lame, I know
     counter_format = "(%{}d/%d)".format(num_digits)
     counter_str = counter_format % (i+1, n)
+    kwargs.setdefault("count", [i+1, n])
     info(green, "*", reset, counter_str, reset, *rest, **kwargs)
 
 def debug(*tokens, **kwargs):
     """ Print a debug message """
     if not CONFIG["verbose"] or CONFIG["record"]:
         return
-    tokens = [blue, "[DEBUG]: "] + list(tokens)
+    kwargs["level"] = "debug"
     _msg(*tokens, **kwargs)
 
 def indent_iterable(elems, num=2):
@@ -239,6 +442,22 @@ def tabs(num):
     """ Compute a blank tab """
     return "  " * num
 
+def format_size(num_bytes):
+    """ Format a number of bytes for humans
+
+    >>> format_size(1536)
+    '1.5 KB'
+
+    """
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    if unit == "B":
+        return "%i B" % num_bytes
+    return "%.1f %s" % (size, unit)
+
 class timer:
     """ To be used as a decorator,
     or as a with statement:
@@ -286,6 +505,8 @@ class timer:
         """ Stop the timer and emit a nice log """
         end_time = datetime.datetime.now()
         elapsed_time = end_time - self.start_time
+        self.stop_time = end_time
+        self.elapsed_time = elapsed_time
         elapsed_seconds = elapsed_time.seconds
         hours, remainder = divmod(int(elapsed_seconds), 3600)
         minutes, seconds = divmod(remainder, 60)
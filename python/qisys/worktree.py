@@ -7,6 +7,7 @@
 """
 
 import abc
+import contextlib
 import os
 import ntpath
 import posixpath
@@ -18,6 +19,8 @@ import qisys.command
 import qisys.sh
 import qisys.qixml
 
+# (class, root) -> object, see preload()
+_PRELOADED = dict()
 
 class WorkTree(object):
     """ This class represent a :term:`worktree`. """
@@ -36,6 +39,10 @@ This path does not exists
 """.format(root))
 
         self._observers = list()
+        # Set during a batch, see self.batch()
+        self._batch_depth = 0
+        self._scheduled = list()
+        self._changes = list()
         self.root = root
         self.cache = self.load_cache()
         # Re-parse every qiproject.xml to visit the subprojects
@@ -60,11 +67,79 @@ This path does not exists
                 fp.write("<worktree />\n")
         cache = WorkTreeCache(self.worktree_xml)
         # Remove non-existing sources
-        for src in cache.get_srcs():
-            if not os.path.exists(os.path.join(self.root, src)):
-                cache.remove_src(src)
+        to_remove = [x for x in cache.get_srcs()
+                     if not os.path.exists(os.path.join(self.root, x))]
+        for src in to_remove:
+            cache.remove_src(src, save=False)
+        if to_remove:
+            cache.save()
         return cache
 
+    @contextlib.contextmanager
+    def batch(self):
+        """ Group several changes to the worktree::
+
+            with worktree.batch():
+                for src in srcs:
+                    worktree.add_project(src)
+
+        Until the end of the outermost ``with`` block, the
+        calls registered with :py:meth:`schedule` (writing
+        ``.qi/worktree.xml`` for instance) are deferred, the
+        new projects are parsed one by one instead of reloading
+        the whole worktree, and the observers are not notified.
+        Then every scheduled call is made once, the projects are
+        reloaded once, and the observers are notified of all the changes
+        at once (see :py:meth:`WorkTreeObserver.on_projects_changed`)
+
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._commit()
+
+    @property
+    def in_batch(self):
+        return self._batch_depth > 0
+
+    def schedule(self, key, func):
+        """ Call func now, or at the end of the current batch.
+        During a batch, calls scheduled with the same key
+        are made only once
+
+        """
+        if not self.in_batch:
+            func()
+            return
+        for (scheduled_key, _) in self._scheduled:
+            if scheduled_key == key:
+                return
+        self._scheduled.append((key, func))
+
+    def _commit(self):
+        scheduled = self._scheduled
+        changes = self._changes
+        self._scheduled = list()
+        self._changes = list()
+        for (_, func) in scheduled:
+            func()
+        if not changes:
+            return
+        self.load_projects()
+        for observer in self._observers:
+            observer.on_projects_changed(changes)
+
+    def _notify(self, event, project):
+        if self.in_batch:
+            self._changes.append((event, project))
+            return
+        for observer in self._observers:
+            method = getattr(observer, "on_project_%s" % event)
+            method(project)
+
     def check(self):
         """ Perform a few sanity checks """
         # Check that we are not in an other worktree:
@@ -113,6 +188,15 @@ This path does not exists
             self._rec_parse_sub_projects(project, res)
         self.projects = sorted(res, key=operator.attrgetter("src"))
 
+    def _load_project(self, src):
+        """ Parse just one new project and its subprojects """
+        project = qisys.project.WorkTreeProject(self, src)
+        project.parse_qiproject_xml()
+        res = set([project])
+        self._rec_parse_sub_projects(project, res)
+        known = set(x.src for x in self.projects)
+        self.projects.extend(x for x in res if x.src not in known)
+
     def _rec_parse_sub_projects(self, project, res):
         """ Recursively parse every project and subproject,
         filling up the res list.
@@ -163,11 +247,14 @@ This path does not exists
             mess += "Path %s is already registered\n" % src
             mess += "Current worktree: %s" % self.root
             raise WorkTreeError(mess)
-        self.cache.add_src(src)
-        self.load_projects()
+        self.cache.add_src(src, save=False)
+        self.schedule("cache", self.cache.save)
+        if self.in_batch:
+            self._load_project(src)
+        else:
+            self.load_projects()
         project = self.get_project(src)
-        for observer in self._observers:
-            observer.on_project_added(project)
+        self._notify("added", project)
         return project
 
     def remove_project(self, path, from_disk=False):
@@ -184,10 +271,10 @@ This path does not exists
         project = self.get_project(src)
         if from_disk:
             qisys.sh.rm(project.path)
-        self.cache.remove_src(src)
+        self.cache.remove_src(src, save=False)
+        self.schedule("cache", self.cache.save)
         self.load_projects()
-        for observer in self._observers:
-            observer.on_project_removed(project)
+        self._notify("removed", project)
 
     def move_project(self, path, new_path):
         """ Move a project from a worktree """
@@ -199,12 +286,12 @@ This path does not exists
             mess  = "Could not move project\n"
             mess += "Path %s is already registered\n" % src
             mess += "Current worktree: %s" % self.root
-        self.cache.remove_src(src)
-        self.cache.add_src(new_src)
+        self.cache.remove_src(src, save=False)
+        self.cache.add_src(new_src, save=False)
+        self.schedule("cache", self.cache.save)
         self.load_projects()
         project = self.get_project(src)
-        for observer in self._observers:
-            observer.on_project_moved(project)
+        self._notify("moved", project)
 
 
     def normalize_path(self, path):
@@ -226,6 +313,26 @@ This path does not exists
         return res
 
 
+def preload(obj):
+    """ Keep a loaded WorkTree (or BuildWorkTree, GitWorkTree ...) in
+    memory, so that the parsers return it instead of reading the worktree
+    again. Used by the worktree daemon (see :py:mod:`qisys.daemon`)
+
+    """
+    _PRELOADED[(type(obj), os.path.realpath(obj.root))] = obj
+
+def get_preloaded(cls, root):
+    """ Return the object of class cls given to :py:func:`preload`
+    for the worktree in root, or None
+
+    """
+    if not _PRELOADED:
+        return None
+    return _PRELOADED.get((cls, os.path.realpath(root)))
+
+def clear_preloaded():
+    _PRELOADED.clear()
+
 def repr_list_projects(projects, name = "projects"):
     res = ""
     if len(projects):
@@ -280,6 +387,17 @@ class WorkTreeObserver():
         """
         pass
 
+    def on_projects_changed(self, changes):
+        """ Called at the end of a :py:meth:`WorkTree.batch`, with
+        a list of (event, project), where event is one of
+        "added", "removed", "moved".
+
+        By default, call the on_project_<event> method for each change
+        """
+        for (event, project) in changes:
+            method = getattr(self, "on_project_%s" % event)
+            method(project)
+
 class WorkTreeCache:
     """ Cache the paths to all the projects registered
     in a worktree
@@ -289,19 +407,25 @@ class WorkTreeCache:
         self.xml_path = xml_path
         self.xml_root = qisys.qixml.read(xml_path).getroot()
 
-    def add_src(self, src):
+    def add_src(self, src, save=True):
         """ Add a new source to the cache """
         project_elem = qisys.qixml.etree.Element("project")
         project_elem.set("src", src)
         self.xml_root.append(project_elem)
-        qisys.qixml.write(self.xml_root, self.xml_path)
+        if save:
+            self.save()
 
-    def remove_src(self, src):
+    def remove_src(self, src, save=True):
         """ Remove one source from the cache """
         projects_elem = self.xml_root.findall("project")
         for project_elem in projects_elem:
             if project_elem.get("src") == src:
                 self.xml_root.remove(project_elem)
+        if save:
+            self.save()
+
+    def save(self):
+        """ Write the cache to disk """
         qisys.qixml.write(self.xml_root, self.xml_path)
 
     def get_srcs(self):
@@ -2,6 +2,20 @@ import argparse
 import os
 import json
 
+from qisys import ui
+
+# Options written by qi_add_test in qitest.cmake:
+# option -> (key in the test dict, whether the option takes a value)
+QITEST_CMAKE_OPTIONS = {
+    "--name"              : ("name", True),
+    "--gtest"             : ("gtest", False),
+    "--timeout"           : ("timeout", True),
+    "--nightly"           : ("nightly", False),
+    "--perf"              : ("perf", False),
+    "--working-directory" : ("working_directory", True),
+    "--env"               : ("environment", True),
+}
+
 def add_test(output, **kwargs):
     if not "name" in kwargs:
         raise Exception("Should provide a test name")
@@ -32,11 +46,99 @@ def parse_tests(conf_path):
     with open(conf_path, "r") as fp:
         return json.load(fp)
 
+def parse_qitest_cmake_line(line):
+    """ Parse one line of a qitest.cmake file, looking like::
+
+        --name;foo;--timeout;20;--;/path/to/foo;--some-arg
+
+    Return a dict describing the test, or raise ValueError
+    with a description of the problem
+
+    """
+    test = {"cmd" : list(), "name" : None, "gtest" : False,
+            "timeout" : None, "nightly" : False, "perf" : False,
+            "working_directory" : None, "environment" : None}
+    tokens = line.split(";")
+    num_tokens = len(tokens)
+    i = 0
+    while i < num_tokens:
+        token = tokens[i]
+        i += 1
+        if token == "--":
+            test["cmd"].extend(tokens[i:])
+            break
+        if not token.startswith("--"):
+            test["cmd"].append(token)
+            continue
+        option = QITEST_CMAKE_OPTIONS.get(token)
+        if option is None:
+            raise ValueError("unknown option: %s" % token)
+        (key, takes_value) = option
+        if not takes_value:
+            test[key] = True
+            continue
+        if i == num_tokens:
+            raise ValueError("expected a value after %s" % token)
+        value = tokens[i]
+        i += 1
+        if key == "timeout":
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValueError("invalid timeout: %s" % value)
+        elif key == "environment":
+            (env_key, sep, env_value) = value.partition("=")
+            if not sep:
+                raise ValueError("expected <key>=<value> after --env, "
+                                 "got: %s" % value)
+            if test["environment"] is None:
+                test["environment"] = dict()
+            test["environment"][env_key] = env_value
+            continue
+        test[key] = value
+    if not test["name"]:
+        raise ValueError("missing --name")
+    if not test["cmd"]:
+        raise ValueError("missing test command")
+    return test
+
+def parse_qitest_cmake(qitest_cmake_path):
+    """ Parse the qitest.cmake file written by qi_add_test().
+    Returns a list of dictionaries, in the same format as
+    :py:func:`parse_tests`.
+
+    Lines that cannot be parsed are reported and skipped
+
+    """
+    tests = list()
+    with open(qitest_cmake_path, "r") as fp:
+        for (line_no, line) in enumerate(fp, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                tests.append(parse_qitest_cmake_line(line))
+            except ValueError as error:
+                ui.error("%s:%i: Could not parse test options: %s" % (
+                         qitest_cmake_path, line_no, error))
+    return tests
+
 def write_tests(tests, conf_path):
-    """ Write a list of tests to a config file
+    """ Write a list of tests to a config file.
+
+    The file is only written if its contents change, so that
+    its mtime can be relied on.
+
+    :returns: True if the file was written
     """
+    contents = json.dumps(tests)
+    if os.path.exists(conf_path):
+        with open(conf_path, "r") as fp:
+            if fp.read() == contents:
+                return False
     with open(conf_path, "w") as fp:
-        return json.dump(tests, fp, indent=2)
+        fp.write(contents)
+    return True
 
 def relocate_tests(project, tests):
     """ Make sure the tests can be relocated to the dest directory """
@@ -52,3 +52,28 @@ def test_relocate():
         "name" : "test_two",
         "cmd" : ["bin/test_two", "/some/other/path"],
         }]
+
+def test_parse_qitest_cmake(tmpdir, record_messages):
+    qitest_cmake = tmpdir.join("qitest.cmake")
+    qitest_cmake.write("""\
+--name;test_one;--gtest;--timeout;20;--env;FOO=bar=baz;--;/path/to/test_one;--verbose
+--name;bad_timeout;--timeout;twenty;--;/path/to/bad
+--name;test_two;--working-directory;/tmp;--perf;--;/path/to/test_two
+""")
+    tests = qitest.conf.parse_qitest_cmake(qitest_cmake.strpath)
+    assert tests == [
+        {"name" : "test_one", "cmd" : ["/path/to/test_one", "--verbose"],
+         "gtest" : True, "timeout" : 20, "environment" : {"FOO" : "bar=baz"},
+         "nightly" : False, "perf" : False, "working_directory" : None},
+        {"name" : "test_two", "cmd" : ["/path/to/test_two"],
+         "gtest" : False, "timeout" : None, "environment" : None,
+         "nightly" : False, "perf" : True, "working_directory" : "/tmp"},
+    ]
+    assert record_messages.find("qitest.cmake:2: .*invalid timeout: twenty")
+
+def test_write_tests_only_when_changed(tmpdir):
+    qitest_json = tmpdir.join("qitest.json")
+    assert qitest.conf.write_tests([test_gtest_one], qitest_json.strpath)
+    assert not qitest.conf.write_tests([test_gtest_one], qitest_json.strpath)
+    assert qitest.conf.write_tests([test_perf_one], qitest_json.strpath)
+    assert qitest.conf.parse_tests(qitest_json.strpath) == [test_perf_one]
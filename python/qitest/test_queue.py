@@ -11,6 +11,7 @@ from Queue import Queue
 
 from qisys import ui
 import qisys.command
+import qisys.events
 import qitest.result
 
 class TestQueue():
@@ -145,12 +146,15 @@ class TestWorker(threading.Thread):
             test, index = self.queue.get()
             self.test_logger.on_start(test, index)
             result = None
-            try:
-                result = self.launcher.launch(test)
-            except Exception, e:
-                result = qitest.result.TestResult(test)
-                result.ok = False
-                result.message = self.message_for_exception(e)
+            with qisys.events.record("test", test["name"]) as event:
+                try:
+                    result = self.launcher.launch(test)
+                except Exception, e:
+                    result = qitest.result.TestResult(test)
+                    result.ok = False
+                    result.message = self.message_for_exception(e)
+                if not result.ok:
+                    event["error"] = ui.strip_colors(result.message).strip()
             if not self._should_stop:
                 self.test_logger.on_completed(test, index, result.message)
             self.results[test["name"]] = result
@@ -10,9 +10,21 @@ packages
 
 from qitoolchain.toolchain import Toolchain, Package
 from qitoolchain.toolchain import get_tc_names, get_tc_config_path
+from qitoolchain.toolchain import get_config_files
+from qitoolchain.toolchain import get_registered_toolchain
 
 def get_toolchain(tc_name):
-    """ Get an existing tolchain using its name """
+    """ Get an existing tolchain using its name
+
+    Toolchains are only loaded once per process, and loaded again
+    when their configuration files change. Note that this does
+    not update the toolchain file, (see
+    :py:meth:`.Toolchain.update_toolchain_file`)
+
+    """
+    toolchain = get_registered_toolchain(tc_name)
+    if toolchain:
+        return toolchain
     tc_names = get_tc_names()
     if not tc_name in tc_names:
         mess  = "No such toolchain: %s\n" % tc_name
@@ -16,6 +16,7 @@ All qiBuild packages should have the same layout.
 import os
 
 import qisys
+import qisys.scan
 import qisys.sh
 import qisys.ui
 from qitoolchain.binary_package.core import BinaryPackage
@@ -91,14 +92,13 @@ def _fix_package_tree(root_dir):
     if not os.path.exists(usr_dir):
         return
 
-    for (root, dirs, files) in os.walk(usr_dir):
+    for (_, dirs, files) in qisys.scan.walk(usr_dir):
        for directory in dirs:
-            dst = os.path.join(root, directory)
-            dst = dst.replace(usr_dir, root_dir)
+            dst = directory.path.replace(usr_dir, root_dir)
             qisys.ui.info("mkdir", dst)
             qisys.sh.mkdir(dst)
-       for filename in files:
-            src = os.path.join(root, filename)
+       for entry in files:
+            src = entry.path
             dst = src.replace(usr_dir, root_dir)
             qisys.ui.info("mv", src, "->", dst)
             qisys.sh.mv(src, dst)
@@ -15,6 +15,7 @@ from xml.etree import ElementTree
 from qisys import ui
 import qisys
 import qisys.archive
+import qisys.events
 import qisys.remote
 import qisys.version
 import qibuild.config
@@ -282,7 +283,9 @@ def parse_feed(toolchain, feed, qibuild_cfg, dry_run=False):
                 print "Would add ", package_name, "from", package_url
             continue
         else:
-            handle_package(package, package_tree, toolchain)
+            with qisys.events.record("package", package_tree.get("name"),
+                                     toolchain=toolchain.name):
+                handle_package(package, package_tree, toolchain)
         if package.path is None:
             mess  = "could guess package path from this configuration:\n"
             mess += ElementTree.tostring(package_tree)
@@ -81,6 +81,27 @@ class QiToolchainTestCase(unittest.TestCase):
         tc.remove()
         self.assertEquals(qitoolchain.get_tc_names(), list())
 
+    def test_toolchain_registry(self):
+        tc = qitoolchain.Toolchain("foo")
+        # Loaded only once
+        self.assertTrue(qitoolchain.get_toolchain("foo") is tc)
+        self.assertTrue(qitoolchain.get_toolchain("foo") is tc)
+
+        # Loading a toolchain does not write its toolchain file
+        self.assertFalse(os.path.exists(tc.toolchain_file))
+        tc.update_toolchain_file()
+        self.assertTrue(os.path.exists(tc.toolchain_file))
+
+        # Loaded again when its configuration is changed by someone else
+        qibuild.configstore.update_config(tc._get_config_path(),
+                                          'package "bar"', "path", "/path/to/bar")
+        other_tc = qitoolchain.get_toolchain("foo")
+        self.assertFalse(other_tc is tc)
+        self.assertEquals([x.name for x in other_tc.packages], ["bar"])
+
+        tc.remove()
+        self.assertRaises(Exception, qitoolchain.get_toolchain, "foo")
+
     def test_add_package(self):
         tc = qitoolchain.Toolchain("test")
 
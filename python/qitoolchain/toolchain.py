@@ -8,9 +8,11 @@ A set of packages and a toolchain file
 
 import os
 import sys
+import threading
 import ConfigParser
 
 import qisys
+import qisys.events
 import qisys.sh
 import qibuild.configstore
 import qitoolchain
@@ -19,6 +21,63 @@ import qitoolchain.feed
 from qisys import ui
 
 
+# (name, path to toolchains.cfg) -> (config state, Toolchain),
+# see get_registered_toolchain
+_REGISTRY = dict()
+_REGISTRY_LOCK = threading.Lock()
+
+def get_config_state(tc_name):
+    """ The mtimes and sizes of the configuration files of a toolchain,
+    used to know when a toolchain has to be loaded again
+
+    """
+    res = list()
+    for path in [get_tc_config_path(),
+                 qisys.sh.get_config_path("qi", "toolchains", tc_name + ".cfg")]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            res.append(None)
+            continue
+        res.append((st.st_mtime, st.st_size))
+    return tuple(res)
+
+def get_config_files():
+    """ The configuration files the toolchains are read from """
+    res = [get_tc_config_path()]
+    for tc_name in get_tc_names():
+        res.append(qisys.sh.get_config_path("qi", "toolchains",
+                                            tc_name + ".cfg"))
+    return res
+
+def get_registered_toolchain(tc_name):
+    """ Return the :py:class:`Toolchain` already loaded for this
+    name, or None if it was never loaded or if its configuration
+    changed since
+
+    """
+    key = (tc_name, get_tc_config_path())
+    with _REGISTRY_LOCK:
+        entry = _REGISTRY.get(key)
+    if entry and entry[0] == get_config_state(tc_name):
+        return entry[1]
+    return None
+
+def register_toolchain(toolchain):
+    """ Store a freshly loaded toolchain, (see
+    :py:func:`get_registered_toolchain`)
+
+    """
+    key = (toolchain.name, get_tc_config_path())
+    state = get_config_state(toolchain.name)
+    with _REGISTRY_LOCK:
+        _REGISTRY[key] = (state, toolchain)
+
+def unregister_toolchain(tc_name):
+    key = (tc_name, get_tc_config_path())
+    with _REGISTRY_LOCK:
+        _REGISTRY.pop(key, None)
+
 def get_default_packages_path(tc_name):
     """ Get a default path to store extracted packages
 
@@ -101,13 +160,35 @@ class Package():
         # Quick hack for now
         self.depends = list()
 
-    def install(self, destdir, runtime=True):
-        """ Install the package to a destination """
+    def install(self, destdir, runtime=True, num_jobs=None, keep_fun=None):
+        """ Install the package to a destination
+
+        When runtime is True, only install the files needed at runtime
+        (see :py:class:`qisys.sh.RuntimeFilter`), and the ones listed
+        in the runtime manifest of the package
+
+        Files are copied using ``num_jobs`` threads, and keep_fun
+        tells which modified files to keep (see :py:func:`qisys.sh.install`)
+
+        """
         if runtime:
+            runtime_filter = qisys.sh.get_runtime_filter(self.path)
             return qisys.sh.install(self.path, destdir,
-                                    filter_fun=qisys.sh.is_runtime)
+                                    filter_fun=runtime_filter,
+                                    num_jobs=num_jobs, keep_fun=keep_fun)
         else:
-            return qisys.sh.install(self.path, destdir)
+            return qisys.sh.install(self.path, destdir, num_jobs=num_jobs,
+                                    keep_fun=keep_fun)
+
+    def get_install_files(self, runtime=True):
+        """ The files :py:meth:`install` is going to install,
+        relative to the destination
+
+        """
+        files = qisys.sh.ls_r(self.path)
+        if runtime:
+            return qisys.sh.get_runtime_filter(self.path).select(files)
+        return files
 
     def __repr__(self):
         res = "<Package %s in %s"  % (self.name, self.path)
@@ -211,6 +292,7 @@ class Toolchain(object):
         Clean cache, remove all packages, remove self from configurations
         """
         qisys.sh.rm(self.cache)
+        unregister_toolchain(self.name)
 
         cfg_path = get_tc_config_path()
         config = ConfigParser.RawConfigParser()
@@ -260,8 +342,9 @@ class Toolchain(object):
         return cache_path
 
     def load_config(self):
-        """ Parse configuration, update toolchain file
-        when done
+        """ Parse configuration.
+        The toolchain file is not updated, call
+        :py:meth:`update_toolchain_file` for this
 
         """
         self.feed = get_tc_feed(self.name)
@@ -284,7 +367,7 @@ class Toolchain(object):
                                   cross_gdb=package_conf.get('cross_gdb'))
                 self.packages.append(package)
 
-        self.update_toolchain_file()
+        register_toolchain(self)
 
     def add_package(self, package):
         """ Add a package to the list
@@ -311,6 +394,7 @@ class Toolchain(object):
             "cross_gdb",
             package.cross_gdb)
         self.load_config()
+        self.update_toolchain_file()
 
     def remove_package(self, name):
         """ Remove a package from the list
@@ -337,9 +421,11 @@ class Toolchain(object):
             config.write(fp)
 
         self.load_config()
+        self.update_toolchain_file()
 
     def update_toolchain_file(self):
-        """ Generates a toolchain file for use by qibuild
+        """ Generates a toolchain file for use by qibuild.
+        The file is only written if its contents change
 
         """
         lines = ["# Autogenerated file. Do not edit\n",
@@ -380,7 +466,9 @@ class Toolchain(object):
         # Delegate this to qitoolchain.feed module
         qibuild_cfg = qibuild.config.QiBuildConfig()
         qibuild_cfg.read(create_if_missing=True)
-        qitoolchain.feed.parse_feed(self, feed, qibuild_cfg, dry_run=dry_run)
+        with qisys.events.record("toolchain-update", self.name, feed=feed):
+            qitoolchain.feed.parse_feed(self, feed, qibuild_cfg,
+                                        dry_run=dry_run)
         qibuild_cfg.write()
 
         # Update configuration so we keep which was
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Micro-benchmark for qibuild.cmake.get_cached_var
+
+Usage: bench-cmake-cache.py [NUM_ENTRIES]
+
+Generates a CMakeCache.txt with NUM_ENTRIES entries, then compares
+parsing the whole file for each lookup (what qibuild used to do)
+with the shared qibuild.cmake.CMakeCache objects.
+
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+import qibuild.cmake
+
+LOOKUPS = ["CMAKE_GENERATOR", "CMAKE_INSTALL_PREFIX", "CMAKE_OBJCOPY"]
+
+def write_cache(path, num_entries):
+    with open(path, "w") as fp:
+        fp.write("CMAKE_GENERATOR:INTERNAL=Unix Makefiles\n")
+        for i in range(num_entries):
+            fp.write("// Help for entry %i\n" % i)
+            fp.write("ENTRY_%i:STRING=value of entry %i\n" % (i, i))
+            fp.write("\n")
+        fp.write("CMAKE_INSTALL_PREFIX:PATH=/usr/local\n")
+        fp.write("CMAKE_OBJCOPY:FILEPATH=/usr/bin/objcopy\n")
+
+def old_get_cached_var(build_dir, var):
+    """ The implementation before CMakeCache was introduced """
+    cache_path = os.path.join(build_dir, "CMakeCache.txt")
+    with open(cache_path, "r") as fp:
+        lines = fp.readlines()
+    res = dict()
+    for line in lines:
+        if line.startswith("//"):
+            continue
+        if line.startswith("#"):
+            continue
+        match = re.match(r"([a-zA-Z0-9-_]+):(\w+)=(.*)", line)
+        if match:
+            (key, _type, value) = match.groups()
+            res[key] = value
+    return res.get(var)
+
+def main():
+    num_entries = 20000
+    if len(sys.argv) > 1:
+        num_entries = int(sys.argv[1])
+    build_dir = tempfile.mkdtemp(prefix="bench-cmake-cache-")
+    try:
+        write_cache(os.path.join(build_dir, "CMakeCache.txt"), num_entries)
+        for (name, func) in [("re-parse", old_get_cached_var),
+                             ("memoized", qibuild.cmake.get_cached_var)]:
+            def run():
+                for var in LOOKUPS:
+                    func(build_dir, var)
+            elapsed = min(timeit.repeat(run, number=10, repeat=3))
+            print "%-10s %8.2f ms per %i lookups" % (name,
+                    elapsed * 1000 / 10, len(LOOKUPS))
+    finally:
+        shutil.rmtree(build_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Benchmark for qisys.qixml on a large manifest
+
+Usage: bench-qixml.py [NUM_REPOS]
+
+Generates a manifest with NUM_REPOS repositories (5000 by default),
+then times reading it with the pure python ElementTree parser (what
+qisys.qixml used to do) and with qisys.qixml.read, iterating over it
+with qisys.qixml.iterparse, loading it with qisrc.manifest.Manifest,
+and writing it back, with and without changes.
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+import qisys.qixml
+import qisrc.manifest
+from xml.etree import ElementTree
+
+NUM_RUNS = 5
+
+def generate_manifest(path, num_repos):
+    with open(path, "w") as fp:
+        fp.write('<manifest>\n')
+        fp.write('  <remote name="origin" url="git@example.com:" />\n')
+        for i in range(num_repos):
+            fp.write('  <repo project="lib/lib%i.git" remotes="origin" '
+                     'branch="master" />\n' % i)
+        fp.write('  <groups>\n')
+        fp.write('    <group name="all">\n')
+        for i in range(num_repos):
+            fp.write('      <project name="lib/lib%i.git" />\n' % i)
+        fp.write('    </group>\n')
+        fp.write('  </groups>\n')
+        fp.write('</manifest>\n')
+
+def timeit(name, func):
+    start = time.time()
+    for _ in range(NUM_RUNS):
+        func()
+    elapsed = (time.time() - start) / NUM_RUNS
+    print "%-32s %8.3f s" % (name, elapsed)
+
+def main():
+    num_repos = 5000
+    if len(sys.argv) > 1:
+        num_repos = int(sys.argv[1])
+    tmp = tempfile.mkdtemp(prefix="bench-qixml-")
+    try:
+        manifest_xml = os.path.join(tmp, "manifest.xml")
+        generate_manifest(manifest_xml, num_repos)
+        print "%i repos, parser: %s" % (num_repos,
+                                        qisys.qixml._fast_etree.__name__)
+
+        def old_read():
+            tree = ElementTree.ElementTree()
+            tree.parse(manifest_xml)
+        timeit("ElementTree.parse", old_read)
+        timeit("qixml.read", lambda: qisys.qixml.read(manifest_xml))
+
+        def iterate():
+            for _ in qisys.qixml.iterparse(manifest_xml):
+                pass
+        timeit("qixml.iterparse", iterate)
+
+        def old_load():
+            manifest = qisrc.manifest.Manifest.__new__(qisrc.manifest.Manifest)
+            manifest.manifest_xml = manifest_xml
+            manifest.repos = list()
+            manifest.remotes = list()
+            manifest.default_branch = None
+            manifest.groups = qisrc.groups.Groups()
+            tree = ElementTree.ElementTree()
+            tree.parse(manifest_xml)
+            qisrc.manifest.ManifestParser(manifest).parse(tree.getroot())
+        timeit("read + ManifestParser.parse", old_load)
+        timeit("Manifest()", lambda: qisrc.manifest.Manifest(manifest_xml))
+
+        tree = qisys.qixml.read(manifest_xml)
+        qisys.qixml.write(tree, manifest_xml)
+        timeit("qixml.write (unchanged)",
+               lambda: qisys.qixml.write(tree, manifest_xml))
+        def write_changed():
+            root = tree.getroot()
+            root.set("version", str(int(root.get("version", "0")) + 1))
+            qisys.qixml.write(tree, manifest_xml)
+        timeit("qixml.write (changed)", write_changed)
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
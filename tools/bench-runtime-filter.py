@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Benchmark for qisys.sh.RuntimeFilter
+
+Usage: bench-runtime-filter.py [NUM_FILES]
+
+Generates the relative paths of NUM_FILES files (200000 by default)
+of a typical SDK, then times classifying them with the implementation
+of qisys.sh.is_runtime before the rules were compiled, with
+qisys.sh.is_runtime, and with RuntimeFilter.select.
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+import qisys.sh
+
+def old_is_runtime(filename):
+    """ The implementation before the rules were compiled """
+    basename = os.path.basename(filename)
+    basedir = filename.split(os.path.sep)[0]
+    if filename.startswith("bin"):
+        if sys.platform.startswith("win"):
+            if filename.endswith(".exe"):
+                return True
+            if filename.endswith(".dll"):
+                return True
+            else:
+                return False
+        else:
+            return True
+    if filename.startswith("lib"):
+        if "python" in filename:
+            if filename.endswith(("Makefile", "pyconfig.h")):
+                return True
+        shared_lib_ext = ""
+        if sys.platform.startswith("win"):
+            shared_lib_ext = ".dll"
+        if sys.platform.startswith("linux"):
+            shared_lib_ext = ".so"
+        if sys.platform == "darwin":
+            shared_lib_ext = ".dylib"
+        if shared_lib_ext in basename:
+            return True
+        if basename.endswith(".py"):
+            return True
+        if basename.endswith(".pyd"):
+            return True
+        else:
+            return False
+    if filename.startswith(os.path.join("share", "cmake")):
+        return False
+    if filename.startswith(os.path.join("share", "man")):
+        return False
+    if basedir == "share":
+        return True
+    if basedir == "include":
+        if filename.endswith("pyconfig.h"):
+            return True
+        else:
+            return False
+    if basedir.endswith(".framework"):
+        return True
+    return True
+
+def generate_paths(num_files):
+    templates = [
+        "bin/tool%i",
+        "lib/libfoo%i.so.1.2",
+        "lib/libfoo%i.a",
+        "lib/python2.7/site-packages/foo/mod%i.py",
+        "include/foo/header%i.h",
+        "include/foo/detail/impl%i.hpp",
+        "share/cmake/foo%i/foo-config.cmake",
+        "share/foo/data%i.xml",
+        "share/man/man1/tool%i.1",
+    ]
+    templates = [x.replace("/", os.path.sep) for x in templates]
+    return [templates[i % len(templates)] % i for i in range(num_files)]
+
+def timeit(name, func):
+    start = time.time()
+    res = func()
+    print "%-36s %8.3f s (%i runtime files)" % (name, time.time() - start,
+                                                 len(res))
+
+def main():
+    num_files = 200000
+    if len(sys.argv) > 1:
+        num_files = int(sys.argv[1])
+    paths = generate_paths(num_files)
+    print "%i files, platform: %s" % (num_files, sys.platform)
+    timeit("old is_runtime", lambda: [x for x in paths if old_is_runtime(x)])
+    timeit("qisys.sh.is_runtime",
+           lambda: [x for x in paths if qisys.sh.is_runtime(x)])
+    runtime_filter = qisys.sh.get_runtime_filter()
+    timeit("RuntimeFilter.select", lambda: runtime_filter.select(paths))
+
+if __name__ == "__main__":
+    main()
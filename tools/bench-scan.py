@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Benchmark for qisys.scan on a large SDK tree
+
+Usage: bench-scan.py [NUM_FILES]
+
+Generates a SDK tree with NUM_FILES files (200000 by default), a tenth
+of them being symlinks, then times walking it with os.walk and
+os.path.islink (what qisys.sh used to do) and with qisys.scan.walk,
+with and without scandir, and running qisys.sh.ls_r and an up-to-date
+qisys.sh.install on it.
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+import qisys.scan
+import qisys.sh
+
+FILES_PER_DIR = 50
+
+def generate_sdk(path, num_files):
+    num_dirs = max(num_files / FILES_PER_DIR, 1)
+    for i in range(num_dirs):
+        if i % 2:
+            dir_path = os.path.join(path, "include", "pkg%i" % (i / 10),
+                                    "sub%i" % i)
+        else:
+            dir_path = os.path.join(path, "lib", "pkg%i" % (i / 10),
+                                    "sub%i" % i)
+        os.makedirs(dir_path)
+        for j in range(FILES_PER_DIR):
+            file_path = os.path.join(dir_path, "file%i" % j)
+            if j % 10 == 9:
+                os.symlink("file0", file_path)
+            else:
+                with open(file_path, "w"):
+                    pass
+
+def old_walk(top):
+    num_links = 0
+    for (root, dirs, files) in os.walk(top):
+        for name in dirs + files:
+            if os.path.islink(os.path.join(root, name)):
+                num_links += 1
+    return num_links
+
+def new_walk(top):
+    num_links = 0
+    for (_, dirs, files) in qisys.scan.walk(top):
+        for entry in dirs + files:
+            if entry.is_symlink():
+                num_links += 1
+    return num_links
+
+def timeit(name, func):
+    start = time.time()
+    func()
+    print "%-36s %8.2f s" % (name, time.time() - start)
+
+def main():
+    num_files = 200000
+    if len(sys.argv) > 1:
+        num_files = int(sys.argv[1])
+    tmp = tempfile.mkdtemp(prefix="bench-scan-")
+    try:
+        sdk_dir = os.path.join(tmp, "sdk")
+        generate_sdk(sdk_dir, num_files)
+        print "%i files, scandir available: %s" % (num_files,
+                                                  qisys.scan.HAS_SCANDIR)
+        timeit("os.walk + os.path.islink", lambda: old_walk(sdk_dir))
+        timeit("qisys.scan.walk", lambda: new_walk(sdk_dir))
+        has_scandir = qisys.scan.HAS_SCANDIR
+        qisys.scan.HAS_SCANDIR = False
+        timeit("qisys.scan.walk (without scandir)",
+               lambda: new_walk(sdk_dir))
+        qisys.scan.HAS_SCANDIR = has_scandir
+        timeit("qisys.sh.ls_r", lambda: qisys.sh.ls_r(sdk_dir))
+        dest = os.path.join(tmp, "dest")
+        qisys.sh.install(sdk_dir, dest, quiet=True)
+        timeit("qisys.sh.install (up to date)",
+               lambda: qisys.sh.install(sdk_dir, dest, quiet=True))
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
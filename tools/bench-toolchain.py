@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Benchmark for the toolchain registry used by qitoolchain.get_toolchain
+
+Usage: bench-toolchain.py [NUM_PACKAGES] [NUM_PROJECTS]
+
+Creates, in a temporary HOME, a toolchain with NUM_PACKAGES packages
+and a worktree with NUM_PROJECTS projects, configures them once, then
+times ``qibuild configure --all`` (with every project up to date),
+loading the toolchain once per process (the registry), and loading it
+and regenerating its toolchain file on every access (what qibuild
+used to do).
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HOME = tempfile.mkdtemp(prefix="bench-toolchain-")
+os.environ["HOME"] = HOME
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+import qisys.script
+import qisys.worktree
+import qitoolchain
+
+def old_get_toolchain(tc_name):
+    """ The implementation before the registry was introduced """
+    if tc_name not in qitoolchain.get_tc_names():
+        raise Exception("No such toolchain: %s" % tc_name)
+    toolchain = qitoolchain.Toolchain(tc_name)
+    toolchain.update_toolchain_file()
+    return toolchain
+
+def create_toolchain(num_packages):
+    toolchain = qitoolchain.Toolchain("bench")
+    for i in range(num_packages):
+        package_path = os.path.join(HOME, "packages", "package%i" % i)
+        os.makedirs(package_path)
+        toolchain.add_package(qitoolchain.Package("package%i" % i,
+                                                  package_path))
+
+def create_worktree(num_projects):
+    root = os.path.join(HOME, "work")
+    os.makedirs(os.path.join(root, ".qi"))
+    worktree = qisys.worktree.WorkTree(root)
+    for i in range(num_projects):
+        name = "project%i" % i
+        os.makedirs(os.path.join(root, name))
+        with open(os.path.join(root, name, "qiproject.xml"), "w") as fp:
+            fp.write('<project version="3">\n')
+            fp.write('  <qibuild name="%s" />\n' % name)
+            fp.write('</project>\n')
+        with open(os.path.join(root, name, "CMakeLists.txt"), "w") as fp:
+            fp.write("cmake_minimum_required(VERSION 2.8)\n")
+            fp.write("project(%s NONE)\n" % name)
+        worktree.add_project(name)
+    return root
+
+def configure_all(root):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        qisys.script.run_action("qibuild.actions.configure",
+                                ["--all", "--quiet", "-c", "bench",
+                                 "--work-tree", root])
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def main():
+    num_packages = 100
+    num_projects = 20
+    if len(sys.argv) > 1:
+        num_packages = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        num_projects = int(sys.argv[2])
+    try:
+        create_toolchain(num_packages)
+        root = create_worktree(num_projects)
+        configure_all(root)
+        new_get_toolchain = qitoolchain.get_toolchain
+        for (name, get_toolchain) in [("reload", old_get_toolchain),
+                                      ("registry", new_get_toolchain)]:
+            qitoolchain.get_toolchain = get_toolchain
+            start = time.time()
+            configure_all(root)
+            elapsed = time.time() - start
+            print "%-10s %8.2f s for configure --all " \
+                  "(%i packages, %i projects)" % (name, elapsed,
+                                                  num_packages, num_projects)
+    finally:
+        shutil.rmtree(HOME)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Benchmark for qisys.ui output
+
+Usage: bench-ui.py [NUM_MESSAGES] [WRITE_LATENCY]
+
+Times NUM_MESSAGES (100000 by default) calls to ui.info, and to
+ui.info_count for a progress line, written to a fake terminal
+where each write takes WRITE_LATENCY seconds (20 microseconds by
+default), with direct output, with buffered output, and with the
+JSON lines format.
+
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+from qisys import ui
+
+
+class SlowTerminal(object):
+    """ A file object where each write takes some time """
+    def __init__(self, latency):
+        self.latency = latency
+        self.num_writes = 0
+
+    def write(self, text):
+        self.num_writes += 1
+        time.sleep(self.latency)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return True
+
+
+def run(name, num_messages, latency, progress=False, **config):
+    ui.CONFIG.update(config)
+    terminal = SlowTerminal(latency)
+    start = time.time()
+    for i in range(num_messages):
+        if progress:
+            ui.info_count(i, num_messages, ui.blue, "project%i" % i,
+                          end="\r", fp=terminal)
+        else:
+            ui.info(ui.green, "*", ui.reset, "message", i, fp=terminal)
+    returned = time.time() - start
+    ui.flush()
+    done = time.time() - start
+    ui.CONFIG["buffered"] = False
+    ui.CONFIG["format"] = "text"
+    print "%-28s returned after %6.2f s, done after %6.2f s, %6i writes" % \
+        (name, returned, done, terminal.num_writes)
+
+def main():
+    num_messages = 100000
+    latency = 20e-6
+    if len(sys.argv) > 1:
+        num_messages = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        latency = float(sys.argv[2])
+    ui.CONFIG["color"] = "always"
+    run("info, direct", num_messages, latency)
+    run("info, buffered", num_messages, latency, buffered=True)
+    run("info, json", num_messages, latency, format="json")
+    run("info, json, buffered", num_messages, latency,
+        format="json", buffered=True)
+    run("info_count, direct", num_messages, latency, progress=True)
+    run("info_count, buffered", num_messages, latency, progress=True,
+        buffered=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+## Copyright (c) 2012-2014 Aldebaran Robotics. All rights reserved.
+## Use of this source code is governed by a BSD-style license that can be
+## found in the COPYING file.
+
+""" Count how many times the properties of BuildProject and
+CMakeBuildConfig are read, and how many times they are actually
+computed, while running a qibuild action
+
+Usage: profile-build-properties.py [ACTION] [ARGS...]
+
+Runs ``qibuild configure --all`` by default, from the current
+directory. For instance::
+
+    cd /path/to/worktree
+    profile-build-properties.py configure --all --release
+
+"""
+
+import collections
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "python"))
+
+import qisys.script
+import qibuild.build_config
+import qibuild.project
+
+TO_PROFILE = [
+    (qibuild.project.BuildProject,
+     ["build_directory", "sdk_directory", "cmake_cache", "qitest_json",
+      "build_stamp", "cmake_args", "build_env", "cmake_generator"]),
+    (qibuild.build_config.CMakeBuildConfig,
+     ["build_directory", "cmake_args", "build_env", "toolchain",
+      "cmake_generator"]),
+]
+
+accesses = collections.defaultdict(int)
+evaluations = collections.defaultdict(int)
+
+def counting(key, func):
+    def new_func(*args, **kwargs):
+        accesses[key] += 1
+        return func(*args, **kwargs)
+    return new_func
+
+def patch_class(cls, names):
+    for name in names:
+        key = "%s.%s" % (cls.__name__, name)
+        attr = cls.__dict__[name]
+        if isinstance(attr, property):
+            setattr(cls, name, property(counting(key, attr.fget), attr.fset))
+        else:
+            setattr(cls, name, counting(key, attr))
+
+def patch_get_cached():
+    get_cached = qibuild.build_config.get_cached
+    def counting_get_cached(obj, name, compute):
+        short_name = name[0] if isinstance(name, tuple) else name
+        key = "%s.%s" % (type(obj).__name__, short_name)
+        def counting_compute():
+            evaluations[key] += 1
+            return compute()
+        return get_cached(obj, name, counting_compute)
+    qibuild.build_config.get_cached = counting_get_cached
+
+def report():
+    print
+    print "%-40s %10s %12s" % ("property", "accesses", "evaluations")
+    for key in sorted(accesses, key=accesses.get, reverse=True):
+        # Properties not using get_cached are computed on each access
+        num_evaluations = evaluations.get(key, accesses[key])
+        print "%-40s %10i %12i" % (key, accesses[key], num_evaluations)
+
+def main():
+    args = sys.argv[1:] or ["configure", "--all"]
+    for (cls, names) in TO_PROFILE:
+        patch_class(cls, names)
+    patch_get_cached()
+    try:
+        qisys.script.run_action("qibuild.actions.%s" % args[0], args[1:])
+    finally:
+        report()
+
+if __name__ == "__main__":
+    main()